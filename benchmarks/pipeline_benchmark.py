@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import GaussianNB
+from data_collection_and_processing.combining_data import DataCombiner
+from data_collection_and_processing.feature_selection import FeatureSelector
+from data_collection_and_processing.mining_data import EthereumTransactionAnalyzer
+from data_collection_and_processing.batch_features import BatchFeatureExtractor
+from data_collection_and_processing.synthetic_data import SyntheticTransactionGenerator
+from instrumentation.metrics import PeakMemorySampler
+from modeling.model_evaluator import ModelEvaluator
+from modeling.scoring_pipeline import ScoringPipeline
+from modeling.neighbor_index import NeighborIndex
+
+DEFAULT_SCALES = (10000, 100000, 1000000, 10000000)
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def hardware():
+    # What throughput depends on; runs on different hardware are not compared
+    cpu_model = platform.processor()
+    if os.path.exists('/proc/cpuinfo'):
+        with open('/proc/cpuinfo') as cpuinfo:
+            cpu_model = next((line.split(':', 1)[1].strip() for line in cpuinfo if line.startswith('model name')),
+                             cpu_model)
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    try:
+        memory_gb = round(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 2 ** 30)
+    except (AttributeError, ValueError, OSError):
+        memory_gb = None
+    return {'arch': platform.machine(), 'cpu_model': cpu_model, 'cpus': cpus, 'memory_gb': memory_gb}
+
+
+class PipelineBenchmark:
+    def __init__(self, scales=DEFAULT_SCALES, work_dir=None, per_address_cap=2000, model_rows_cap=100000,
+                 block_size=50000, seed=42):
+        self.scales = scales
+        self.work_dir = work_dir
+        self.per_address_cap = per_address_cap
+        self.model_rows_cap = model_rows_cap
+        self.block_size = block_size
+        self.seed = seed
+        self.results = []
+        self.missing = []
+
+    def _record(self, scale, stage, items, func):
+        with PeakMemorySampler() as memory:
+            start = time.perf_counter()
+            timed = func()
+            seconds = time.perf_counter() - start
+        # A stage may report its own time when part of its loop (e.g. data generation) is not measured
+        seconds = timed if isinstance(timed, float) else seconds
+        record = {'scale': scale, 'stage': stage, 'items': items, 'seconds': seconds,
+                  'items_per_second': items / seconds if seconds else float('nan'),
+                  'peak_rss_mb': memory.peak_mb}
+        self.results.append(record)
+        print(f"[{scale}] {stage}: {items} items in {seconds:.2f}s "
+              f"({record['items_per_second']:.0f}/s), peak RSS {memory.peak_mb:.0f} MB")
+        return record
+
+    def _features_per_address(self, addresses, transactions):
+        # compute_transaction_stats, the per-address path behind analyze_ethereum_transactions
+        analyzer = EthereumTransactionAnalyzer('', os.devnull, os.devnull)
+        for address in addresses[:self.per_address_cap]:
+            try:
+                analyzer.compute_transaction_stats(address, transactions[address])
+            except Exception:
+                # The miner skips addresses whose stats cannot be computed the same way
+                continue
+
+    def _features_batch(self, generator):
+        elapsed = 0.0
+        for block_index in range(generator.n_blocks):
+            addresses, _, columns = generator.block(block_index)
+            start = time.perf_counter()
+            BatchFeatureExtractor(addresses).extract(**columns)
+            elapsed += time.perf_counter() - start
+        return elapsed
+
+    def _model_frame(self, combined_path):
+        frame = pd.read_csv(combined_path).drop(columns='Address').fillna(0)
+        if len(frame) > self.model_rows_cap:
+            frame = frame.sample(self.model_rows_cap, random_state=self.seed)
+        return frame.reset_index(drop=True)
+
+    def run_scale(self, scale):
+        work_dir = tempfile.mkdtemp(prefix=f'benchmark_{scale}_', dir=self.work_dir)
+        try:
+            generator = SyntheticTransactionGenerator(scale, block_size=min(self.block_size, scale), seed=self.seed)
+            mined_path = os.path.join(work_dir, 'address_data_ethereum.csv')
+            kaggle_path = os.path.join(work_dir, 'address_data_kaggle.csv')
+            combined_path = os.path.join(work_dir, 'address_data_combined.csv')
+
+            self._record(scale, 'generate', scale, lambda: generator.write_datasets(mined_path, kaggle_path))
+            # The txlist dicts are built before timing starts, so only the feature computation is measured
+            addresses, _, transactions = generator.transactions(0)
+            self._record(scale, 'features_per_address', min(self.per_address_cap, len(addresses)),
+                         lambda: self._features_per_address(addresses, transactions))
+            del transactions
+            self._record(scale, 'features_batch', scale, lambda: self._features_batch(generator))
+            self._record(scale, 'combine', scale,
+                         lambda: DataCombiner(mined_path, kaggle_path, combined_path).execute())
+
+            # Model stages train on at most model_rows_cap rows; scoring runs over every row
+            frame = self._model_frame(combined_path)
+            selector = FeatureSelector(frame, mode='subsample')
+            self._record(scale, 'feature_selection', len(frame),
+                         lambda: (selector.fit_model(), selector.get_feature_importances()))
+            models = {
+                'LogisticRegression': (LogisticRegression(max_iter=1000), None),
+                'RandomForest': (RandomForestClassifier(n_estimators=50, random_state=self.seed), None),
+                'GaussianNB': (GaussianNB(), None),
+            }
+            evaluator = ModelEvaluator(models, frame, 'FLAG')
+            self._record(scale, 'evaluation', len(frame), evaluator.evaluate_models)
+            pipeline = ScoringPipeline.from_evaluator(evaluator)
+            self._record(scale, 'scoring', scale, lambda: pipeline.score_frame(pd.read_csv(combined_path).fillna(0)))
+            neighbor_index = NeighborIndex.from_evaluator(evaluator)
+            rows = pd.read_csv(combined_path).fillna(0)
+            self._record(scale, 'neighbor_queries', scale, lambda: neighbor_index.kneighbors(rows))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def run(self):
+        for scale in self.scales:
+            self.run_scale(scale)
+        return self.results
+
+    def save(self, path):
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                        'hardware': hardware()},
+            'settings': {'per_address_cap': self.per_address_cap, 'model_rows_cap': self.model_rows_cap,
+                         'seed': self.seed},
+            'results': self.results,
+        }
+        with open(path, 'w') as results_file:
+            json.dump(report, results_file, indent=2)
+        print(f"Benchmark results written to {path}")
+        return path
+
+    def compare(self, baseline_path, tolerance=0.3, memory_slack_mb=64):
+        # A stage regresses when its throughput falls, or its peak memory grows, by more than
+        # `tolerance` against the baseline at the same scale. Throughput only compares on the same
+        # hardware, so a baseline recorded elsewhere is refused rather than compared
+        with open(baseline_path) as baseline_file:
+            report = json.load(baseline_file)
+        recorded = report.get('machine', {}).get('hardware')
+        current = hardware()
+        if recorded != current:
+            raise ValueError(f"Baseline {baseline_path} was recorded on {recorded}, this machine is {current}")
+        baseline = {(record['scale'], record['stage']): record for record in report['results']}
+        measured = {(record['scale'], record['stage']) for record in self.results}
+        scales = {scale for scale, _ in measured}
+        # Stages with nothing to compare against are listed in `missing`, not skipped silently: a new
+        # stage needs --update-baseline, and a baseline stage this run did not measure may have vanished
+        self.missing = ([f"{stage} @ {scale}: no baseline" for scale, stage in sorted(measured - set(baseline))]
+                        + [f"{stage} @ {scale}: in the baseline but not measured"
+                           for scale, stage in sorted(set(baseline) - measured) if scale in scales])
+        regressions = []
+        for record in self.results:
+            reference = baseline.get((record['scale'], record['stage']))
+            if reference is None:
+                continue
+            if record['items_per_second'] < reference['items_per_second'] * (1 - tolerance):
+                regressions.append(f"{record['stage']} @ {record['scale']}: {record['items_per_second']:.0f}/s "
+                                   f"vs baseline {reference['items_per_second']:.0f}/s")
+            if record['peak_rss_mb'] > reference['peak_rss_mb'] * (1 + tolerance) + memory_slack_mb:
+                regressions.append(f"{record['stage']} @ {record['scale']}: peak RSS {record['peak_rss_mb']:.0f} MB "
+                                   f"vs baseline {reference['peak_rss_mb']:.0f} MB")
+        return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time every pipeline stage on synthetic data')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES))
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--per-address-cap', type=int, default=2000)
+    parser.add_argument('--model-rows-cap', type=int, default=100000)
+    parser.add_argument('--work-dir', default=None)
+    args = parser.parse_args(argv)
+
+    benchmark = PipelineBenchmark(args.scales, args.work_dir, args.per_address_cap, args.model_rows_cap)
+    benchmark.run()
+    benchmark.save(args.output)
+    if args.update_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return 0
+    try:
+        regressions = benchmark.compare(args.baseline, args.tolerance)
+    except ValueError as error:
+        print(f"Not comparing: {error}. Record a baseline on this machine with --update-baseline.")
+        return 2
+    for missing in benchmark.missing:
+        print(f"MISSING {missing}")
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import argparse
+import binascii
+import hashlib
+import sys
+import numpy as np
+import pandas as pd
+
+KEY_DTYPE = 'S20'
+
+
+def normalize_address(address):
+    # Lower-case 0x form; Etherscan answers in lower case, checksummed input is mixed case
+    return address.strip().lower()
+
+
+def _key(address, strict):
+    text = normalize_address(str(address))
+    if len(text) == 42 and text[:2] == '0x':
+        try:
+            return bytes.fromhex(text[2:])
+        except ValueError:
+            pass
+    if strict:
+        raise ValueError(f"Not a 20-byte hex address: {address!r}")
+    # Anything else (the empty `to` of a contract creation, a stray transaction hash) is keyed by a
+    # digest of its normalized text, so it still dedups and compares case-insensitively
+    return hashlib.blake2b(text.encode(), digest_size=20).digest()
+
+
+def address_keys(addresses, strict=False):
+    # 20-byte binary keys, case-insensitive by construction; strict=True rejects non-addresses
+    values = np.asarray(addresses, dtype=object).ravel()
+    if not len(values):
+        return np.empty(0, dtype=KEY_DTYPE)
+    try:
+        # Fast path: every value is '0x' + 40 hex digits and the whole column is decoded in one call.
+        # 'x' is not a hex digit, so a 42-character frame that starts with '0x' starts at a prefix.
+        text = ''.join(values).encode('ascii')
+        if len(text) == 42 * len(values):
+            chars = np.frombuffer(text, dtype=np.uint8).reshape(-1, 42)
+            if (chars[:, 0] == ord('0')).all() and np.isin(chars[:, 1], (ord('x'), ord('X'))).all():
+                return np.frombuffer(binascii.unhexlify(chars[:, 2:].tobytes()), dtype=KEY_DTYPE).copy()
+    except (TypeError, ValueError):
+        pass
+    return np.array([_key(address, strict) for address in values], dtype=KEY_DTYPE)
+
+
+def normalize_addresses(addresses):
+    # Element-wise normalize_address; Etherscan answers in lower case, so the common case is
+    # checked with one join and returned as is
+    values = np.asarray(addresses, dtype=object).ravel()
+    try:
+        text = ''.join(values)
+        if len(text) == 42 * len(values) and text == text.lower():
+            return values
+    except TypeError:
+        pass
+    return np.array([normalize_address(str(address)) for address in values], dtype=object)
+
+
+def equal_addresses(left, right):
+    # Element-wise, case-insensitive `left == right`; `right` may be a single address
+    if isinstance(right, str):
+        return normalize_addresses(left) == normalize_address(right)
+    return normalize_addresses(left) == normalize_addresses(right)
+
+
+def keys_to_addresses(keys):
+    digits = np.asarray(keys, dtype=KEY_DTYPE).view(np.uint8).reshape(-1, 20)
+    return ['0x' + row.tobytes().hex() for row in digits]
+
+
+def _prefixes(keys):
+    # Big-endian, so uint64 order is the keys' byte order
+    return np.ascontiguousarray(np.asarray(keys, dtype=KEY_DTYPE).view(np.uint8).reshape(-1, 20)[:, :8]) \
+        .view('>u8').ravel().astype(np.uint64)
+
+
+class AddressIndex:
+    def __init__(self, addresses=None, keys=None, strict=False):
+        # Sorted unique keys plus, for each, the first row it appeared on; lookups are binary searches
+        self.row_keys = address_keys(addresses, strict) if keys is None else np.asarray(keys, dtype=KEY_DTYPE)
+        # Stable sort on the uint64 prefixes; only runs of equal prefixes (duplicates, vanity
+        # addresses) are then ordered by full key and row
+        row_prefixes = _prefixes(self.row_keys)
+        order = np.argsort(row_prefixes, kind='stable')
+        ordered_prefixes = row_prefixes[order]
+        tied = np.zeros(len(order), dtype=bool)
+        tied[1:] = ordered_prefixes[1:] == ordered_prefixes[:-1]
+        tied[:-1] |= tied[1:].copy()
+        if tied.any():
+            runs = order[tied]
+            order[tied] = runs[np.lexsort((runs, self.row_keys[runs], ordered_prefixes[tied]))]
+        ordered = self.row_keys[order]
+        first = np.ones(len(ordered), dtype=bool)
+        first[1:] = ordered[1:] != ordered[:-1]
+        self.keys = ordered[first]
+        self.rows = order[first]
+        self.prefixes = _prefixes(self.keys)
+        self.shared = np.zeros(len(self.keys), dtype=bool)
+        self.shared[1:] = self.prefixes[1:] == self.prefixes[:-1]
+        self.shared[:-1] |= self.shared[1:].copy()
+
+    @classmethod
+    def from_csv(cls, path, column='Address'):
+        return cls(pd.read_csv(path, usecols=[column])[column].to_numpy())
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def is_unique(self):
+        return len(self.keys) == len(self.row_keys)
+
+    def _positions(self, keys):
+        # Binary search on the first 8 bytes as uint64, with the queries sorted first so the searches
+        # walk the index in order; only prefixes shared by several keys (vanity or burn addresses)
+        # need the full 20-byte comparison
+        keys = np.asarray(keys, dtype=KEY_DTYPE)
+        prefixes = _prefixes(keys)
+        order = np.argsort(prefixes)
+        positions = np.empty(len(keys), dtype=np.int64)
+        positions[order] = np.searchsorted(self.prefixes, prefixes[order])
+        found = positions < len(self.keys)
+        shared = np.zeros(len(keys), dtype=bool)
+        shared[found] = self.shared[positions[found]]
+        if shared.any():
+            positions[shared] = np.searchsorted(self.keys, keys[shared])
+            found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        return positions, found
+
+    def contains(self, addresses=None, keys=None):
+        return self._positions(address_keys(addresses) if keys is None else keys)[1]
+
+    def lookup(self, addresses=None, keys=None):
+        # Row of each address's first occurrence, -1 where it is not indexed
+        positions, found = self._positions(address_keys(addresses) if keys is None else keys)
+        rows = np.full(len(positions), -1, dtype=np.int64)
+        rows[found] = self.rows[positions[found]]
+        return rows
+
+    def codes(self, addresses=None, keys=None):
+        # Dense id of each address (its position among the sorted unique keys), -1 where it is not indexed
+        positions, found = self._positions(address_keys(addresses) if keys is None else keys)
+        return np.where(found, positions, -1)
+
+    def first_rows(self):
+        # Rows that survive a case-insensitive drop_duplicates(keep='first'), in their original order
+        return np.sort(self.rows)
+
+
+def write_new_addresses(candidates_path, known_paths, output_path, column='Address'):
+    # The miner's input: candidates minus every known dataset (case-insensitive), each address once
+    candidates = pd.read_csv(candidates_path, usecols=[column])
+    index = AddressIndex(candidates[column].to_numpy())
+    rows = index.first_rows()
+    for known_path in known_paths:
+        known = AddressIndex.from_csv(known_path, column)
+        rows = rows[~known.contains(keys=index.row_keys[rows])]
+    candidates.iloc[rows].to_csv(output_path, index=False)
+    print(f"{len(rows)} of {len(candidates)} addresses are new; written to {output_path}")
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write the candidate addresses that are in none of the known datasets')
+    parser.add_argument('candidates', help='CSV of addresses to mine, e.g. from a block explorer export')
+    parser.add_argument('known', nargs='+', help='CSVs of addresses already covered, e.g. address_data_kaggle.csv')
+    parser.add_argument('--output', '-o', required=True, help='e.g. Data/addresses_mined_not_in_kaggle.csv')
+    parser.add_argument('--column', default='Address')
+    args = parser.parse_args(argv)
+
+    write_new_addresses(args.candidates, args.known, args.output, column=args.column)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
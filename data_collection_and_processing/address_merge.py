@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+RIGHT_SUFFIX = '__right'
+
+
+class AddressMergeEngine:
+    def __init__(self, key='Address', partitions=64, chunksize=200000, tolerance=0.005, prefer='left',
+                 work_dir=None):
+        if prefer not in ('left', 'right'):
+            raise ValueError("prefer must be 'left' or 'right'")
+        self.key = key
+        self.partitions = partitions
+        self.chunksize = chunksize
+        self.tolerance = tolerance
+        self.prefer = prefer
+        self.work_dir = work_dir
+        self.columns = {}
+        self.report = None
+
+    def _part_path(self, side, partition):
+        return os.path.join(self.tmp_dir, f"{side}_{partition:04d}.csv")
+
+    def _partition(self, side, path, prepare):
+        # Hash-partition rows by address so every partition can be joined on its own in memory
+        for chunk in pd.read_csv(path, chunksize=self.chunksize):
+            if prepare is not None:
+                chunk = prepare(chunk)
+            chunk[self.key] = chunk[self.key].str.lower()
+            self.columns[side] = list(chunk.columns)
+            self.report[f'rows_{side}'] += len(chunk)
+            buckets = pd.util.hash_pandas_object(chunk[self.key], index=False).to_numpy() % self.partitions
+            for partition, part in chunk.groupby(buckets, sort=False):
+                part_path = self._part_path(side, partition)
+                part.to_csv(part_path, mode='a', index=False, header=not os.path.exists(part_path))
+
+    def _load_partition(self, side, partition):
+        part_path = self._part_path(side, partition)
+        if not os.path.exists(part_path):
+            return pd.DataFrame(columns=self.columns.get(side, [self.key]))
+        return pd.read_csv(part_path)
+
+    def _drop_duplicates(self, side, frame, events):
+        duplicated = frame.duplicated(subset=[self.key])
+        if duplicated.any():
+            self.report[f'duplicates_{side}'] += int(duplicated.sum())
+            events.append(pd.DataFrame({self.key: frame.loc[duplicated, self.key], 'issue': 'duplicate',
+                                        'column': side, 'left': None, 'right': None}))
+        return frame[~duplicated]
+
+    def _coalesce(self, merged, column, events):
+        left = merged[column]
+        right = merged.pop(f"{column}{RIGHT_SUFFIX}")
+        both = left.notna() & right.notna()
+        if pd.api.types.is_numeric_dtype(left) and pd.api.types.is_numeric_dtype(right):
+            differ = both & ~np.isclose(left.to_numpy(dtype=float), right.to_numpy(dtype=float),
+                                        rtol=0, atol=self.tolerance, equal_nan=True)
+        else:
+            differ = both & (left.astype(str) != right.astype(str))
+        if differ.any():
+            self.report['conflicts'][column] = self.report['conflicts'].get(column, 0) + int(differ.sum())
+            events.append(pd.DataFrame({self.key: merged.loc[differ, self.key], 'issue': 'conflict',
+                                        'column': column, 'left': left[differ].astype(str),
+                                        'right': right[differ].astype(str)}))
+        merged[column] = left.combine_first(right) if self.prefer == 'left' else right.combine_first(left)
+
+    def _merge_partition(self, partition):
+        events = []
+        left = self._drop_duplicates('left', self._load_partition('left', partition), events)
+        right = self._drop_duplicates('right', self._load_partition('right', partition), events)
+        merged = left.merge(right, on=self.key, how='outer', suffixes=('', RIGHT_SUFFIX), indicator=True)
+        self.report['matched'] += int((merged.pop('_merge') == 'both').sum())
+        for column in left.columns:
+            if column != self.key and f"{column}{RIGHT_SUFFIX}" in merged.columns:
+                self._coalesce(merged, column, events)
+        return merged, events
+
+    def merge(self, left_path, right_path, output_path, prepare_left=None, prepare_right=None, finalize=None,
+              report_path=None):
+        self.report = {'rows_left': 0, 'rows_right': 0, 'duplicates_left': 0, 'duplicates_right': 0,
+                       'matched': 0, 'rows_out': 0, 'duplicates_out': 0, 'conflicts': {}}
+        self.columns = {}
+        if report_path is not None and os.path.exists(report_path):
+            os.remove(report_path)
+        self.tmp_dir = tempfile.mkdtemp(prefix='address_merge_', dir=self.work_dir)
+        try:
+            self._partition('left', left_path, prepare_left)
+            self._partition('right', right_path, prepare_right)
+            header = True
+            for partition in range(self.partitions):
+                merged, events = self._merge_partition(partition)
+                if finalize is not None:
+                    merged = finalize(merged)
+                merged.to_csv(output_path, mode='w' if header else 'a', index=False, header=header)
+                self.report['rows_out'] += len(merged)
+                # Partitions hold disjoint keys, so per-partition duplicates add up to the output's
+                self.report['duplicates_out'] += int(merged[self.key].duplicated().sum())
+                # Conflicts and duplicates are reported as each partition streams through
+                if report_path is not None and events:
+                    report = pd.concat(events, ignore_index=True)
+                    report.to_csv(report_path, mode='a' if os.path.exists(report_path) else 'w', index=False,
+                                  header=not os.path.exists(report_path))
+                for event in events:
+                    for issue, count in event['issue'].value_counts().items():
+                        print(f"Partition {partition}: {count} {issue} rows ({event['column'].iloc[0]}).")
+                header = False
+        finally:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        return self.report
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+from data_collection_and_processing.address_index import normalize_addresses
+
+STAT_COLUMNS = [
+    'total_sent_transactions', 'min_sent_value', 'max_sent_value', 'avg_sent_value',
+    'min_contract_value', 'max_contract_value', 'avg_contract_value',
+    'total_eth_sent', 'total_eth_sent_to_contracts', 'unique_sent_addresses',
+    'total_received_transactions', 'min_received_value', 'max_received_value', 'avg_received_value',
+    'total_eth_received', 'unique_received_addresses',
+    'time_diff_first_last', 'total_transactions', 'num_created_contracts',
+    'avg_time_between_sent', 'avg_time_between_received', 'total_eth_balance',
+]
+
+# Wei values are split into whole gwei and a sub-gwei remainder so every amount up to
+# 1e9 ETH stays an exact int64 pair (a single int64 overflows above ~9.2 ETH)
+WEI_DIGITS = 27
+GWEI_DIGITS = 18
+POWERS_OF_TEN = 10 ** np.arange(GWEI_DIGITS - 1, -1, -1, dtype=np.int64)
+
+
+def wei_strings_to_arrays(values):
+    values = np.asarray(values, dtype=f'S{WEI_DIGITS + 1}')
+    if values.size and np.char.str_len(values).max() > WEI_DIGITS:
+        raise ValueError(f"wei values above {WEI_DIGITS} digits are not supported")
+    digits = np.char.zfill(values, WEI_DIGITS).astype(f'S{WEI_DIGITS}')
+    digits = digits.view(np.uint8).reshape(-1, WEI_DIGITS).astype(np.int64) - ord('0')
+    gwei = digits[:, :GWEI_DIGITS] @ POWERS_OF_TEN
+    remainder = digits[:, GWEI_DIGITS:] @ POWERS_OF_TEN[GWEI_DIGITS - 9:]
+    return gwei, remainder
+
+
+def to_eth(gwei, remainder):
+    return gwei / 1e9 + remainder / 1e18
+
+
+class BatchFeatureExtractor:
+    def __init__(self, addresses):
+        self.addresses = list(addresses)
+
+    @classmethod
+    def from_transaction_lists(cls, transactions_by_address):
+        extractor = cls(transactions_by_address.keys())
+        lists = list(transactions_by_address.values())
+        counts = np.fromiter((len(txs) for txs in lists), dtype=np.int64, count=len(lists))
+        rows = [tx for txs in lists for tx in txs]
+        columns = {
+            'group': np.repeat(np.arange(len(lists), dtype=np.int64), counts),
+            'from_addresses': np.array([tx['from'] for tx in rows], dtype=object),
+            'to_addresses': np.array([tx['to'] for tx in rows], dtype=object),
+            'contract': np.array([tx['contractAddress'] != '' for tx in rows], dtype=bool),
+            'timestamp': np.array([tx['timeStamp'] for tx in rows], dtype=np.int64),
+        }
+        columns['gwei'], columns['remainder'] = wei_strings_to_arrays([tx['value'] for tx in rows])
+        return extractor, columns
+
+    def _segment_reduce(self, ufunc, values, starts, present, fill):
+        out = np.full(len(starts), fill, dtype=values.dtype)
+        if len(values):
+            out[present] = ufunc.reduceat(values, starts[present])
+        return out
+
+    def extract(self, group, from_addresses, to_addresses, contract, gwei, remainder, timestamp):
+        n_groups = len(self.addresses)
+        group = np.asarray(group, dtype=np.int64)
+
+        # One stable sort by owner, then every statistic is a segmented reduction
+        order = np.argsort(group, kind='stable')
+        group = group[order]
+        from_addresses = np.asarray(from_addresses, dtype=object)[order]
+        to_addresses = np.asarray(to_addresses, dtype=object)[order]
+        contract = np.asarray(contract, dtype=bool)[order]
+        gwei = np.asarray(gwei, dtype=np.int64)[order]
+        remainder = np.asarray(remainder, dtype=np.int64)[order]
+        timestamp = np.asarray(timestamp, dtype=np.int64)[order]
+
+        # Case-insensitive; the owners are normalized once, not once per transaction
+        owners = normalize_addresses(self.addresses)
+        outgoing = normalize_addresses(from_addresses) == owners[group]
+        incoming = ~outgoing
+        to_contract = outgoing & contract
+        eth = to_eth(gwei, remainder)
+
+        counts = np.bincount(group, minlength=n_groups)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        present = counts > 0
+
+        def masked_stats(mask):
+            n = np.bincount(group[mask], minlength=n_groups)
+            total = to_eth(self._segment_reduce(np.add, np.where(mask, gwei, 0), starts, present, 0),
+                           self._segment_reduce(np.add, np.where(mask, remainder, 0), starts, present, 0))
+            low = self._segment_reduce(np.minimum, np.where(mask, eth, np.inf), starts, present, np.inf)
+            high = self._segment_reduce(np.maximum, np.where(mask, eth, -np.inf), starts, present, -np.inf)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.where(n > 0, total / n, np.nan)
+            low[n == 0] = np.nan
+            high[n == 0] = np.nan
+            return n, low, high, mean, total
+
+        def unique_counterparties(mask, counterparties):
+            codes, uniques = pd.factorize(counterparties[mask])
+            keys = np.unique(group[mask] * max(len(uniques), 1) + codes)
+            return np.bincount(keys // max(len(uniques), 1), minlength=n_groups)
+
+        def timestamp_sum(mask):
+            return self._segment_reduce(np.add, np.where(mask, timestamp, 0), starts, present, 0)
+
+        n_sent, min_sent, max_sent, avg_sent, eth_sent = masked_stats(outgoing)
+        _, min_contract, max_contract, avg_contract, eth_contract = masked_stats(to_contract)
+        n_received, min_received, max_received, avg_received, eth_received = masked_stats(incoming)
+        first = self._segment_reduce(np.minimum, timestamp, starts, present, 0)
+        last = self._segment_reduce(np.maximum, timestamp, starts, present, 0)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg_time_sent = np.where(n_sent > 0, timestamp_sum(outgoing) / 60 / n_sent, np.nan)
+            avg_time_received = np.where(n_received > 0, timestamp_sum(incoming) / 60 / n_received, np.nan)
+
+        stats = pd.DataFrame({
+            'total_sent_transactions': n_sent,
+            'min_sent_value': min_sent,
+            'max_sent_value': max_sent,
+            'avg_sent_value': avg_sent,
+            'min_contract_value': min_contract,
+            'max_contract_value': max_contract,
+            'avg_contract_value': avg_contract,
+            'total_eth_sent': eth_sent,
+            'total_eth_sent_to_contracts': eth_contract,
+            'unique_sent_addresses': unique_counterparties(outgoing, to_addresses),
+            'total_received_transactions': n_received,
+            'min_received_value': min_received,
+            'max_received_value': max_received,
+            'avg_received_value': avg_received,
+            'total_eth_received': eth_received,
+            'unique_received_addresses': unique_counterparties(incoming, from_addresses),
+            'time_diff_first_last': (last - first) / 60,
+            'total_transactions': counts,
+            'num_created_contracts': np.bincount(group[contract], minlength=n_groups),
+            'avg_time_between_sent': avg_time_sent,
+            'avg_time_between_received': avg_time_received,
+            'total_eth_balance': eth_received - eth_sent,
+        }, index=pd.Index(self.addresses, name='Address'))
+        return stats[STAT_COLUMNS]
@@ -1,50 +1,94 @@
+import numpy as np
 import pandas as pd
+from sklearn.model_selection import train_test_split
+from data_collection_and_processing.dataset_store import read_dataset
+from data_collection_and_processing.address_merge import AddressMergeEngine, RIGHT_SUFFIX
+from data_collection_and_processing.address_index import AddressIndex, normalize_addresses
+from data_collection_and_processing.transaction_graph import TransactionGraph
+from instrumentation.metrics import instrumented_stage
 
 class DataCombiner:
-    def __init__(self, mined_data_path, kaggle_data_path, output_path):
+    erc20_columns = [' Total ERC20 tnxs', ' ERC20 total Ether received', ' ERC20 total ether sent',
+             ' ERC20 total Ether sent contract', ' ERC20 uniq sent addr', ' ERC20 uniq rec addr',
+             ' ERC20 uniq sent addr.1', ' ERC20 uniq rec contract addr', ' ERC20 avg time between sent tnx',
+             ' ERC20 avg time between rec tnx', ' ERC20 avg time between rec 2 tnx',
+             ' ERC20 avg time between contract tnx', ' ERC20 min val rec', ' ERC20 max val rec',
+             ' ERC20 avg val rec', ' ERC20 min val sent', ' ERC20 max val sent', ' ERC20 avg val sent',
+             ' ERC20 min val sent contract', ' ERC20 max val sent contract', ' ERC20 avg val sent contract',
+             ' ERC20 uniq sent token name', ' ERC20 uniq rec token name', ' ERC20 most sent token type',
+             ' ERC20_most_rec_token_type']
+    round_columns = ['Avg min between sent tnx', 'Avg min between received tnx', 'Time Diff between first and last (Mins)']
+    columns_to_remove = ['total ether sent contracts', 'max val sent to contract', 'Received Tnx',
+                 'Sent tnx', 'total Ether sent', 'min value sent to contract', 'avg value sent to contract',
+                 'Number of Created Contracts', 'max val sent', 'Unique Sent To Addresses']
+
+    def __init__(self, mined_data_path, kaggle_data_path, output_path, dataset_store=None, edge_dir=None,
+                 holdout_path=None, test_size=0.2, random_state=42):
         self.mined_data_path = mined_data_path
         self.kaggle_data_path = kaggle_data_path
         self.output_path = output_path
+        self.dataset_store = dataset_store
+        # With the miner's edge directory, transaction-graph columns are joined to the combined data
+        self.edge_dir = edge_dir
+        # The held-out rows are drawn here, once, over the combined rows: their labels are kept out of
+        # graph_flagged_neighbor_fraction, as they are unknown when scoring, and their addresses are written
+        # to holdout_path so the evaluators test on exactly those rows
+        self.holdout_path = holdout_path
+        self.test_size = test_size
+        self.random_state = random_state
 
     def load_data(self):
-        self.data_mined = pd.read_csv(self.mined_data_path)
-        self.data_kaggle = pd.read_csv(self.kaggle_data_path)
+        self.data_mined = read_dataset(self.mined_data_path, dataset_store=self.dataset_store)
+        self.data_kaggle = read_dataset(self.kaggle_data_path, dataset_store=self.dataset_store)
 
     def preprocess_kaggle_data(self):
         self.data_kaggle.drop(['Index', 'Unnamed: 0'], axis=1, inplace=True)
-        self.data_kaggle.drop_duplicates(subset=['Address'], inplace=True)
+        # Case-insensitive drop_duplicates(subset=['Address']) on 20-byte keys
+        rows = AddressIndex(self.data_kaggle['Address'].to_numpy()).first_rows()
+        self.data_kaggle = self.data_kaggle.iloc[rows]
 
     def drop_erc20_columns(self):
-        erc20_columns = [' Total ERC20 tnxs', ' ERC20 total Ether received', ' ERC20 total ether sent',
-                 ' ERC20 total Ether sent contract', ' ERC20 uniq sent addr', ' ERC20 uniq rec addr',
-                 ' ERC20 uniq sent addr.1', ' ERC20 uniq rec contract addr', ' ERC20 avg time between sent tnx',
-                 ' ERC20 avg time between rec tnx', ' ERC20 avg time between rec 2 tnx',
-                 ' ERC20 avg time between contract tnx', ' ERC20 min val rec', ' ERC20 max val rec',
-                 ' ERC20 avg val rec', ' ERC20 min val sent', ' ERC20 max val sent', ' ERC20 avg val sent',
-                 ' ERC20 min val sent contract', ' ERC20 max val sent contract', ' ERC20 avg val sent contract',
-                 ' ERC20 uniq sent token name', ' ERC20 uniq rec token name', ' ERC20 most sent token type',
-                 ' ERC20_most_rec_token_type']
-        self.data_kaggle.drop(erc20_columns, axis=1, inplace=True)
+        self.data_kaggle.drop(self.erc20_columns, axis=1, inplace=True)
 
     def round_mined_data(self):
-        round_columns = ['Avg min between sent tnx', 'Avg min between received tnx', 'Time Diff between first and last (Mins)']
-        self.data_mined[round_columns] = self.data_mined[round_columns].round(2)
+        self.data_mined[self.round_columns] = self.data_mined[self.round_columns].round(2)
 
     def merge_datasets(self):
-        self.merged_data = pd.merge(self.data_mined, self.data_kaggle, how='outer')
+        # Joined on the lower-cased address alone, as execute_chunked does: an account in both files
+        # (in any letter case) becomes one row, keeping the mined value where the two disagree
+        mined = self.data_mined.iloc[AddressIndex(self.data_mined['Address'].to_numpy()).first_rows()]
+        mined = mined.assign(Address=normalize_addresses(mined['Address']))
+        kaggle = self.data_kaggle.assign(Address=normalize_addresses(self.data_kaggle['Address']))
+        merged = mined.merge(kaggle, on='Address', how='outer', suffixes=('', RIGHT_SUFFIX))
+        for column in mined.columns:
+            if f"{column}{RIGHT_SUFFIX}" in merged.columns:
+                merged[column] = merged[column].combine_first(merged.pop(f"{column}{RIGHT_SUFFIX}"))
+        self.merged_data = merged
 
     def drop_unnecessary_columns(self):
-        columns_to_remove = ['total ether sent contracts', 'max val sent to contract', 'Received Tnx',
-                     'Sent tnx', 'total Ether sent', 'min value sent to contract', 'avg value sent to contract',
-                     'Number of Created Contracts', 'max val sent', 'Unique Sent To Addresses']
-        self.merged_data.drop(columns_to_remove, axis=1, inplace=True)
+        self.merged_data.drop(self.columns_to_remove, axis=1, inplace=True)
+
+    def join_graph_features(self):
+        graph = TransactionGraph.from_edge_dir(self.edge_dir)
+        _, held_out = train_test_split(np.arange(len(self.merged_data)), test_size=self.test_size,
+                                       random_state=self.random_state)
+        labelled = np.ones(len(self.merged_data), dtype=bool)
+        labelled[held_out] = False
+        self.held_out_addresses = self.merged_data['Address'].iloc[np.sort(held_out)].reset_index(drop=True)
+        if self.holdout_path is not None:
+            self.held_out_addresses.to_frame().to_csv(self.holdout_path, index=False)
+        features = graph.features(self.merged_data['Address'].to_numpy(), flags=self.merged_data['FLAG'].to_numpy(),
+                                  labelled=labelled)
+        self.merged_data = pd.concat([self.merged_data.reset_index(drop=True), features], axis=1)
 
     def save_merged_data(self):
         self.merged_data.to_csv(self.output_path, index=False)
 
     def check_uniqueness(self):
-        return self.merged_data['Address'].nunique() == self.merged_data.shape[0]
+        # Addresses that differ only in letter case are the same account, so they count as duplicates
+        return AddressIndex(self.merged_data['Address'].to_numpy()).is_unique
 
+    @instrumented_stage('combine')
     def execute(self):
         self.load_data()
         self.preprocess_kaggle_data()
@@ -52,5 +96,33 @@ class DataCombiner:
         self.round_mined_data()
         self.merge_datasets()
         self.drop_unnecessary_columns()
+        if self.edge_dir is not None:
+            self.join_graph_features()
         self.save_merged_data()
-        return self.check_uniqueness()
\ No newline at end of file
+        return self.check_uniqueness()
+
+    def _prepare_mined_chunk(self, chunk):
+        chunk[self.round_columns] = chunk[self.round_columns].round(2)
+        return chunk
+
+    def _prepare_kaggle_chunk(self, chunk):
+        return chunk.drop(['Index', 'Unnamed: 0'] + self.erc20_columns, axis=1)
+
+    def _finalize_partition(self, merged):
+        return merged.drop(self.columns_to_remove, axis=1)
+
+    @instrumented_stage('combine_chunked')
+    def execute_chunked(self, partitions=64, chunksize=200000, tolerance=0.005, prefer='mined',
+                        report_path=None, work_dir=None):
+        # Out-of-core variant of execute(): joins explicitly on Address through hash partitions,
+        # so memory is bounded by one partition and duplicates/conflicts are reported as they stream
+        engine = AddressMergeEngine(key='Address', partitions=partitions, chunksize=chunksize,
+                                    tolerance=tolerance, prefer='left' if prefer == 'mined' else 'right',
+                                    work_dir=work_dir)
+        self.merge_report = engine.merge(self.mined_data_path, self.kaggle_data_path, self.output_path,
+                                         prepare_left=self._prepare_mined_chunk,
+                                         prepare_right=self._prepare_kaggle_chunk,
+                                         finalize=self._finalize_partition, report_path=report_path)
+        # Like execute(), the result is whether the merged output is unique; duplicates dropped from
+        # either input are counted in merge_report['duplicates_left'] / ['duplicates_right']
+        return self.merge_report['duplicates_out'] == 0
@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+COLUMN_METADATA_KEY = b'original_columns'
+SOURCE_METADATA_KEY = b'source'
+
+
+def normalize_column(name):
+    return ' '.join(str(name).split())
+
+
+class DatasetStore:
+    def __init__(self, store_dir, chunksize=500000):
+        self.store_dir = store_dir
+        self.chunksize = chunksize
+        os.makedirs(store_dir, exist_ok=True)
+
+    def dataset_path(self, csv_path):
+        name = os.path.splitext(os.path.basename(csv_path))[0]
+        return os.path.join(self.store_dir, f"{name}.arrow")
+
+    def _source_fingerprint(self, csv_path):
+        stat = os.stat(csv_path)
+        return {'path': os.path.abspath(csv_path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def is_current(self, csv_path):
+        path = self.dataset_path(csv_path)
+        if not os.path.exists(path):
+            return False
+        metadata = self._open(path).schema.metadata or {}
+        source = json.loads(metadata.get(SOURCE_METADATA_KEY, b'{}'))
+        return source == self._source_fingerprint(csv_path)
+
+    def convert(self, csv_path):
+        # Parse with pandas so dtypes match what pd.read_csv gives the existing stages,
+        # then write an uncompressed Arrow IPC file that can be memory-mapped column by column
+        path = self.dataset_path(csv_path)
+        # Unique per writer, so two pipeline stages converting the same CSV cannot clobber each other
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        writer = None
+        try:
+            for chunk in pd.read_csv(csv_path, chunksize=self.chunksize):
+                original_columns = list(chunk.columns)
+                chunk.columns = [normalize_column(column) for column in original_columns]
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    metadata = {COLUMN_METADATA_KEY: json.dumps(original_columns),
+                                SOURCE_METADATA_KEY: json.dumps(self._source_fingerprint(csv_path))}
+                    schema = table.schema.with_metadata(metadata)
+                    writer = ipc.new_file(tmp_path, schema)
+                else:
+                    # Later chunks may infer narrower types (e.g. an all-null column)
+                    table = table.cast(schema.remove_metadata()).replace_schema_metadata(schema.metadata)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        os.replace(tmp_path, path)
+        return path
+
+    def convert_all(self, csv_paths):
+        return [self.convert(csv_path) for csv_path in csv_paths if not self.is_current(csv_path)]
+
+    def _open(self, path):
+        return ipc.open_file(pa.memory_map(path, 'r'))
+
+    def original_columns(self, csv_path):
+        metadata = self._open(self.dataset_path(csv_path)).schema.metadata
+        return json.loads(metadata[COLUMN_METADATA_KEY])
+
+    def load_table(self, csv_path, columns=None):
+        if not self.is_current(csv_path):
+            self.convert(csv_path)
+        # Record batches stay backed by the memory map; only selected columns are touched
+        table = self._open(self.dataset_path(csv_path)).read_all()
+        if columns is not None:
+            table = table.select([normalize_column(column) for column in columns])
+        return table
+
+    def load(self, csv_path, columns=None):
+        return self.load_table(csv_path, columns).to_pandas()
+
+    def load_compatible(self, csv_path, columns=None):
+        # Same frame pd.read_csv would give, original (unnormalized) column names included
+        frame = self.load(csv_path, columns)
+        originals = {normalize_column(column): column for column in self.original_columns(csv_path)}
+        return frame.rename(columns=originals)
+
+    def iter_compatible(self, csv_path, chunksize=None, columns=None):
+        # load_compatible one slice at a time; each slice is converted from the memory map on demand
+        table = self.load_table(csv_path, columns)
+        originals = {normalize_column(column): column for column in self.original_columns(csv_path)}
+        for batch in table.to_batches(max_chunksize=chunksize or self.chunksize):
+            yield batch.to_pandas().rename(columns=originals)
+
+
+def read_dataset(csv_path, columns=None, dataset_store=None):
+    if dataset_store is None:
+        return pd.read_csv(csv_path, usecols=columns)
+    return dataset_store.load_compatible(csv_path, columns)
+
+
+def iter_dataset(csv_path, chunksize, columns=None, dataset_store=None):
+    if dataset_store is None:
+        return iter(pd.read_csv(csv_path, usecols=columns, chunksize=chunksize))
+    return dataset_store.iter_compatible(csv_path, chunksize, columns)
@@ -0,0 +1,103 @@
+import threading
+from collections import deque
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from instrumentation.metrics import metrics
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    def __init__(self, calls_per_second):
+        self.interval = 1.0 / calls_per_second if calls_per_second else 0.0
+        self.next_call = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class EtherscanClient:
+    def __init__(self, calls_per_second=5, max_workers=8, max_retries=5, backoff_factor=0.5, timeout=30):
+        self.rate_limiter = RateLimiter(calls_per_second)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.retry_count = 0
+        self.retry_lock = threading.Lock()
+
+        # One pooled keep-alive session shared by all worker threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _is_rate_limited(self, response):
+        # Etherscan reports key-tier throttling as a 200 with a NOTOK body
+        if response.status_code != 200:
+            return False
+        try:
+            result = response.json().get('result')
+        except ValueError:
+            return False
+        return isinstance(result, str) and 'rate limit' in result.lower()
+
+    def _retry(self, reason):
+        # Called from the worker threads
+        with self.retry_lock:
+            self.retry_count += 1
+        metrics.inc('etherscan_retries_total', labels={'reason': reason})
+
+    def get(self, url):
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            # Latency is per attempt and excludes rate-limit and backoff sleeps
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                metrics.observe('etherscan_request_seconds', time.perf_counter() - start,
+                                labels={'status': type(error).__name__})
+                if attempt == self.max_retries:
+                    raise
+                reason = 'connection'
+            else:
+                rate_limited = self._is_rate_limited(response)
+                metrics.observe('etherscan_request_seconds', time.perf_counter() - start,
+                                labels={'status': 'rate_limited' if rate_limited else str(response.status_code)})
+                retryable = response.status_code in RETRY_STATUS_CODES or rate_limited
+                if not retryable or attempt == self.max_retries:
+                    return response
+                reason = 'rate_limit' if rate_limited else str(response.status_code)
+                retry_after = response.headers.get('Retry-After')
+                if retry_after and retry_after.isdigit():
+                    time.sleep(int(retry_after))
+                    self._retry(reason)
+                    continue
+            self._retry(reason)
+            time.sleep(self.backoff_factor * (2 ** attempt))
+
+    def map(self, func, items):
+        # Results come back in input order so output files stay deterministic,
+        # and only a bounded window of futures is in flight at any time
+        window = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for item in items:
+                window.append(executor.submit(func, item))
+                if len(window) >= self.max_workers * 4:
+                    yield window.popleft().result()
+            while window:
+                yield window.popleft().result()
+
+    def close(self):
+        self.session.close()
@@ -1,17 +1,36 @@
+import json
+import os
 import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
 from sklearn.manifold import TSNE
 from sklearn.preprocessing import MinMaxScaler
+from data_collection_and_processing.dataset_store import read_dataset, iter_dataset
+from data_collection_and_processing.streaming_stats import StreamingSummary, StreamingCorrelation, StratifiedReservoir
+from instrumentation.metrics import instrumented_stage
+from instrumentation.figures import show_figure
 
 class DataAnalyzer:
-    def __init__(self, data_path):
+    erc20_features = [' ERC20 total Ether received', ' ERC20 avg val sent', ' ERC20 max val rec',
+                      ' ERC20 total ether sent', ' ERC20 avg val rec', ' ERC20 max val sent']
+    empty_cols = [' ERC20 avg time between contract tnx', ' ERC20 max val sent contract',
+                  ' ERC20 min val sent contract', ' ERC20 avg val sent contract', ' ERC20 avg time between sent tnx',
+                  ' ERC20 avg time between rec tnx', ' ERC20 avg time between rec 2 tnx']
+
+    def __init__(self, data_path, dataset_store=None, output_dir=None, columns=None):
         self.data_path = data_path
+        self.dataset_store = dataset_store
+        # Only these columns are read (all of them by default)
+        self.columns = columns
+        # With an output directory every figure is written there instead of blocking on plt.show()
+        self.output_dir = output_dir
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
 
     def load_data(self):
-        self.transactions = pd.read_csv(self.data_path)
+        self.transactions = read_dataset(self.data_path, columns=self.columns, dataset_store=self.dataset_store)
         self.transactions_original = self.transactions.copy()
 
     def display_initial_info(self):
@@ -25,7 +44,7 @@ class DataAnalyzer:
 
     def plot_density_sent_tnx(self):
         sns.kdeplot(self.transactions['Sent tnx'])
-        plt.show()
+        show_figure(self.output_dir, 'density_sent_tnx')
 
     def filter_transactions(self):
         self.filtered_transactions = self.transactions[(self.transactions['Sent tnx'] < 2) & (self.transactions['FLAG'] == 1)]
@@ -33,10 +52,7 @@ class DataAnalyzer:
 
     def clean_data(self):
         self.transactions_cleaned = self.transactions.dropna()
-        empty_cols = [' ERC20 avg time between contract tnx', ' ERC20 max val sent contract',
-              ' ERC20 min val sent contract', ' ERC20 avg val sent contract', ' ERC20 avg time between sent tnx',
-              ' ERC20 avg time between rec tnx', ' ERC20 avg time between rec 2 tnx']
-        self.transactions_cleaned = self.transactions_cleaned.drop(columns=empty_cols)
+        self.transactions_cleaned = self.transactions_cleaned.drop(columns=self.empty_cols)
 
     def analyze_features(self):
         features_df = self.transactions_cleaned.drop(columns='FLAG')
@@ -45,12 +61,10 @@ class DataAnalyzer:
         upper_triangle_mask = np.triu(np.ones_like(correlation_matrix, dtype=bool))
         plt.figure(figsize=(20,12))
         sns.heatmap(correlation_matrix, mask=upper_triangle_mask, annot=True)
-        plt.show()
+        show_figure(self.output_dir, 'correlation_heatmap')
 
     def dimensionality_reduction(self):
-        erc20_features = [' ERC20 total Ether received', ' ERC20 avg val sent', ' ERC20 max val rec',
-                  ' ERC20 total ether sent', ' ERC20 avg val rec', ' ERC20 max val sent']
-        erc20_subset = self.transactions[erc20_features]
+        erc20_subset = self.transactions[self.erc20_features]
         scaler = MinMaxScaler()
         erc20_scaled = scaler.fit_transform(erc20_subset)
         pca_model = PCA(n_components=2)
@@ -60,8 +74,9 @@ class DataAnalyzer:
         self.transactions['tsne_x'] = tsne_result[:, 0]
         self.transactions['tsne_y'] = tsne_result[:, 1]
         sns.scatterplot(x='tsne_x', y='tsne_y', data=self.transactions, alpha=0.6, hue='FLAG', style='FLAG')
-        plt.show()
+        show_figure(self.output_dir, 'tsne')
 
+    @instrumented_stage('eda')
     def execute(self):
         self.load_data()
         self.display_initial_info()
@@ -70,3 +85,95 @@ class DataAnalyzer:
         self.clean_data()
         self.analyze_features()
         self.dimensionality_reduction()
+
+    def _chunks(self, chunksize):
+        # Row labels continue across chunks so sampled rows stay unique
+        start = 0
+        for chunk in iter_dataset(self.data_path, chunksize, columns=self.columns, dataset_store=self.dataset_store):
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk
+
+    def _embedding_columns(self, columns):
+        if all(column in columns for column in self.erc20_features):
+            return self.erc20_features
+        return [column for column in columns if column != 'FLAG']
+
+    def _embed(self, sample, columns, embedding, chunksize, summary):
+        rows = sample[columns].dropna()
+        low = summary.describe().loc['min', columns].to_numpy()
+        span = summary.describe().loc['max', columns].to_numpy() - low
+        span[span == 0] = 1
+        if embedding == 'pca':
+            # Approximate path: a linear projection fitted on every row in one more streaming pass,
+            # with only the sample drawn
+            model = IncrementalPCA(n_components=2)
+            for chunk in self._chunks(chunksize):
+                values = chunk[columns].dropna().to_numpy(dtype=np.float64)
+                if len(values) >= 2:
+                    model.partial_fit((values - low) / span)
+            return rows.index, model.transform((rows.to_numpy(dtype=np.float64) - low) / span)
+        # Exact t-SNE, as in dimensionality_reduction, but only on the capped stratified sample
+        pca_result = PCA(n_components=2).fit_transform((rows.to_numpy(dtype=np.float64) - low) / span)
+        return rows.index, TSNE(learning_rate=50).fit_transform(pca_result)
+
+    @instrumented_stage('eda_headless')
+    def execute_headless(self, sample_size=5000, chunksize=200000, embedding='tsne', random_state=42):
+        # One streaming pass over chunks: exact moments, KMV nunique and correlations over complete
+        # rows (clean_data's definition), plus a stratified sample for quartiles and plots
+        if self.output_dir is None:
+            raise ValueError("execute_headless needs an output_dir")
+        if embedding not in ('tsne', 'pca'):
+            raise ValueError("embedding must be 'tsne' or 'pca'")
+        summary = StreamingSummary()
+        correlation = StreamingCorrelation()
+        reservoir = StratifiedReservoir(sample_size, random_state=random_state)
+        filtered_count = 0
+        for chunk in self._chunks(chunksize):
+            summary.update(chunk)
+            reservoir.update(chunk)
+            cleaned = chunk.dropna().drop(columns=[column for column in self.empty_cols if column in chunk.columns])
+            correlation.update(cleaned.drop(columns='FLAG', errors='ignore').select_dtypes(include=np.number))
+            if 'Sent tnx' in chunk.columns and 'FLAG' in chunk.columns:
+                filtered_count += int(((chunk['Sent tnx'] < 2) & (chunk['FLAG'] == 1)).sum())
+            print(f"Summarised {summary.rows} rows")
+        sample = reservoir.sample()
+        described = summary.describe(sample)
+        correlation_matrix = correlation.matrix()
+        nunique = summary.nunique()
+
+        if 'Sent tnx' in sample.columns:
+            sns.kdeplot(sample['Sent tnx'])
+            show_figure(self.output_dir, 'density_sent_tnx')
+        upper_triangle_mask = np.triu(np.ones_like(correlation_matrix, dtype=bool))
+        plt.figure(figsize=(20, 12))
+        sns.heatmap(correlation_matrix.round(2), mask=upper_triangle_mask, annot=True)
+        show_figure(self.output_dir, 'correlation_heatmap')
+        columns = self._embedding_columns(summary.numeric)
+        index, embedded = self._embed(sample, columns, embedding, chunksize, summary)
+        plot_df = pd.DataFrame({'x': embedded[:, 0], 'y': embedded[:, 1]}, index=index)
+        if 'FLAG' in sample.columns:
+            plot_df['FLAG'] = sample.loc[index, 'FLAG']
+        sns.scatterplot(x='x', y='y', data=plot_df, alpha=0.6, hue=plot_df.get('FLAG'), style=plot_df.get('FLAG'))
+        show_figure(self.output_dir, f'embedding_{embedding}')
+
+        correlation_matrix.to_csv(os.path.join(self.output_dir, 'correlation.csv'))
+        report = {
+            'rows': summary.rows,
+            'columns': summary.columns,
+            'dtypes': summary.dtypes,
+            'describe': json.loads(described.to_json()),
+            'quartiles_from_sample': True,
+            'nunique': {column: int(value) for column, value in nunique.items()},
+            'nunique_exact': summary.nunique_exact(),
+            'filtered_sent_lt_2_flagged': filtered_count,
+            'complete_rows_for_correlation': correlation.n,
+            'class_counts': {str(label): count for label, count in reservoir.totals.items()},
+            'sample_rows': len(sample),
+            'embedding': embedding,
+            'embedding_rows': len(index),
+        }
+        with open(os.path.join(self.output_dir, 'summary.json'), 'w') as summary_file:
+            json.dump(report, summary_file, indent=2)
+        print(f"EDA written to {self.output_dir}")
+        return report
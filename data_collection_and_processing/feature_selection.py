@@ -1,24 +1,155 @@
+import os
+import joblib
+import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.inspection import permutation_importance
+from sklearn.model_selection import StratifiedKFold, cross_val_score, train_test_split
+from data_collection_and_processing.transaction_graph import LABEL_DERIVED_COLUMNS
+from instrumentation.metrics import instrumented_stage
+
+MODES = ('impurity', 'subsample', 'permutation', 'stability')
+
+
+def _stratified_subsample(X, y, subsample, random_state):
+    if subsample is None or (subsample >= 1.0 if isinstance(subsample, float) else subsample >= len(y)):
+        return X, y
+    X_sub, _, y_sub, _ = train_test_split(X, y, train_size=subsample, stratify=y, random_state=random_state)
+    return X_sub, y_sub
+
+
+def _forest_importances(X, y, subsample, random_state, n_estimators):
+    X_sub, y_sub = _stratified_subsample(X, y, subsample, random_state)
+    forest = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state, n_jobs=1)
+    return forest.fit(X_sub, y_sub).feature_importances_
+
+
+def _curve_score(X, y, features, cv, random_state, n_estimators):
+    forest = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state, n_jobs=1)
+    return cross_val_score(forest, X[features], y, scoring='f1', cv=cv)
+
 
 class FeatureSelector:
-    def __init__(self, df):
+    def __init__(self, df, mode='impurity', n_jobs=None, subsample=0.5, n_repeats=5, n_splits=5, n_estimators=100,
+                 cache_dir=None, random_state=42):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
         self.df = df
-        self.X = df.drop(['Address', 'FLAG'], axis=1)
+        # main.py drops Address before selection, so only drop it when it is still there. Columns built from
+        # other rows' labels would leak each CV fold's labels into its training rows, so they are not ranked.
+        self.X = df.drop(['Address', 'FLAG'] + LABEL_DERIVED_COLUMNS, axis=1, errors='ignore')
         self.y = df['FLAG']
-        self.rf_model = RandomForestClassifier(random_state=42)
+        self.mode = mode
+        self.n_jobs = n_jobs
+        self.subsample = subsample
+        self.n_repeats = n_repeats
+        self.n_splits = n_splits
+        self.n_estimators = n_estimators
+        self.cache_dir = cache_dir
+        self.random_state = random_state
+        self.rf_model = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state, n_jobs=n_jobs)
         self.feature_importance_df = None
         self.selected_features = None
+        self.top_n_curve = None
 
-    def fit_model(self):
+    def _cached(self, name, params, compute):
+        # Rankings are keyed by the dataset's content hash, so unchanged reruns skip every fit
+        if self.cache_dir is None:
+            return compute()
+        data_hash = joblib.hash(pd.util.hash_pandas_object(self.df, index=True).to_numpy())
+        key = joblib.hash((data_hash, tuple(self.X.columns), name, params, self.random_state))
+        path = os.path.join(self.cache_dir, f"{name}_{key}.joblib")
+        if os.path.exists(path):
+            print(f"Loaded cached {name} from {path}")
+            return joblib.load(path)
+        result = compute()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(result, tmp_path)
+        os.replace(tmp_path, path)
+        return result
+
+    def _impurity(self):
         self.rf_model.fit(self.X, self.y)
+        return pd.DataFrame({'Feature': self.X.columns, 'Importance': self.rf_model.feature_importances_})
+
+    def _subsampled(self):
+        # Independent forests on stratified subsamples, one per core
+        importances = np.array(Parallel(n_jobs=self.n_jobs)(
+            delayed(_forest_importances)(self.X, self.y, self.subsample, self.random_state + repeat,
+                                         self.n_estimators)
+            for repeat in range(self.n_repeats)
+        ))
+        return pd.DataFrame({'Feature': self.X.columns, 'Importance': importances.mean(axis=0),
+                             'Std': importances.std(axis=0)})
+
+    def _permutation(self):
+        # Permutation importance on held-out rows is not inflated for high-cardinality columns;
+        # sklearn permutes the columns in parallel
+        X_train, X_test, y_train, y_test = train_test_split(self.X, self.y, test_size=0.25, stratify=self.y,
+                                                            random_state=self.random_state)
+        X_train, y_train = _stratified_subsample(X_train, y_train, self.subsample, self.random_state)
+        self.rf_model.fit(X_train, y_train)
+        result = permutation_importance(self.rf_model, X_test, y_test, scoring='f1', n_repeats=self.n_repeats,
+                                        random_state=self.random_state, n_jobs=self.n_jobs)
+        return pd.DataFrame({'Feature': self.X.columns, 'Importance': result.importances_mean,
+                             'Std': result.importances_std})
+
+    def _stability(self):
+        # Rank features on every fold; the final order is by mean rank, which is far less
+        # sensitive than one forest to which of two correlated columns wins a split
+        folds = StratifiedKFold(n_splits=self.n_splits, shuffle=True, random_state=self.random_state)
+        importances = np.array(Parallel(n_jobs=self.n_jobs)(
+            delayed(_forest_importances)(self.X.iloc[train_index], self.y.iloc[train_index], self.subsample,
+                                         self.random_state + fold, self.n_estimators)
+            for fold, (train_index, _) in enumerate(folds.split(self.X, self.y))
+        ))
+        ranks = (-importances).argsort(axis=1).argsort(axis=1) + 1
+        return pd.DataFrame({'Feature': self.X.columns, 'Importance': importances.mean(axis=0),
+                             'Mean Rank': ranks.mean(axis=0), 'Rank Std': ranks.std(axis=0)})
+
+    @instrumented_stage('feature_ranking')
+    def fit_model(self):
+        compute = {'impurity': self._impurity, 'subsample': self._subsampled,
+                   'permutation': self._permutation, 'stability': self._stability}[self.mode]
+        params = (self.subsample, self.n_repeats, self.n_splits, self.n_estimators)
+        self.feature_importance_df = self._cached(f"ranking_{self.mode}", params, compute)
 
     def get_feature_importances(self):
-        feature_importances = self.rf_model.feature_importances_
-        self.feature_importance_df = pd.DataFrame({'Feature': self.X.columns, 'Importance': feature_importances})
-        self.feature_importance_df = self.feature_importance_df.sort_values(by='Importance', ascending=False)
+        if self.feature_importance_df is None:
+            self.fit_model()
+        sort_by = ['Mean Rank', 'Importance'] if 'Mean Rank' in self.feature_importance_df else ['Importance']
+        self.feature_importance_df = self.feature_importance_df.sort_values(
+            by=sort_by, ascending=[column == 'Mean Rank' for column in sort_by])
+        return self.feature_importance_df
+
+    def _top_n_curve(self, candidates, cv):
+        ranked = list(self.feature_importance_df['Feature'])
+        folds = StratifiedKFold(n_splits=cv, shuffle=True, random_state=self.random_state)
+        scores = Parallel(n_jobs=self.n_jobs)(
+            delayed(_curve_score)(self.X, self.y, ranked[:top_n], folds, self.random_state, self.n_estimators)
+            for top_n in candidates
+        )
+        return pd.DataFrame({'Top N': candidates, 'F1 Mean': [np.mean(s) for s in scores],
+                             'F1 Std': [np.std(s) for s in scores]})
 
-    def select_top_features(self, top_n=8):
+    @instrumented_stage('feature_selection')
+    def select_top_features(self, top_n=8, cv=3, max_features=None):
+        # Both the prefixes cross-validated for 'auto' and the final head() need the ranked order,
+        # whether or not get_feature_importances() was called first
+        self.get_feature_importances()
+        if top_n == 'auto':
+            # Cross-validated F1 for each prefix of the ranking; take the smallest prefix whose
+            # score is within one standard error of the best
+            candidates = list(range(1, min(max_features or len(self.X.columns), len(self.X.columns)) + 1))
+            params = (tuple(self.feature_importance_df['Feature']), tuple(candidates), cv, self.n_estimators)
+            self.top_n_curve = self._cached('top_n_curve', params, lambda: self._top_n_curve(candidates, cv))
+            best = self.top_n_curve.loc[self.top_n_curve['F1 Mean'].idxmax()]
+            tolerance = best['F1 Std'] / np.sqrt(cv)
+            top_n = int(self.top_n_curve.loc[self.top_n_curve['F1 Mean'] >= best['F1 Mean'] - tolerance,
+                                             'Top N'].min())
+            print(f"Selected top {top_n} features (best CV F1 {best['F1 Mean']:.4f} at {int(best['Top N'])})")
         self.selected_features = self.feature_importance_df.head(top_n)['Feature']
 
     def get_selected_dataframe(self):
@@ -1,33 +1,183 @@
 import os
+import time
+from itertools import islice
 import requests
+import numpy as np
 import pandas as pd
 from web3 import Web3
+from data_collection_and_processing.etherscan_client import EtherscanClient
+from data_collection_and_processing.response_cache import ResponseCache, CheckpointManifest
+from data_collection_and_processing.batch_features import BatchFeatureExtractor, STAT_COLUMNS
+from data_collection_and_processing.streaming_aggregator import TransactionAccumulator, AddressStateStore
+from data_collection_and_processing.result_sink import FeatureSink
+from data_collection_and_processing.address_index import AddressIndex, equal_addresses
+from data_collection_and_processing.transaction_graph import EdgeCollector
+from instrumentation.metrics import metrics, instrumented_stage
+
+MAX_WINDOW_RESULTS = 10000
+# Fixed output schema: every row, mined or empty, is written in this column order
+FEATURE_COLUMNS = ['Address', 'FLAG'] + STAT_COLUMNS
+INTEGER_COLUMNS = ['FLAG', 'total_sent_transactions', 'total_received_transactions', 'unique_sent_addresses',
+                   'unique_received_addresses', 'num_created_contracts', 'total_transactions']
+# Returned by the workers when an address could not be fetched (HTTP error, NOTOK or rate-limit
+# string, exception, cache miss offline), as opposed to None for an account with nothing to score
+FETCH_FAILED = object()
 
 class EthereumTransactionAnalyzer:
-    def __init__(self, api_key, address_file_path, output_file_path):
+    def __init__(self, api_key, address_file_path, output_file_path, base_url="https://api.etherscan.io/api",
+                 cache_dir=None, cache_max_bytes=2 * 1024 ** 3, state_dir=None, flag=1,
+                 output_format='csv', flush_every=1000, edge_dir=None):
         self.api_key = api_key
         self.address_file_path = address_file_path
         self.output_file_path = output_file_path
-        self.combined_df = pd.DataFrame()
+        self.base_url = base_url
+        self.flag = flag
+        self.output_format = output_format
+        self.flush_every = flush_every
+        self.sink = None
+        self.pending_checkpoints = []
+        self.failed_addresses = []
         self.total_txns_count = 0
+        self.client = None
+        self.cache = ResponseCache(cache_dir, cache_max_bytes) if cache_dir else None
+        self.checkpoint = CheckpointManifest(f"{output_file_path}.checkpoint")
+        self.state_store = AddressStateStore(state_dir) if state_dir else None
+        # Counterparty edges for the transaction graph, collected from every fetched list
+        self.edges = EdgeCollector(edge_dir) if edge_dir else None
+        self.offline = False
+        self.page_size = 10000
+
+    @property
+    def combined_df(self):
+        return self.sink.to_frame() if self.sink is not None else pd.DataFrame(columns=FEATURE_COLUMNS)
 
-    def create_api_url(self, wallet_address, page_number, limit):
-        base_url = "https://api.etherscan.io/api"
-        params = f"module=account&action=txlist&address={wallet_address}&startblock=0&endblock=99999999"
+    def create_api_url(self, wallet_address, page_number, limit, start_block=0, end_block=99999999):
+        params = f"module=account&action=txlist&address={wallet_address}&startblock={start_block}&endblock={end_block}"
         params += f"&page={page_number}&offset={limit}&sort=asc&apikey={self.api_key}"
-        return f"{base_url}?{params}"
+        return f"{self.base_url}?{params}"
 
-    def analyze_ethereum_transactions(self, wallet_address):
-        api_url = self.create_api_url(wallet_address, 1, 0)
-        api_response = requests.get(api_url)
+    def fetch_transactions(self, wallet_address, start_block=0, end_block=99999999):
+        if self.cache is not None:
+            cached = self.cache.get(wallet_address, start_block, end_block)
+            if cached is not None:
+                return cached
+        if self.offline:
+            return None
+
+        result = self._get_result(self.create_api_url(wallet_address, 1, 0, start_block, end_block))
+        # Only real transaction lists are cached, never error strings
+        if self.cache is not None and isinstance(result, list):
+            self.cache.put(wallet_address, result, start_block, end_block)
+        return result
+
+    def _collect_edges(self, transactions):
+        if self.edges is not None and isinstance(transactions, list):
+            self.edges.add(transactions)
+
+    def _get_result(self, api_url):
+        if self.client:
+            api_response = self.client.get(api_url)
+        else:
+            # The sequential path has no client, so its single attempt is timed here
+            start = time.perf_counter()
+            api_response = requests.get(api_url)
+            metrics.observe('etherscan_request_seconds', time.perf_counter() - start,
+                            labels={'status': str(api_response.status_code)})
         if api_response.status_code != 200:
+            return None
+        return api_response.json()['result']
+
+    def iter_transaction_pages(self, wallet_address, page_size=10000, start_block=0, end_block=99999999,
+                               skip_hashes=()):
+        # Etherscan serves at most 10,000 rows per block window (page * offset <= 10000), so page
+        # through each window and then restart the window at the last block seen. Transactions
+        # of that boundary block are re-served and skipped by hash.
+        pages_per_window = max(MAX_WINDOW_RESULTS // page_size, 1)
+        boundary_hashes = set(skip_hashes)
+        while True:
+            # The boundary block can span several pages of the window, so its hashes are gathered
+            # page by page and restarted whenever a page ends in a newer block
+            last_block, last_block_hashes = None, set()
+            for page_number in range(1, pages_per_window + 1):
+                page = self._get_result(self.create_api_url(wallet_address, page_number, page_size,
+                                                            start_block, end_block))
+                if not isinstance(page, list):
+                    raise RuntimeError(f"Etherscan returned no transaction list for {wallet_address}: {page}")
+                fresh = [tx for tx in page if tx['hash'] not in boundary_hashes]
+                if fresh:
+                    yield fresh
+                if len(page) < page_size:
+                    return
+                page_last_block = int(page[-1]['blockNumber'])
+                if page_last_block != last_block:
+                    last_block, last_block_hashes = page_last_block, set()
+                for tx in reversed(page):
+                    if int(tx['blockNumber']) != last_block:
+                        break
+                    last_block_hashes.add(tx['hash'])
+            if last_block == start_block:
+                raise RuntimeError(f"Block {last_block} holds more than {MAX_WINDOW_RESULTS} transactions "
+                                   f"for {wallet_address}")
+            boundary_hashes = last_block_hashes
+            start_block = last_block
+
+    def analyze_ethereum_transactions_streaming(self, wallet_address, page_size=10000):
+        # Constant memory per address: pages are folded into running accumulators and dropped
+        accumulator = TransactionAccumulator(wallet_address)
+        for page in self.iter_transaction_pages(wallet_address, page_size):
+            accumulator.fold(page)
+            self._collect_edges(page)
+        # A full recompute also seeds the state used by update_addresses
+        if self.state_store is not None:
+            self.state_store.save(accumulator)
+        return self._accumulator_row(accumulator)
+
+    def refresh_address_state(self, wallet_address, page_size=10000):
+        # Fetch only blocks from the stored watermark on; the watermark block itself is re-read
+        # and its already-folded transactions skipped by hash, so nothing is lost or counted twice
+        accumulator = self.state_store.load(wallet_address)
+        if accumulator is None:
+            accumulator = TransactionAccumulator(wallet_address)
+        start_block = accumulator.last_block if accumulator.last_block is not None else 0
+        for page in self.iter_transaction_pages(wallet_address, page_size, start_block,
+                                                skip_hashes=accumulator.last_block_hashes):
+            accumulator.fold(page)
+            self._collect_edges(page)
+        self.state_store.save(accumulator)
+        return accumulator
+
+    def _accumulator_row(self, accumulator):
+        if not accumulator.is_complete():
             return pd.DataFrame()
-        transaction_data = pd.DataFrame(api_response.json()['result'])
+        return pd.DataFrame([accumulator.to_stats()])
+
+    def analyze_ethereum_transactions(self, wallet_address):
+        transactions = self.fetch_transactions(wallet_address)
+        if transactions is None:
+            return pd.DataFrame()
+        self._collect_edges(transactions)
+        return self.compute_transaction_stats(wallet_address, transactions)
+
+    def analyze_ethereum_transactions_batch(self, transactions_by_address):
+        # Same rows as compute_transaction_stats, from one vectorized pass over many addresses.
+        # Addresses the per-address path cannot score (failed fetch, no sent or no received
+        # transactions) map to None so callers fall back to handle_empty_address as before.
+        valid = {address: txs for address, txs in transactions_by_address.items() if isinstance(txs, list)}
+        extractor, columns = BatchFeatureExtractor.from_transaction_lists(valid)
+        stats = extractor.extract(**columns)
+        complete = (stats['total_sent_transactions'] > 0) & (stats['total_received_transactions'] > 0)
+        rows = dict.fromkeys(transactions_by_address)
+        rows.update(zip(stats.index[complete], stats[complete].to_dict('records')))
+        return rows
+
+    def compute_transaction_stats(self, wallet_address, transactions):
+        transaction_data = pd.DataFrame(transactions)
 
         # Convert Wei to ETH
         transaction_data['value_in_eth'] = transaction_data['value'].apply(lambda x: Web3.fromWei(int(x), 'ether'))
-        transaction_data['transaction_type'] = transaction_data['from'].apply(
-            lambda x: 'outgoing' if x == wallet_address else 'incoming')
+        # Case-insensitive: Etherscan answers in lower case, checksummed input addresses are mixed case
+        transaction_data['transaction_type'] = np.where(
+            equal_addresses(transaction_data['from'].to_numpy(), wallet_address), 'outgoing', 'incoming')
 
         # Analyze sent transactions
         sent_transactions = transaction_data[transaction_data['transaction_type'] == 'outgoing']
@@ -87,7 +237,7 @@ class EthereumTransactionAnalyzer:
 
     def handle_empty_address(self, wallet_address):
         empty_stats = {
-            'Address': wallet_address, 'FLAG': 1,
+            'Address': wallet_address, 'FLAG': self.flag,
             'total_sent_transactions': 0, 'total_received_transactions': 0,
             'num_created_contracts': 0,
             'unique_received_addresses': 0, 'unique_sent_addresses': 0,
@@ -101,25 +251,171 @@ class EthereumTransactionAnalyzer:
         }
         return pd.DataFrame([empty_stats])
 
-    def process_addresses(self):
+    def _fetch_and_analyze(self, address):
+        # Runs on worker threads: never raise, hand a stats dict, None (nothing to score) or
+        # FETCH_FAILED back to the writer
+        try:
+            transactions = self.fetch_transactions(address)
+        except Exception:
+            return FETCH_FAILED
+        if not isinstance(transactions, list):
+            return FETCH_FAILED
+        try:
+            self._collect_edges(transactions)
+            return self.compute_transaction_stats(address, transactions).iloc[0].to_dict()
+        except Exception:
+            return None
+
+    def _stream_and_analyze(self, address):
+        try:
+            row = self.analyze_ethereum_transactions_streaming(address, self.page_size)
+        except Exception:
+            return FETCH_FAILED
+        return row.iloc[0].to_dict() if len(row) else None
+
+    def _refresh_and_analyze(self, address):
+        try:
+            accumulator = self.refresh_address_state(address, self.page_size)
+        except Exception:
+            return FETCH_FAILED
+        return accumulator.to_stats() if accumulator.is_complete() else None
+
+    def _fetch_only(self, address):
+        try:
+            transactions = self.fetch_transactions(address)
+        except Exception:
+            return FETCH_FAILED
+        if not isinstance(transactions, list):
+            return FETCH_FAILED
+        self._collect_edges(transactions)
+        return transactions
+
+    def _record_batches(self, pending, results, batch_size):
+        chunks = zip(pending, results)
+        while True:
+            chunk = list(islice(chunks, batch_size))
+            if not chunk:
+                break
+            transactions_by_address = {address: txs for (_, address), txs in chunk}
+            try:
+                rows = self.analyze_ethereum_transactions_batch(transactions_by_address)
+            except Exception:
+                rows = {}
+            for (index, address), txs in chunk:
+                self._record_result(index, address, FETCH_FAILED if txs is FETCH_FAILED else rows.get(address))
+
+    def _acknowledge_rows(self, count):
+        # Checkpoint only rows the sink has durably written, and only once their edges are on disk too:
+        # a resumed run does not fetch checkpointed addresses again, so edges still buffered would be lost
+        if self.edges is not None:
+            self.edges.flush()
+        for index, address, current_txns in self.pending_checkpoints[:count]:
+            self.checkpoint.mark_done(index, address, current_txns)
+        del self.pending_checkpoints[:count]
+
+    def _record_result(self, index, address, stats):
+        if stats is FETCH_FAILED:
+            # No row and no checkpoint entry, so a resumed run fetches the address again
+            self.failed_addresses.append(address)
+            metrics.inc('mining_fetch_failures_total')
+            print(f"Address {index}: {address} failed to fetch; left for a resumed run.")
+            return
+        if stats is not None:
+            current_txns = stats['total_transactions']
+            self.total_txns_count += current_txns
+            print(f"Address {index}: {address} processed. {current_txns} transactions retrieved. Total: {self.total_txns_count}.")
+        else:
+            current_txns = 0
+            stats = self.handle_empty_address(address).iloc[0].to_dict()
+            print(f"Address {index}: {address} processed. No transactions retrieved. Total: {self.total_txns_count}.")
+        self.pending_checkpoints.append((index, address, current_txns))
+        self.sink.append({**stats, 'Address': address, 'FLAG': stats.get('FLAG', self.flag)})
+
+    def _pending_addresses(self, resume):
         address_list = pd.read_csv(self.address_file_path)
         addresses = address_list['Address'].tolist()
+        # The same address in another letter case is the same account; mine it once
+        address_index = AddressIndex(address_list['Address'].to_numpy())
+        if not address_index.is_unique:
+            print(f"Skipping {len(addresses) - len(address_index)} duplicate addresses.")
 
-        for index, address in enumerate(addresses):
-            try:
-                temp_df = self.analyze_ethereum_transactions(address)
-                mode = 'w' if index == 0 else 'a'
-                header = True if index == 0 else False
-                temp_df.to_csv(self.output_file_path, mode=mode, index=False, header=header)
-                self.combined_df = pd.concat([self.combined_df, temp_df])
-                current_txns = temp_df.iloc[0]['total_transactions']
-                self.total_txns_count += current_txns
-                print(f"Address {index}: {address} processed. {current_txns} transactions retrieved. Total: {self.total_txns_count}.")
-            except Exception as e:
-                empty_df = self.handle_empty_address(address)
-                self.combined_df = pd.concat([self.combined_df, empty_df])
-                empty_df.to_csv(self.output_file_path, mode='a', index=False, header=False)
-                print(f"Address {index}: {address} processed. No transactions retrieved. Total: {self.total_txns_count}.")
-
-        self.combined_df.reset_index(drop=True, inplace=True)
+        if resume:
+            self.checkpoint.load()
+        else:
+            self.checkpoint.reset()
+        # Rows are buffered and written in batches with a fixed schema; a resumed run appends
+        self.pending_checkpoints = []
+        self.failed_addresses = []
+        self.sink = FeatureSink(self.output_file_path, FEATURE_COLUMNS, batch_size=self.flush_every,
+                                file_format=self.output_format, append=bool(self.checkpoint.completed),
+                                on_flush=self._acknowledge_rows, integer_columns=INTEGER_COLUMNS)
+        pending = [(index, addresses[index]) for index in address_index.first_rows().tolist()
+                   if not self.checkpoint.is_done(addresses[index])]
+        if resume:
+            print(f"Resuming: {len(address_index) - len(pending)} addresses already done, {len(pending)} remaining.")
+        return pending
+
+    def _run(self, pending, worker, concurrent, max_workers, calls_per_second, max_retries, batch_size=None):
+        pending_addresses = [address for _, address in pending]
+        try:
+            if concurrent and not self.offline:
+                # Concurrent mode: pooled keep-alive session, shared rate limit, retries with backoff
+                self.client = EtherscanClient(calls_per_second=calls_per_second, max_workers=max_workers,
+                                              max_retries=max_retries)
+                results = self.client.map(worker, pending_addresses)
+            else:
+                results = map(worker, pending_addresses)
+
+            if batch_size:
+                self._record_batches(pending, results, batch_size)
+            else:
+                for (index, address), temp_df in zip(pending, results):
+                    self._record_result(index, address, temp_df)
+        finally:
+            if self.client is not None:
+                self.client.close()
+                self.client = None
+            self.sink.close()
+            self.checkpoint.close()
+            if self.edges is not None:
+                self.edges.close()
+            self.offline = False
+        if self.failed_addresses:
+            print(f"{len(self.failed_addresses)} addresses failed to fetch and were not written; "
+                  f"rerun with resume=True to retry them.")
+
+    @instrumented_stage('mining')
+    def process_addresses(self, concurrent=False, max_workers=8, calls_per_second=5, max_retries=5,
+                          resume=False, features_only=False, batch_size=None, streaming=False, page_size=10000):
+        # Features-only mode rebuilds the whole output from cached responses without network calls
+        if features_only and self.cache is None:
+            raise ValueError("features_only requires a cache_dir")
+        if streaming and (batch_size or features_only):
+            raise ValueError("streaming cannot be combined with batch_size or features_only")
+        self.page_size = page_size
+        self.offline = features_only
+        pending = self._pending_addresses(resume and not features_only)
+        # A full run rebuilds the edges too; a resumed one appends, and repeats are dropped by hash
+        if self.edges is not None and (features_only or not resume):
+            self.edges.reset()
+
+        # With batch_size set, workers only fetch and features are extracted per chunk in one vectorized pass;
+        # with streaming set, each address is paged and folded into running aggregates
+        if batch_size:
+            worker = self._fetch_only
+        elif streaming:
+            worker = self._stream_and_analyze
+        else:
+            worker = self._fetch_and_analyze
+        self._run(pending, worker, concurrent, max_workers, calls_per_second, max_retries, batch_size)
 
+    @instrumented_stage('mining_update')
+    def update_addresses(self, concurrent=False, max_workers=8, calls_per_second=5, max_retries=5,
+                         resume=False, page_size=10000):
+        # Incremental refresh: only blocks after each address's stored watermark are fetched and
+        # merged into its persisted aggregates, and the output is rewritten from the merged state
+        if self.state_store is None:
+            raise ValueError("update_addresses requires a state_dir")
+        self.page_size = page_size
+        pending = self._pending_addresses(resume)
+        self._run(pending, self._refresh_and_analyze, concurrent, max_workers, calls_per_second, max_retries)
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import threading
+
+
+class ResponseCache:
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.refs_dir = os.path.join(cache_dir, 'refs')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.refs_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(self.objects_dir))
+
+    def _ref_path(self, address, start_block, end_block):
+        key = f"{address.lower()}:{start_block}:{end_block}"
+        return os.path.join(self.refs_dir, hashlib.sha256(key.encode()).hexdigest())
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, f"{digest}.json")
+
+    def get(self, address, start_block=0, end_block=99999999):
+        try:
+            with open(self._ref_path(address, start_block, end_block)) as ref:
+                object_path = self._object_path(ref.read().strip())
+            with open(object_path) as blob:
+                result = json.load(blob)
+            # Reads count as use for LRU eviction
+            os.utime(object_path)
+        except (OSError, ValueError):
+            return None
+        return result
+
+    def put(self, address, result, start_block=0, end_block=99999999):
+        payload = json.dumps(result, separators=(',', ':')).encode()
+        digest = hashlib.sha256(payload).hexdigest()
+        object_path = self._object_path(digest)
+        with self.lock:
+            # Identical responses (e.g. empty histories) are stored once
+            if not os.path.exists(object_path):
+                tmp_path = f"{object_path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as blob:
+                    blob.write(payload)
+                os.replace(tmp_path, object_path)
+                self.total_bytes += len(payload)
+            with open(self._ref_path(address, start_block, end_block), 'w') as ref:
+                ref.write(digest)
+            if self.total_bytes > self.max_bytes:
+                self._evict(protect=object_path)
+
+    def _evict(self, protect=None):
+        # Drop least recently used objects until the cache is 10% under its limit;
+        # refs left pointing at evicted objects read as misses
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                         for entry in os.scandir(self.objects_dir) if entry.path != protect)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.total_bytes -= size
+
+
+class CheckpointManifest:
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.completed = set()
+        self.handle = None
+
+    def load(self):
+        self.completed = set()
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as manifest:
+                for line in manifest:
+                    try:
+                        self.completed.add(json.loads(line)['address'].lower())
+                    except (ValueError, KeyError):
+                        # A crash can leave a torn last line
+                        continue
+        return self.completed
+
+    def is_done(self, address):
+        return address.lower() in self.completed
+
+    def reset(self):
+        self.close()
+        self.completed = set()
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def mark_done(self, index, address, total_transactions):
+        if self.handle is None:
+            self.handle = open(self.manifest_path, 'a', buffering=1)
+        self.handle.write(json.dumps({'index': index, 'address': address,
+                                      'total_transactions': int(total_transactions)}) + '\n')
+        self.completed.add(address.lower())
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
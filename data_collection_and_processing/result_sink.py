@@ -0,0 +1,121 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+class FeatureSink:
+    def __init__(self, output_path, columns, batch_size=1000, file_format='csv', append=False, on_flush=None,
+                 integer_columns=()):
+        if file_format not in ('csv', 'parquet'):
+            raise ValueError(f"Unsupported file format: {file_format}")
+        self.output_path = output_path
+        self.columns = list(columns)
+        self.integer_columns = set(integer_columns)
+        self.batch_size = batch_size
+        self.file_format = file_format
+        self.append_to_existing = append and os.path.exists(output_path)
+        self.on_flush = on_flush
+        self.frames = []
+        self.parquet_writer = None
+        self.started = False
+        self.unacknowledged = 0
+        self._frame = None
+        self._allocate()
+
+    def _allocate(self):
+        # One preallocated array per column; only Address is non-numeric, and flags and counts stay
+        # integers so the file reads like the shipped data (FLAG=1, not 1.0)
+        self.buffers = {column: np.empty(self.batch_size, dtype=self._dtype(column)) for column in self.columns}
+        # int64 has no NaN, so missing integers are masked and written as empty fields
+        self.missing = {column: np.zeros(self.batch_size, dtype=bool) for column in self.columns
+                        if column in self.integer_columns}
+        self.size = 0
+
+    def _dtype(self, column):
+        if column == 'Address':
+            return object
+        return np.int64 if column in self.integer_columns else np.float64
+
+    def append(self, row):
+        for column in self.columns:
+            value = row.get(column)
+            if column in self.missing:
+                value = self._integer(column, value)
+            self.buffers[column][self.size] = np.nan if value is None else value
+        self.size += 1
+        self._frame = None
+        if self.size == self.batch_size:
+            self.flush()
+
+    def _integer(self, column, value):
+        if value is None or pd.isna(value):
+            self.missing[column][self.size] = True
+            return 0
+        if value != int(value):
+            raise ValueError(f"{column} must be an integer, got {value!r}")
+        self.missing[column][self.size] = False
+        return int(value)
+
+    def _buffered_frame(self):
+        return pd.DataFrame({column: pd.arrays.IntegerArray(self.buffers[column][:self.size],
+                                                            self.missing[column][:self.size].copy())
+                             if column in self.missing else self.buffers[column][:self.size]
+                             for column in self.columns})
+
+    def flush(self):
+        if not self.size:
+            return
+        frame = self._buffered_frame()
+        if self.file_format == 'csv':
+            self._write_csv(frame)
+        else:
+            self._write_parquet(frame)
+        self.frames.append(frame)
+        self._frame = None
+        self.unacknowledged += self.size
+        self._allocate()
+        # CSV rows are durable once appended; Parquet rows only once the file is finalised in close()
+        if self.file_format == 'csv':
+            self._acknowledge()
+
+    def _acknowledge(self):
+        if self.on_flush is not None and self.unacknowledged:
+            self.on_flush(self.unacknowledged)
+        self.unacknowledged = 0
+
+    def _write_csv(self, frame):
+        first = not self.started and not self.append_to_existing
+        frame.to_csv(self.output_path, mode='w' if first else 'a', index=False, header=first)
+        self.started = True
+
+    def _write_parquet(self, frame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if self.parquet_writer is None:
+            # Parquet files cannot be appended to, so a resumed run copies the existing rows first
+            existing = pq.read_table(self.output_path) if self.append_to_existing else None
+            self.parquet_writer = pq.ParquetWriter(f"{self.output_path}.tmp", table.schema)
+            if existing is not None:
+                self.parquet_writer.write_table(existing.select(self.columns).cast(table.schema))
+        self.parquet_writer.write_table(table)
+        self.started = True
+
+    def close(self):
+        self.flush()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+            os.replace(f"{self.output_path}.tmp", self.output_path)
+        self._acknowledge()
+
+    def to_frame(self):
+        # combined_df view: built once on demand instead of concatenating on every row
+        if self._frame is None:
+            if len(self.frames) > 1:
+                self.frames = [pd.concat(self.frames, ignore_index=True)]
+            frames = self.frames + ([self._buffered_frame()] if self.size else [])
+            self._frame = (pd.concat(frames, ignore_index=True) if frames
+                           else pd.DataFrame(columns=self.columns))
+        return self._frame
@@ -0,0 +1,223 @@
+import numpy as np
+from data_collection_and_processing.batch_features import STAT_COLUMNS
+
+WEI_PER_ETH = 10 ** 18
+
+# Names the mined stats carry in address_data_ethereum.csv and the combined dataset
+DATASET_COLUMNS = {
+    'avg_time_between_sent': 'Avg min between sent tnx',
+    'avg_time_between_received': 'Avg min between received tnx',
+    'time_diff_first_last': 'Time Diff between first and last (Mins)',
+    'total_sent_transactions': 'Sent tnx',
+    'total_received_transactions': 'Received Tnx',
+    'num_created_contracts': 'Number of Created Contracts',
+    'unique_received_addresses': 'Unique Received From Addresses',
+    'unique_sent_addresses': 'Unique Sent To Addresses',
+    'min_received_value': 'min value received',
+    'max_received_value': 'max value received ',
+    'avg_received_value': 'avg val received',
+    'min_sent_value': 'min val sent',
+    'max_sent_value': 'max val sent',
+    'avg_sent_value': 'avg val sent',
+    'min_contract_value': 'min value sent to contract',
+    'max_contract_value': 'max val sent to contract',
+    'avg_contract_value': 'avg value sent to contract',
+    'total_transactions': 'total transactions (including tnx to create contract',
+    'total_eth_sent': 'total Ether sent',
+    'total_eth_received': 'total ether received',
+    'total_eth_sent_to_contracts': 'total ether sent contracts',
+    'total_eth_balance': 'total ether balance',
+}
+
+
+def counterparty_key(address):
+    # 64 bits of the address are plenty to count distinct counterparties inside one window
+    return int(address[2:18] or '0', 16) if address else 0
+
+
+class AddressWindow:
+    __slots__ = ('size', 'timestamp', 'value', 'counterparty', 'outgoing', 'creates_contract', 'last_seen')
+
+    def __init__(self, capacity=8):
+        self.size = 0
+        self.last_seen = 0
+        self.timestamp = np.empty(capacity, dtype=np.int64)
+        self.value = np.empty(capacity, dtype=np.float64)
+        self.counterparty = np.empty(capacity, dtype=np.uint64)
+        self.outgoing = np.empty(capacity, dtype=bool)
+        self.creates_contract = np.empty(capacity, dtype=bool)
+
+    def _arrays(self):
+        return ('timestamp', 'value', 'counterparty', 'outgoing', 'creates_contract')
+
+    def _resize(self, capacity):
+        for name in self._arrays():
+            array = getattr(self, name)
+            resized = np.empty(capacity, dtype=array.dtype)
+            resized[:self.size] = array[:self.size]
+            setattr(self, name, resized)
+
+    def add(self, timestamp, value, counterparty, outgoing, creates_contract, max_events):
+        if self.size == len(self.timestamp):
+            if self.size < max_events:
+                # Start small and double, so quiet addresses stay a few hundred bytes
+                self._resize(min(max_events, 2 * self.size))
+            else:
+                # Full window: the oldest event makes room
+                for name in self._arrays():
+                    array = getattr(self, name)
+                    array[:-1] = array[1:]
+                self.size -= 1
+        index = self.size
+        self.timestamp[index] = timestamp
+        self.value[index] = value
+        self.counterparty[index] = counterparty
+        self.outgoing[index] = outgoing
+        self.creates_contract[index] = creates_contract
+        self.size += 1
+        self.last_seen = max(self.last_seen, timestamp)
+
+    def expire(self, cutoff):
+        keep = self.timestamp[:self.size] >= cutoff
+        if keep.all():
+            return
+        kept = int(keep.sum())
+        for name in self._arrays():
+            array = getattr(self, name)
+            array[:kept] = array[:self.size][keep]
+        self.size = kept
+        if kept * 4 < len(self.timestamp) and len(self.timestamp) > 8:
+            self._resize(max(8, 2 * kept))
+
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self._arrays())
+
+
+class SlidingWindowStore:
+    def __init__(self, window_seconds=30 * 24 * 3600, max_events=256, idle_seconds=7 * 24 * 3600,
+                 max_addresses=100000, on_evict=None):
+        self.window_seconds = window_seconds
+        self.max_events = max_events
+        self.idle_seconds = idle_seconds
+        self.max_addresses = max_addresses
+        # Called with the evicted addresses on every eviction, including the forced one in observe(),
+        # so state kept elsewhere per address can be dropped with the window
+        self.on_evict = on_evict
+        self.windows = {}
+        self.evicted = 0
+        self.clock = 0
+
+    def __len__(self):
+        return len(self.windows)
+
+    def observe(self, address, transaction):
+        # Folds one txlist-schema transaction into `address`'s window; returns False if it
+        # does not involve the address
+        address = address.lower()
+        sender = transaction['from'].lower()
+        receiver = transaction['to'].lower()
+        if address not in (sender, receiver):
+            return False
+        timestamp = int(transaction['timeStamp'])
+        self.clock = max(self.clock, timestamp)
+        window = self.windows.get(address)
+        if window is None:
+            if len(self.windows) >= self.max_addresses:
+                self.evict_idle(force=True)
+            window = self.windows[address] = AddressWindow()
+        outgoing = sender == address
+        window.add(timestamp, int(transaction['value']) / WEI_PER_ETH,
+                   counterparty_key(receiver if outgoing else sender), outgoing,
+                   transaction.get('contractAddress', '') != '', self.max_events)
+        window.expire(self.clock - self.window_seconds)
+        return True
+
+    def stats_matrix(self, addresses, keys=STAT_COLUMNS):
+        # Same definitions as compute_transaction_stats over the events still in each window,
+        # computed for many addresses at once with segmented reductions; statistics of an empty
+        # direction are 0, as in handle_empty_address
+        windows = [self.windows[address.lower()] for address in addresses]
+        for window in windows:
+            window.expire(self.clock - self.window_seconds)
+        sizes = np.array([window.size for window in windows], dtype=np.int64)
+        n = len(windows)
+        group = np.repeat(np.arange(n), sizes)
+        timestamp, value, counterparty, outgoing, creates_contract = (
+            np.concatenate([getattr(window, name)[:window.size] for window in windows] or [np.empty(0)])
+            for name in ('timestamp', 'value', 'counterparty', 'outgoing', 'creates_contract'))
+        outgoing = outgoing.astype(bool)
+        contract = outgoing & creates_contract.astype(bool)
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+        present = sizes > 0
+
+        def segment(ufunc, values, fill):
+            result = np.full(n, fill, dtype=np.float64)
+            if len(values):
+                result[present] = ufunc.reduceat(values, starts[present])
+            return result
+
+        stats = {}
+        for prefix, mask in (('sent', outgoing), ('received', ~outgoing), ('contract', contract)):
+            count = np.bincount(group[mask], minlength=n)
+            total = np.bincount(group[mask], weights=value[mask], minlength=n)
+            low = segment(np.minimum, np.where(mask, value, np.inf), np.inf)
+            high = segment(np.maximum, np.where(mask, value, -np.inf), -np.inf)
+            empty = count == 0
+            stats[f'min_{prefix}_value'] = np.where(empty, 0.0, low)
+            stats[f'max_{prefix}_value'] = np.where(empty, 0.0, high)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                stats[f'avg_{prefix}_value'] = np.where(empty, 0.0, total / count)
+            stats[f'{prefix}_count'] = count
+            stats[f'{prefix}_total'] = total
+            timestamp_sum = np.bincount(group[mask], weights=timestamp[mask].astype(np.float64), minlength=n)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                stats[f'{prefix}_avg_minutes'] = np.where(empty, 0.0, timestamp_sum / 60 / count)
+
+        # Distinct counterparties: first occurrence of each (address, direction, counterparty)
+        order = np.lexsort((counterparty, outgoing, group))
+        keys_sorted = np.stack([group[order], outgoing[order], counterparty[order].astype(np.int64)])
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (keys_sorted[:, 1:] != keys_sorted[:, :-1]).any(axis=0)
+        stats['unique_sent_addresses'] = np.bincount(group[order][first & outgoing[order]], minlength=n)
+        stats['unique_received_addresses'] = np.bincount(group[order][first & ~outgoing[order]], minlength=n)
+
+        first_timestamp = segment(np.minimum, timestamp, 0)
+        last_timestamp = segment(np.maximum, timestamp, 0)
+        stats.update({
+            'total_sent_transactions': stats['sent_count'],
+            'total_eth_sent': stats['sent_total'],
+            'total_eth_sent_to_contracts': stats['contract_total'],
+            'total_received_transactions': stats['received_count'],
+            'total_eth_received': stats['received_total'],
+            'time_diff_first_last': (last_timestamp - first_timestamp) / 60,
+            'total_transactions': sizes,
+            'num_created_contracts': np.bincount(group[creates_contract.astype(bool)], minlength=n),
+            'avg_time_between_sent': stats['sent_avg_minutes'],
+            'avg_time_between_received': stats['received_avg_minutes'],
+            'total_eth_balance': stats['received_total'] - stats['sent_total'],
+        })
+        return np.column_stack([np.asarray(stats[key], dtype=np.float64) for key in keys]).reshape(n, len(keys))
+
+    def stats(self, address):
+        return dict(zip(STAT_COLUMNS, self.stats_matrix([address])[0]))
+
+    def evict_idle(self, force=False):
+        # Idleness is measured on the stream's own clock, so replays evict exactly like live feeds
+        cutoff = self.clock - self.idle_seconds
+        idle = [address for address, window in self.windows.items() if window.last_seen < cutoff]
+        if force and not idle:
+            # At the address cap with nobody idle, the least recently active 1% goes in one pass
+            addresses = list(self.windows)
+            last_seen = np.fromiter((self.windows[address].last_seen for address in addresses), dtype=np.int64,
+                                    count=len(addresses))
+            count = max(1, len(addresses) // 100)
+            idle = [addresses[index] for index in np.argpartition(last_seen, count - 1)[:count]]
+        for address in idle:
+            del self.windows[address]
+        self.evicted += len(idle)
+        if idle and self.on_evict is not None:
+            self.on_evict(idle)
+        return idle
+
+    def nbytes(self):
+        return sum(window.nbytes() for window in self.windows.values())
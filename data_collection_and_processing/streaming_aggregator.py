@@ -0,0 +1,148 @@
+import json
+import os
+from data_collection_and_processing.address_index import normalize_address
+
+WEI_PER_ETH = 10 ** 18
+SET_FIELDS = ('sent_to', 'received_from', 'last_block_hashes')
+
+
+def wei_to_eth(value):
+    return value / WEI_PER_ETH if value is not None else float('nan')
+
+
+class TransactionAccumulator:
+    def __init__(self, wallet_address):
+        self.wallet_address = wallet_address
+        self.wallet_key = normalize_address(wallet_address)
+        self.total_transactions = 0
+        self.num_created_contracts = 0
+        self.sent_count = 0
+        self.received_count = 0
+        self.contract_count = 0
+        # Wei amounts stay Python ints so sums are exact however many pages are folded
+        self.sent_sum = 0
+        self.received_sum = 0
+        self.contract_sum = 0
+        self.sent_min = self.sent_max = None
+        self.received_min = self.received_max = None
+        self.contract_min = self.contract_max = None
+        self.sent_to = set()
+        self.received_from = set()
+        self.sent_timestamp_sum = 0
+        self.received_timestamp_sum = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.last_block = None
+        # Hashes already folded from last_block, so a refresh can re-read that block safely
+        self.last_block_hashes = set()
+
+    def _track(self, prefix, value):
+        low = getattr(self, f'{prefix}_min')
+        high = getattr(self, f'{prefix}_max')
+        setattr(self, f'{prefix}_min', value if low is None or value < low else low)
+        setattr(self, f'{prefix}_max', value if high is None or value > high else high)
+
+    def fold(self, transactions):
+        for tx in transactions:
+            value = int(tx['value'])
+            timestamp = int(tx['timeStamp'])
+            creates_contract = tx['contractAddress'] != ''
+            self.total_transactions += 1
+            self.num_created_contracts += creates_contract
+
+            if normalize_address(tx['from']) == self.wallet_key:
+                self.sent_count += 1
+                self.sent_sum += value
+                self.sent_timestamp_sum += timestamp
+                self.sent_to.add(tx['to'])
+                self._track('sent', value)
+                if creates_contract:
+                    self.contract_count += 1
+                    self.contract_sum += value
+                    self._track('contract', value)
+            else:
+                self.received_count += 1
+                self.received_sum += value
+                self.received_timestamp_sum += timestamp
+                self.received_from.add(tx['from'])
+                self._track('received', value)
+
+            if self.first_timestamp is None or timestamp < self.first_timestamp:
+                self.first_timestamp = timestamp
+            if self.last_timestamp is None or timestamp > self.last_timestamp:
+                self.last_timestamp = timestamp
+            block = int(tx['blockNumber'])
+            if self.last_block is None or block > self.last_block:
+                self.last_block = block
+                self.last_block_hashes = {tx['hash']}
+            elif block == self.last_block:
+                self.last_block_hashes.add(tx['hash'])
+        return self
+
+    def to_dict(self):
+        state = dict(vars(self))
+        for field in SET_FIELDS:
+            state[field] = sorted(state[field])
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        accumulator = cls(state['wallet_address'])
+        for field, value in state.items():
+            setattr(accumulator, field, set(value) if field in SET_FIELDS else value)
+        return accumulator
+
+    def is_complete(self):
+        # analyze_ethereum_transactions cannot score an address without both directions
+        return self.sent_count > 0 and self.received_count > 0
+
+    def to_stats(self):
+        total_eth_sent = self.sent_sum / WEI_PER_ETH
+        total_eth_received = self.received_sum / WEI_PER_ETH
+        return {
+            'total_sent_transactions': self.sent_count,
+            'min_sent_value': wei_to_eth(self.sent_min),
+            'max_sent_value': wei_to_eth(self.sent_max),
+            'avg_sent_value': total_eth_sent / self.sent_count if self.sent_count else float('nan'),
+            'min_contract_value': wei_to_eth(self.contract_min),
+            'max_contract_value': wei_to_eth(self.contract_max),
+            'avg_contract_value': self.contract_sum / WEI_PER_ETH / self.contract_count if self.contract_count else float('nan'),
+            'total_eth_sent': total_eth_sent,
+            'total_eth_sent_to_contracts': self.contract_sum / WEI_PER_ETH,
+            'unique_sent_addresses': len(self.sent_to),
+            'total_received_transactions': self.received_count,
+            'min_received_value': wei_to_eth(self.received_min),
+            'max_received_value': wei_to_eth(self.received_max),
+            'avg_received_value': total_eth_received / self.received_count if self.received_count else float('nan'),
+            'total_eth_received': total_eth_received,
+            'unique_received_addresses': len(self.received_from),
+            'time_diff_first_last': (self.last_timestamp - self.first_timestamp) / 60 if self.total_transactions else 0,
+            'total_transactions': self.total_transactions,
+            'num_created_contracts': self.num_created_contracts,
+            'avg_time_between_sent': self.sent_timestamp_sum / 60 / self.sent_count if self.sent_count else float('nan'),
+            'avg_time_between_received': self.received_timestamp_sum / 60 / self.received_count if self.received_count else float('nan'),
+            'total_eth_balance': total_eth_received - total_eth_sent,
+        }
+
+
+class AddressStateStore:
+    def __init__(self, state_dir):
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _path(self, wallet_address):
+        return os.path.join(self.state_dir, f"{wallet_address.lower()}.json")
+
+    def load(self, wallet_address):
+        try:
+            with open(self._path(wallet_address)) as state_file:
+                return TransactionAccumulator.from_dict(json.load(state_file))
+        except (OSError, ValueError):
+            return None
+
+    def save(self, accumulator):
+        path = self._path(accumulator.wallet_address)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as state_file:
+            json.dump(accumulator.to_dict(), state_file, separators=(',', ':'))
+        os.replace(tmp_path, path)
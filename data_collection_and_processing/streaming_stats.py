@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+
+class StreamingSummary:
+    def __init__(self, distinct_k=4096):
+        self.distinct_k = distinct_k
+        self.rows = 0
+        self.columns = None
+        self.numeric = None
+        self.dtypes = None
+        self.distinct = {}
+
+    def _start(self, chunk):
+        self.columns = list(chunk.columns)
+        self.dtypes = {column: str(dtype) for column, dtype in chunk.dtypes.items()}
+        self.numeric = list(chunk.select_dtypes(include=np.number).columns)
+        n = len(self.numeric)
+        # Sums are taken around the first chunk's means so large-valued columns keep their precision
+        self.shift = np.nan_to_num(chunk[self.numeric].mean().to_numpy(dtype=np.float64))
+        self.count = np.zeros(n)
+        self.sum = np.zeros(n)
+        self.sum_sq = np.zeros(n)
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+        self.distinct = {column: np.empty(0, dtype=np.uint64) for column in self.columns}
+
+    def update(self, chunk):
+        if self.columns is None:
+            self._start(chunk)
+        self.rows += len(chunk)
+        values = chunk[self.numeric].to_numpy(dtype=np.float64) - self.shift
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0.0)
+        self.count += present.sum(axis=0)
+        self.sum += filled.sum(axis=0)
+        self.sum_sq += (filled ** 2).sum(axis=0)
+        self.min = np.fmin(self.min, np.nanmin(np.where(present, values, np.inf), axis=0, initial=np.inf))
+        self.max = np.fmax(self.max, np.nanmax(np.where(present, values, -np.inf), axis=0, initial=-np.inf))
+        for column in self.columns:
+            # K-minimum-values sketch: the k smallest value hashes give an exact count below k
+            # distinct values and an unbiased estimate above it, in constant memory
+            series = chunk[column].dropna()
+            hashes = pd.util.hash_array(series.astype(str).to_numpy() if series.dtype == object else series.to_numpy())
+            self.distinct[column] = np.unique(np.concatenate([self.distinct[column], hashes]))[:self.distinct_k]
+
+    def nunique(self):
+        estimates = {}
+        for column in self.columns:
+            kept = self.distinct[column]
+            if len(kept) < self.distinct_k:
+                estimates[column] = len(kept)
+            else:
+                estimates[column] = int(round((self.distinct_k - 1) * 2.0 ** 64 / float(kept[-1])))
+        return pd.Series(estimates)
+
+    def nunique_exact(self):
+        return {column: bool(len(self.distinct[column]) < self.distinct_k) for column in self.columns}
+
+    def describe(self, sample=None):
+        # Count, mean, std, min and max are exact; quartiles come from the sample when one is given
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.sum / self.count
+            variance = (self.sum_sq - self.sum ** 2 / self.count) / (self.count - 1)
+        described = pd.DataFrame({
+            'count': self.count,
+            'mean': mean + self.shift,
+            'std': np.sqrt(np.maximum(variance, 0)),
+            'min': np.where(self.count > 0, self.min + self.shift, np.nan),
+            'max': np.where(self.count > 0, self.max + self.shift, np.nan),
+        }, index=self.numeric)
+        if sample is not None:
+            quartiles = sample[self.numeric].quantile([0.25, 0.5, 0.75]).T
+            described['25%'], described['50%'], described['75%'] = (quartiles[0.25], quartiles[0.5],
+                                                                     quartiles[0.75])
+            described = described[['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']]
+        return described.T
+
+
+class StreamingCorrelation:
+    def __init__(self):
+        self.columns = None
+        self.shift = None
+        self.n = 0
+
+    def update(self, frame):
+        # Complete rows only, like DataFrame.dropna().corr()
+        if self.columns is None:
+            self.columns = list(frame.columns)
+        frame = frame[self.columns].dropna()
+        if self.shift is None:
+            self.shift = np.nan_to_num(frame.mean().to_numpy(dtype=np.float64))
+            self.sum = np.zeros(len(self.columns))
+            self.cross = np.zeros((len(self.columns), len(self.columns)))
+        values = frame.to_numpy(dtype=np.float64) - self.shift
+        self.n += len(values)
+        self.sum += values.sum(axis=0)
+        self.cross += values.T @ values
+
+    def matrix(self):
+        mean = self.sum / self.n
+        covariance = self.cross / self.n - np.outer(mean, mean)
+        scale = np.sqrt(np.diag(covariance))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlation = covariance / np.outer(scale, scale)
+        np.fill_diagonal(correlation, np.where(scale > 0, 1.0, np.nan))
+        return pd.DataFrame(np.clip(correlation, -1, 1), index=self.columns, columns=self.columns)
+
+
+class StratifiedReservoir:
+    def __init__(self, sample_size, stratify='FLAG', random_state=42):
+        self.sample_size = sample_size
+        self.stratify = stratify
+        self.rng = np.random.default_rng(random_state)
+        self.kept = {}
+        self.totals = {}
+
+    def update(self, chunk):
+        # Every row gets a uniform random key; the smallest keys per class are a uniform sample of
+        # that class whatever order the chunks arrive in
+        chunk = chunk.assign(_sample_key=self.rng.random(len(chunk)))
+        groups = chunk.groupby(self.stratify, dropna=False) if self.stratify in chunk.columns else [(None, chunk)]
+        for label, rows in groups:
+            self.totals[label] = self.totals.get(label, 0) + len(rows)
+            current = self.kept.get(label)
+            combined = rows if current is None else pd.concat([current, rows])
+            self.kept[label] = combined.nsmallest(self.sample_size, '_sample_key')
+
+    def sample(self):
+        # Allocate the cap across classes in proportion to their final counts
+        total = sum(self.totals.values())
+        parts = []
+        for label, rows in self.kept.items():
+            quota = max(1, int(round(self.sample_size * self.totals[label] / total)))
+            parts.append(rows.nsmallest(quota, '_sample_key'))
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat(parts).drop(columns='_sample_key').sort_index()
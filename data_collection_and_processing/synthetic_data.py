@@ -0,0 +1,127 @@
+import numpy as np
+from data_collection_and_processing.batch_features import BatchFeatureExtractor
+from data_collection_and_processing.combining_data import DataCombiner
+from data_collection_and_processing.sliding_window import DATASET_COLUMNS
+
+START_TIMESTAMP = 1438269973
+END_TIMESTAMP = 1700000000
+SECONDS_PER_BLOCK = 13
+
+
+class SyntheticTransactionGenerator:
+    # Per-class behaviour: (mean transactions, share sent, lifetime days, log-mean ETH, log-sd ETH, contract rate)
+    profiles = {
+        0: (14.0, 0.45, 400.0, -1.0, 2.0, 0.04),
+        1: (6.0, 0.25, 30.0, 0.0, 2.5, 0.01),
+    }
+
+    def __init__(self, n_addresses, fraud_rate=0.22, block_size=50000, counterparties=None, seed=42):
+        self.n_addresses = n_addresses
+        self.fraud_rate = fraud_rate
+        self.block_size = block_size
+        self.counterparties = counterparties or max(1000, n_addresses)
+        self.seed = seed
+
+    @property
+    def n_blocks(self):
+        return (self.n_addresses + self.block_size - 1) // self.block_size
+
+    def _address(self, kind, index):
+        return f"0x{self.seed % 2 ** 24:06x}{kind:02x}{index:032x}"
+
+    def addresses(self, block_index):
+        start = block_index * self.block_size
+        stop = min(start + self.block_size, self.n_addresses)
+        return [self._address(0, index) for index in range(start, stop)]
+
+    def block(self, block_index):
+        # Every block has its own seeded stream, so any block can be regenerated on its own and
+        # the same seed always yields the same data
+        rng = np.random.default_rng([self.seed, block_index])
+        addresses = self.addresses(block_index)
+        n = len(addresses)
+        flags = (rng.random(n) < self.fraud_rate).astype(np.int64)
+        profile = np.array([self.profiles[flag] for flag in (0, 1)])[flags]
+        mean_transactions, sent_share, lifetime_days, log_mean, log_sd, contract_rate = profile.T
+
+        # Gamma-Poisson counts give the heavy tail real address activity has
+        counts = rng.poisson(rng.gamma(0.8, mean_transactions / 0.8))
+        group = np.repeat(np.arange(n), counts)
+        total = len(group)
+        outgoing = rng.random(total) < sent_share[group]
+        contract = outgoing & (rng.random(total) < contract_rate[group])
+
+        first = rng.integers(START_TIMESTAMP, END_TIMESTAMP, size=n)
+        lifetime = rng.exponential(lifetime_days * 86400).astype(np.int64)
+        timestamp = first[group] + (rng.random(total) * lifetime[group]).astype(np.int64)
+        order = np.lexsort((timestamp, group))
+        outgoing, contract, timestamp = outgoing[order], contract[order], timestamp[order]
+
+        eth = np.exp(rng.normal(log_mean[group], log_sd[group]))
+        eth[rng.random(total) < 0.1] = 0
+        gwei = np.minimum(eth * 1e9, 9e17).astype(np.int64)
+        remainder = np.where(gwei > 0, rng.integers(0, 10 ** 9, size=total), 0)
+
+        owners = np.array(addresses, dtype=object)
+        counterparty = rng.integers(0, self.counterparties, size=total)
+        others = np.array([self._address(1, index) for index in counterparty], dtype=object)
+        columns = {
+            'group': group,
+            'from_addresses': np.where(outgoing, owners[group], others),
+            'to_addresses': np.where(contract, '', np.where(outgoing, others, owners[group])),
+            'contract': contract,
+            'timestamp': timestamp,
+            'gwei': gwei,
+            'remainder': remainder,
+        }
+        return addresses, flags, columns
+
+    def transactions(self, block_index):
+        # The same block as txlist dicts, as analyze_ethereum_transactions receives them
+        addresses, flags, columns = self.block(block_index)
+        transactions = {address: [] for address in addresses}
+        block_number = (columns['timestamp'] - START_TIMESTAMP) // SECONDS_PER_BLOCK
+        for i in range(len(columns['group'])):
+            owner = addresses[columns['group'][i]]
+            transactions[owner].append({
+                'blockNumber': str(block_number[i]),
+                'timeStamp': str(columns['timestamp'][i]),
+                'hash': f"0x{self.seed % 2 ** 32:08x}{columns['group'][i]:024x}{i:032x}",
+                'from': columns['from_addresses'][i],
+                'to': columns['to_addresses'][i],
+                'value': str(int(columns['gwei'][i]) * 10 ** 9 + int(columns['remainder'][i])),
+                'contractAddress': self._address(2, i) if columns['contract'][i] else '',
+                'isError': '0',
+            })
+        return addresses, flags, transactions
+
+    def features(self, block_index):
+        addresses, flags, columns = self.block(block_index)
+        stats = BatchFeatureExtractor(addresses).extract(**columns)
+        stats.insert(0, 'FLAG', flags)
+        stats = stats.rename(columns=DATASET_COLUMNS).reset_index()
+        return stats[['Address', 'FLAG'] + list(DATASET_COLUMNS.values())]
+
+    def write_datasets(self, mined_path, kaggle_path, overlap=0.05):
+        # Splits the addresses into a mined-style and a Kaggle-style CSV with `overlap` shared rows,
+        # in the layouts DataCombiner reads
+        rng = np.random.default_rng([self.seed, 2 ** 32 - 1])
+        header = True
+        index_offset = 0
+        for block_index in range(self.n_blocks):
+            frame = self.features(block_index)
+            frame[DataCombiner.round_columns] = frame[DataCombiner.round_columns].round(2)
+            side = rng.random(len(frame))
+            mined = frame[side < 0.5 + overlap / 2]
+            kaggle = frame[side >= 0.5 - overlap / 2].reset_index(drop=True)
+            kaggle.insert(0, 'Index', np.arange(len(kaggle)) + index_offset)
+            kaggle.index = kaggle.index + index_offset
+            index_offset += len(kaggle)
+            for column in DataCombiner.erc20_columns:
+                kaggle[column] = 0.0
+            kaggle[' ERC20 most sent token type'] = ''
+            kaggle[' ERC20_most_rec_token_type'] = ''
+            mined.to_csv(mined_path, mode='w' if header else 'a', index=False, header=header)
+            kaggle.to_csv(kaggle_path, mode='w' if header else 'a', index=True, header=header)
+            header = False
+        return mined_path, kaggle_path
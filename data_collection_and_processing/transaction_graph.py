@@ -0,0 +1,247 @@
+import glob
+import os
+import threading
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from data_collection_and_processing.address_index import AddressIndex, address_keys, KEY_DTYPE
+from data_collection_and_processing.batch_features import wei_strings_to_arrays, to_eth
+
+GRAPH_COLUMNS = ['graph_in_degree', 'graph_out_degree', 'graph_eth_in', 'graph_eth_out', 'graph_pagerank',
+                 'graph_two_hop_reach', 'graph_flagged_neighbor_fraction']
+HASH_DTYPE = 'S32'
+# Built from other rows' labels: valid against the held-out split it was computed for, but cross-validation
+# inside the training rows would see labels of its own validation folds, so selection and OOF leave it out
+LABEL_DERIVED_COLUMNS = ['graph_flagged_neighbor_fraction']
+
+
+class EdgeCollector:
+    def __init__(self, edge_dir, flush_every=1000000):
+        # One edge per transaction (sender, receiver, ETH, hash), buffered and written as .npz shards
+        self.edge_dir = edge_dir
+        self.flush_every = flush_every
+        os.makedirs(edge_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.buffered = 0
+        self.next_shard = len(self._shard_paths())
+
+    def _shard_paths(self):
+        return sorted(glob.glob(os.path.join(self.edge_dir, 'edges_*.npz')))
+
+    def reset(self):
+        with self.lock:
+            for path in self._shard_paths():
+                os.remove(path)
+            self.buffer = []
+            self.buffered = 0
+            self.next_shard = 0
+
+    def add(self, transactions):
+        # Called from the mining worker threads; the conversion runs outside the lock
+        if not transactions:
+            return
+        # A contract creation has an empty `to`; its edge goes to the created contract
+        targets = [tx['to'] or tx['contractAddress'] for tx in transactions]
+        kept = [position for position, target in enumerate(targets) if target]
+        transactions = [transactions[position] for position in kept]
+        gwei, remainder = wei_strings_to_arrays([tx['value'] for tx in transactions])
+        edges = {
+            'source': address_keys([tx['from'] for tx in transactions]),
+            'target': address_keys([targets[position] for position in kept]),
+            'value': to_eth(gwei, remainder),
+            # A transaction between two mined addresses is in both their lists; its hash dedups it
+            'tx': np.frombuffer(bytes.fromhex(''.join(tx['hash'][2:] for tx in transactions)), dtype=HASH_DTYPE),
+        }
+        with self.lock:
+            self.buffer.append(edges)
+            self.buffered += len(transactions)
+            if self.buffered >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        if not self.buffered:
+            return
+        path = os.path.join(self.edge_dir, f"edges_{self.next_shard:06d}.npz")
+        with open(f"{path}.tmp", 'wb') as shard:
+            np.savez(shard, **self._concatenate(self.buffer))
+        os.replace(f"{path}.tmp", path)
+        self.next_shard += 1
+        self.buffer = []
+        self.buffered = 0
+
+    def flush(self):
+        # Writes the buffered edges as a shard now, e.g. before the addresses they came from are checkpointed
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+
+    @staticmethod
+    def _concatenate(parts):
+        if not parts:
+            return {'source': np.empty(0, dtype=KEY_DTYPE), 'target': np.empty(0, dtype=KEY_DTYPE),
+                    'value': np.empty(0), 'tx': np.empty(0, dtype=HASH_DTYPE)}
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+    def load(self):
+        parts = []
+        for path in self._shard_paths():
+            with np.load(path) as shard:
+                parts.append({name: shard[name] for name in shard.files})
+        with self.lock:
+            parts.extend(self.buffer)
+        return self._concatenate(parts)
+
+
+class TransactionGraph:
+    def __init__(self, keys, counts, values):
+        # counts[i, j] = transactions from node i to node j, values[i, j] = ETH they moved;
+        # node ids are positions in the sorted 20-byte keys
+        self.index = AddressIndex(keys=keys)
+        self.counts = counts
+        self.values = values
+        self._pagerank = None
+        self._undirected = None
+
+    @classmethod
+    def from_edges(cls, source, target, value, tx=None):
+        if tx is not None:
+            _, first = np.unique(tx, return_index=True)
+            source, target, value = source[first], target[first], value[first]
+        nodes = AddressIndex(keys=np.concatenate([source, target]))
+        rows = nodes.codes(keys=source)
+        columns = nodes.codes(keys=target)
+        # Self-transfers say nothing about counterparties
+        keep = rows != columns
+        rows, columns, value = rows[keep], columns[keep], value[keep]
+        shape = (len(nodes), len(nodes))
+        # COO -> CSR sums repeated (sender, receiver) pairs
+        counts = sparse.coo_matrix((np.ones(len(rows), dtype=np.float64), (rows, columns)), shape=shape).tocsr()
+        values = sparse.coo_matrix((value, (rows, columns)), shape=shape).tocsr()
+        return cls(nodes.keys, counts, values)
+
+    @classmethod
+    def from_edge_dir(cls, edge_dir):
+        graph = cls.from_edges(**EdgeCollector(edge_dir).load())
+        print(f"Transaction graph: {len(graph)} addresses, {graph.counts.nnz} edges")
+        return graph
+
+    def __len__(self):
+        return self.counts.shape[0]
+
+    @property
+    def undirected(self):
+        # Counterparties in either direction, as a 0/1 matrix
+        if self._undirected is None:
+            adjacency = (self.counts + self.counts.T).tocsr()
+            adjacency.data[:] = 1
+            self._undirected = adjacency
+        return self._undirected
+
+    def pagerank(self, damping=0.85, tol=1e-10, max_iter=100):
+        # Power iteration on the transaction-count-weighted transition matrix; dangling nodes
+        # spread their rank uniformly
+        if self._pagerank is None:
+            n = len(self)
+            out_weight = np.asarray(self.counts.sum(axis=1)).ravel()
+            dangling = out_weight == 0
+            inverse = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+            transition = (sparse.diags(inverse) @ self.counts).T.tocsr()
+            rank = np.full(n, 1.0 / n)
+            for _ in range(max_iter):
+                updated = damping * (transition @ rank + rank[dangling].sum() / n) + (1 - damping) / n
+                converged = np.abs(updated - rank).sum() < n * tol
+                rank = updated
+                if converged:
+                    break
+            self._pagerank = rank
+        return self._pagerank
+
+    @staticmethod
+    def _neighbour_min(adjacency, values, own):
+        # min(own[i], values[j] for every neighbour j of row i), one reduceat over the CSR arrays
+        out = own.copy()
+        nonempty = np.flatnonzero(np.diff(adjacency.indptr))
+        if len(nonempty):
+            gathered = values[adjacency.indices]
+            out[nonempty] = np.minimum(out[nonempty], np.minimum.reduceat(gathered, adjacency.indptr[nonempty]))
+        return out
+
+    def _sketched_reach(self, nodes, sketch_size, random_state):
+        # Min-hash count: each address draws an Exp(1) rank per round, the minimum over a set of n
+        # addresses is Exp(n), so (k - 1) / (sum of k minima) estimates n, within about 1 / sqrt(k - 2)
+        adjacency = self.undirected
+        rows = adjacency[nodes]
+        rng = np.random.default_rng(random_state)
+        total = np.zeros(len(nodes))
+        for _ in range(sketch_size):
+            rank = rng.exponential(size=len(self))
+            one_hop = self._neighbour_min(adjacency, rank, rank)
+            total += self._neighbour_min(rows, one_hop, one_hop[nodes])
+        # The address itself is in its own neighbourhood
+        return np.clip(np.rint((sketch_size - 1) / total) - 1, 0, len(self) - 1)
+
+    def two_hop_reach(self, nodes, exact_work=100000, block_work=20000000, sketch_size=64, random_state=42):
+        # Distinct addresses within two hops, ignoring direction. Exact by sparse products, in blocks
+        # whose neighbour-of-neighbour count stays under block_work; addresses next to a hub (over
+        # exact_work) would make that product huge, so their reach is estimated with a min-hash sketch.
+        adjacency = self.undirected
+        degree = np.diff(adjacency.indptr)
+        nodes = np.asarray(nodes, dtype=np.int64)
+        reach = np.zeros(len(nodes))
+        work = adjacency[nodes] @ degree
+        exact = np.flatnonzero(work <= exact_work)
+        cumulative = np.cumsum(work[exact])
+        start = 0
+        while start < len(exact):
+            done = cumulative[start - 1] if start else 0
+            stop = max(int(np.searchsorted(cumulative, done + block_work, side='right')), start + 1)
+            block = nodes[exact[start:stop]]
+            rows = adjacency[block]
+            reached = rows @ adjacency + rows
+            # Every address with a neighbour reaches itself in two hops
+            reach[exact[start:stop]] = reached.getnnz(axis=1) - (degree[block] > 0)
+            start = stop
+        sketched = np.flatnonzero(work > exact_work)
+        if len(sketched):
+            reach[sketched] = self._sketched_reach(nodes[sketched], sketch_size, random_state)
+        return reach
+
+    def features(self, addresses, flags=None, labelled=None):
+        # One row per address; addresses outside the graph get zeros. `flags` labels the addresses
+        # and gives the fraction of each address's counterparties that are flagged; with `labelled`,
+        # only those rows' flags count, and the others are treated like any unlabelled counterparty.
+        codes = self.index.codes(addresses)
+        present = codes >= 0
+        nodes = codes[present]
+        columns = {column: np.zeros(len(codes)) for column in GRAPH_COLUMNS
+                   if flags is not None or column != 'graph_flagged_neighbor_fraction'}
+        if not len(nodes):
+            return pd.DataFrame(columns)
+        counts_csc = self.counts.tocsc()
+        columns['graph_out_degree'][present] = np.diff(self.counts.indptr)[nodes]
+        columns['graph_in_degree'][present] = np.diff(counts_csc.indptr)[nodes]
+        columns['graph_eth_out'][present] = np.asarray(self.values.sum(axis=1)).ravel()[nodes]
+        columns['graph_eth_in'][present] = np.asarray(self.values.sum(axis=0)).ravel()[nodes]
+        columns['graph_pagerank'][present] = self.pagerank()[nodes]
+        columns['graph_two_hop_reach'][present] = self.two_hop_reach(nodes)
+        if flags is not None:
+            flagged = np.zeros(len(self))
+            known = np.asarray(flags, dtype=np.float64)
+            if labelled is not None:
+                known = np.where(labelled, known, 0.0)
+            flagged[nodes] = known[present]
+            degree = np.diff(self.undirected.indptr)[nodes]
+            neighbors_flagged = (self.undirected @ flagged)[nodes]
+            columns['graph_flagged_neighbor_fraction'][present] = np.divide(
+                neighbors_flagged, degree, out=np.zeros(len(nodes)), where=degree > 0)
+        return pd.DataFrame(columns)
+
+
+def graph_coverage(frame, target='FLAG'):
+    # Share of each class's rows that have a transaction in the graph. Only mined addresses have their
+    # transactions collected, so a large gap means the graph columns mostly encode a row's source.
+    in_graph = (frame['graph_in_degree'] + frame['graph_out_degree']) > 0
+    return {label: float(share) for label, share in in_graph.groupby(frame[target]).mean().items()}
@@ -0,0 +1,11 @@
+import os
+import matplotlib.pyplot as plt
+
+
+def show_figure(output_dir, name):
+    # Without an output directory the figure is shown; with one it is saved as <name>.png and closed
+    if output_dir is None:
+        plt.show()
+    else:
+        plt.savefig(os.path.join(output_dir, f"{name}.png"), bbox_inches='tight')
+        plt.close('all')
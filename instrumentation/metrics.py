@@ -0,0 +1,365 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, float('inf'))
+
+
+def current_rss_mb():
+    # This process only: worker processes (joblib/loky pools) are not included
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        # No procfs: fall back to the process-wide peak (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def cpu_seconds():
+    # Own threads plus reaped child processes. loky keeps its workers alive between calls, and
+    # RUSAGE_CHILDREN only counts a child once it has exited and been waited for, so the live
+    # descendants' CPU (and what they reaped) is added through psutil when it is installed.
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    total = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    if psutil is not None:
+        for child in psutil.Process().children(recursive=True):
+            try:
+                times = child.cpu_times()
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+            total += times.user + times.system + times.children_user + times.children_system
+    return total
+
+
+# What the per-stage figures cover, written next to them in every export. CPU time can only be read
+# for the whole process tree, so a stage that overlapped another one (the pipeline runs independent
+# stages in parallel) would count its neighbours' work: its CPU goes to the run total only.
+_PROCESS_CPU = ('this process and its worker processes' if psutil is not None
+                else 'this process and exited workers only (install psutil to count live workers)')
+STAGE_SCOPES = {
+    'cpu_seconds': f"{_PROCESS_CPU}, summed over the calls that ran while no other stage was running",
+    'overlapped_calls': 'calls that overlapped another stage; their CPU is only in pipeline_run_cpu_seconds',
+    'peak_rss_mb': 'this process only, sampled every 10 ms; worker processes are not included',
+}
+RUN_SCOPES = {
+    'wall_seconds': 'since the registry was created or reset',
+    'cpu_seconds': f"{_PROCESS_CPU}, since the registry was created or reset",
+}
+
+
+class PeakMemorySampler:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stopped = threading.Event()
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def __enter__(self):
+        self.peak_mb = current_rss_mb()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+
+class SamplingProfiler:
+    # py-spy style: samples the stacks of all threads on a timer and writes collapsed stacks that
+    # flamegraph.pl / speedscope read
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:"
+                                 f"{frame.f_code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self, path):
+        self._stopped.set()
+        self._thread.join()
+        with open(path, 'w') as folded:
+            for stack, count in self.stacks.most_common():
+                folded.write(f"{stack} {count}\n")
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def to_dict(self):
+        cumulative, total = [], 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return {'buckets': {str(bound): count for bound, count in zip(self.buckets, cumulative)},
+                'sum': self.sum, 'count': self.count}
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.enabled = True
+        self.profile = {}
+        self.profile_dir = '.'
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+            self.stages = {}
+            self.active = []
+            self.run_start = (time.perf_counter(), cpu_seconds())
+
+    def configure(self, enabled=True, profile=None, profile_dir=None):
+        # profile maps stage names to 'cprofile' or 'sample'; PIPELINE_PROFILE="stage:mode,..." does the same
+        self.enabled = enabled
+        if profile is not None:
+            self.profile = dict(profile)
+        if profile_dir is not None:
+            self.profile_dir = profile_dir
+        return self
+
+    def inc(self, name, value=1, labels=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, labels=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name, value, labels=None, buckets=LATENCY_BUCKETS):
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    def _profile_mode(self, name):
+        if name in self.profile:
+            return self.profile[name]
+        for entry in os.environ.get('PIPELINE_PROFILE', '').split(','):
+            stage, _, mode = entry.partition(':')
+            if stage.strip() == name:
+                return mode.strip() or 'cprofile'
+        return None
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def _enter_stage(self, stage):
+        # A stage nested in another on the same thread is part of its work, not a concurrent stage
+        with self._lock:
+            others = [running for running in self.active if running.thread != stage.thread]
+            if others:
+                stage.overlapped = True
+                for running in others:
+                    running.overlapped = True
+            self.active.append(stage)
+
+    def _record_stage(self, stage, wall, cpu, peak_mb, failed):
+        with self._lock:
+            self.active.remove(stage)
+            record = self.stages.setdefault(stage.name, {'calls': 0, 'failures': 0, 'overlapped_calls': 0,
+                                                         'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                                                         'peak_rss_mb': 0.0})
+            record['calls'] += 1
+            record['failures'] += failed
+            record['wall_seconds'] += wall
+            if stage.overlapped:
+                record['overlapped_calls'] += 1
+            else:
+                record['cpu_seconds'] += cpu
+            record['peak_rss_mb'] = max(record['peak_rss_mb'], peak_mb)
+        shared = ' (shared with concurrent stages)' if stage.overlapped else ''
+        print(f"Stage {stage.name}: {wall:.2f}s wall, {cpu:.2f}s CPU{shared}, peak RSS {peak_mb:.0f} MB")
+
+    def run_totals(self):
+        wall_start, cpu_start = self.run_start
+        return {'wall_seconds': time.perf_counter() - wall_start, 'cpu_seconds': cpu_seconds() - cpu_start}
+
+    def to_dict(self):
+        with self._lock:
+            def series(metric):
+                return [{'labels': dict(key), 'value': value.to_dict() if isinstance(value, Histogram) else value}
+                        for key, value in metric.items()]
+            return {
+                'run_scopes': dict(RUN_SCOPES),
+                'run': self.run_totals(),
+                'stage_scopes': dict(STAGE_SCOPES),
+                'stages': {name: dict(record) for name, record in self.stages.items()},
+                'counters': {name: series(metric) for name, metric in self.counters.items()},
+                'gauges': {name: series(metric) for name, metric in self.gauges.items()},
+                'histograms': {name: series(metric) for name, metric in self.histograms.items()},
+            }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for field, value in self.run_totals().items():
+                lines.append(f"# HELP pipeline_run_{field} {RUN_SCOPES[field]}")
+                lines.append(f"# TYPE pipeline_run_{field} gauge")
+                lines.append(f"pipeline_run_{field} {value}")
+            for field, kind in (('wall_seconds', 'counter'), ('cpu_seconds', 'counter'), ('calls', 'counter'),
+                                ('failures', 'counter'), ('overlapped_calls', 'counter'), ('peak_rss_mb', 'gauge')):
+                if field in STAGE_SCOPES:
+                    lines.append(f"# HELP pipeline_stage_{field} {STAGE_SCOPES[field]}")
+                lines.append(f"# TYPE pipeline_stage_{field} {kind}")
+                for name, record in self.stages.items():
+                    lines.append(f"pipeline_stage_{field}{_format_labels((('stage', name),))} {record[field]}")
+            for metrics, kind in ((self.counters, 'counter'), (self.gauges, 'gauge')):
+                for name, metric in metrics.items():
+                    lines.append(f"# TYPE {name} {kind}")
+                    lines.extend(f"{name}{_format_labels(key)} {value}" for key, value in metric.items())
+            for name, metric in self.histograms.items():
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in metric.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        # .prom/.txt gives Prometheus text exposition, anything else JSON
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as metrics_file:
+            metrics_file.write(text)
+        print(f"Metrics written to {path}")
+        return path
+
+
+class _Stage:
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        if not self.registry.enabled:
+            return self
+        self.mode = self.registry._profile_mode(self.name)
+        self.profiler = None
+        if self.mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+        elif self.mode == 'sample':
+            self.profiler = SamplingProfiler()
+        self.overlapped = False
+        self.thread = threading.get_ident()
+        self.registry._enter_stage(self)
+        self.memory = PeakMemorySampler().__enter__()
+        self.cpu_start = cpu_seconds()
+        self.wall_start = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable() if self.mode == 'cprofile' else self.profiler.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.registry.enabled:
+            return False
+        if self.profiler is not None:
+            os.makedirs(self.registry.profile_dir, exist_ok=True)
+            path = os.path.join(self.registry.profile_dir, self.name)
+            if self.mode == 'cprofile':
+                self.profiler.disable()
+                self.profiler.dump_stats(f"{path}.prof")
+                summary = io.StringIO()
+                pstats.Stats(self.profiler, stream=summary).sort_stats('cumulative').print_stats(15)
+                print(summary.getvalue())
+            else:
+                self.profiler.stop(f"{path}.folded")
+        wall = time.perf_counter() - self.wall_start
+        cpu = cpu_seconds() - self.cpu_start
+        self.memory.__exit__(None, None, None)
+        self.registry._record_stage(self, wall, cpu, self.memory.peak_mb, exc_type is not None)
+        return False
+
+
+metrics = MetricsRegistry()
+
+
+def instrumented_stage(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
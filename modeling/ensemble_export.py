@@ -0,0 +1,105 @@
+import json
+import os
+import time
+import numpy as np
+import sklearn
+from scipy.special import logit
+from sklearn.dummy import DummyClassifier
+from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier, GradientBoostingClassifier
+from sklearn.tree import DecisionTreeClassifier
+from modeling.ensemble_runtime import ARTIFACT_FORMAT
+
+FOREST_TYPES = (RandomForestClassifier, ExtraTreesClassifier, DecisionTreeClassifier)
+
+
+def is_exportable(model):
+    if isinstance(model, FOREST_TYPES):
+        return model.n_outputs_ == 1
+    if isinstance(model, GradientBoostingClassifier):
+        # Binary log-loss with the default prior (or zero) start, i.e. the raw score is a plain sum of trees
+        return model.n_classes_ == 2 and (model.init_ == 'zero' or (
+            isinstance(model.init_, DummyClassifier) and model.init_.strategy in ('prior', 'most_frequent')))
+    return False
+
+
+def _flatten(trees, normalize):
+    # One node array for all trees; child ids become global and a leaf's children point to itself.
+    # Classification trees store class counts before scikit-learn 1.4 and fractions from 1.4 on, so
+    # their values are normalised here and the runtime never depends on the version that fitted them.
+    parts = {'feature': [], 'threshold': [], 'left': [], 'right': [], 'missing_left': [], 'value': []}
+    roots = []
+    offset = 0
+    for tree in trees:
+        nodes = tree.tree_
+        leaf = nodes.children_left == -1
+        ids = np.arange(offset, offset + nodes.node_count)
+        parts['feature'].append(np.where(leaf, 0, nodes.feature))
+        parts['threshold'].append(nodes.threshold)
+        parts['left'].append(np.where(leaf, ids, nodes.children_left + offset))
+        parts['right'].append(np.where(leaf, ids, nodes.children_right + offset))
+        parts['missing_left'].append(np.asarray(nodes.missing_go_to_left, dtype=bool))
+        value = nodes.value[:, 0, :]
+        parts['value'].append(value / value.sum(axis=1, keepdims=True) if normalize else value)
+        roots.append(offset)
+        offset += nodes.node_count
+    index_dtype = np.int32 if offset < 2 ** 31 else np.int64
+    arrays = {name: np.concatenate(values) for name, values in parts.items()}
+    for name in ('feature', 'left', 'right'):
+        arrays[name] = arrays[name].astype(index_dtype)
+    arrays['roots'] = np.asarray(roots, dtype=index_dtype)
+    return arrays
+
+
+def export_ensemble(model, scaler, feature_columns, path, threshold=0.5, model_name=None, version=None):
+    # Flattens a fitted forest/boosting model and its StandardScaler into one .npz for ensemble_runtime
+    if not is_exportable(model):
+        raise ValueError(f"Cannot compile {type(model).__name__}; supported: RandomForest, ExtraTrees, "
+                         f"DecisionTree and binary GradientBoosting")
+    n_features = len(feature_columns)
+    if isinstance(model, GradientBoostingClassifier):
+        trees = list(model.estimators_[:, 0])
+        kind = 'boosting'
+        learning_rate = model.learning_rate
+        if model.init_ == 'zero':
+            init_raw = 0.0
+        else:
+            # The prior's log-odds, clipped as GradientBoostingClassifier does before taking the link
+            eps = np.finfo(np.float64).eps
+            prior = model.init_.predict_proba(np.zeros((1, n_features)))[0, 1]
+            init_raw = float(logit(np.clip(prior, eps, 1 - eps)))
+    else:
+        trees = list(model.estimators_) if hasattr(model, 'estimators_') else [model]
+        kind = 'forest'
+        learning_rate = None
+        init_raw = None
+    arrays = _flatten(trees, normalize=kind == 'forest')
+    # A scaler without centring or scaling leaves those steps out, the same as subtracting 0 or dividing by 1
+    arrays['mean'] = np.zeros(n_features) if getattr(scaler, 'mean_', None) is None else scaler.mean_
+    arrays['scale'] = np.ones(n_features) if getattr(scaler, 'scale_', None) is None else scaler.scale_
+    meta = {
+        'format': ARTIFACT_FORMAT,
+        'kind': kind,
+        'classes': np.asarray(model.classes_).tolist(),
+        'feature_columns': list(feature_columns),
+        'learning_rate': learning_rate,
+        'init_raw': init_raw,
+        'threshold': threshold,
+        'model_name': model_name or type(model).__name__,
+        'version': version or time.strftime('%Y%m%d%H%M%S'),
+        'sklearn_version': sklearn.__version__,
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as artifact:
+        np.savez(artifact, meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp_path, path)
+    print(f"Compiled {meta['model_name']} ({len(trees)} trees, {len(arrays['feature'])} nodes) to {path}")
+    return path
+
+
+def export_scoring_pipeline(scoring_pipeline, path):
+    return export_ensemble(scoring_pipeline.model, scoring_pipeline.scaler, scoring_pipeline.feature_columns, path,
+                           threshold=scoring_pipeline.threshold, model_name=scoring_pipeline.model_name,
+                           version=scoring_pipeline.version)
@@ -0,0 +1,140 @@
+import argparse
+import csv
+import json
+import sys
+import time
+import numpy as np
+
+# Only numpy is imported here, so a short-lived scoring job starts without sklearn, pandas or plotting
+ARTIFACT_FORMAT = 1
+
+
+class CompiledEnsemble:
+    def __init__(self, arrays, meta):
+        # Every tree's nodes concatenated, child ids global; a leaf's children point back at itself
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.missing_left = arrays['missing_left']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.leaf = self.left == np.arange(len(self.left))
+        self.mean = arrays['mean']
+        self.scale = arrays['scale']
+        self.kind = meta['kind']
+        self.classes = meta['classes']
+        self.feature_columns = meta['feature_columns']
+        self.learning_rate = meta['learning_rate']
+        self.init_raw = meta['init_raw']
+        self.threshold_score = meta['threshold']
+        self.model_name = meta['model_name']
+        self.version = meta['version']
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as artifact:
+            arrays = {name: artifact[name] for name in artifact.files}
+        meta = json.loads(str(arrays.pop('meta')))
+        if meta.get('format') != ARTIFACT_FORMAT:
+            raise ValueError(f"Unsupported compiled ensemble format: {meta.get('format')}")
+        return cls(arrays, meta)
+
+    def _scaled(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != len(self.feature_columns):
+            raise ValueError(f"Expected {len(self.feature_columns)} features, got {X.shape[1]}")
+        # StandardScaler in float64, then float32 as sklearn's trees see their input
+        return ((X - self.mean) / self.scale).astype(np.float32)
+
+    def _leaves(self, X):
+        # (rows, trees) leaf ids. Every (row, tree) pair steps down one level per pass, and pairs that
+        # reached a leaf drop out of the next pass.
+        n_trees = len(self.roots)
+        node = np.tile(self.roots, len(X))
+        offset = np.repeat(np.arange(len(X)) * X.shape[1], n_trees)
+        flat = X.ravel()
+        active = np.flatnonzero(~self.leaf[node])
+        while len(active):
+            current = node[active]
+            x = flat[offset[active] + self.feature[current]]
+            # float32 input against float64 thresholds, as in sklearn; NaN follows missing_go_to_left
+            go_left = (x <= self.threshold[current]) | (np.isnan(x) & self.missing_left[current])
+            child = np.where(go_left, self.left[current], self.right[current])
+            node[active] = child
+            active = active[~self.leaf[child]]
+        return node.reshape(len(X), n_trees)
+
+    def _predict_block(self, X):
+        values = self.value[self._leaves(X)]
+        if self.kind == 'forest':
+            # Summed tree by tree and then averaged, in ForestClassifier.predict_proba's order
+            proba = np.zeros((len(X), len(self.classes)))
+            for tree in range(values.shape[1]):
+                proba += values[:, tree]
+            proba /= values.shape[1]
+            return proba
+        raw = np.full(len(X), self.init_raw)
+        for tree in range(values.shape[1]):
+            raw += self.learning_rate * values[:, tree, 0]
+        proba = np.empty((len(X), 2))
+        proba[:, 1] = 1.0 / (1.0 + np.exp(-raw))
+        proba[:, 0] = 1 - proba[:, 1]
+        return proba
+
+    def predict_proba(self, X, chunk_size=4096):
+        # Rows in fixed-size blocks so the (rows, trees) node matrix stays small
+        X = self._scaled(X)
+        proba = np.empty((len(X), len(self.classes)))
+        for start in range(0, len(X), chunk_size):
+            proba[start:start + chunk_size] = self._predict_block(X[start:start + chunk_size])
+        return proba
+
+    def score(self, X, chunk_size=4096):
+        return self.predict_proba(X, chunk_size)[:, 1]
+
+    def score_csv(self, input_path, output_path, chunk_size=4096):
+        # Address plus the model's features, by header name; writes Address,Score,Prediction
+        with open(input_path, newline='') as source, open(output_path, 'w', newline='') as target:
+            reader = csv.reader(source)
+            header = next(reader)
+            missing = [column for column in self.feature_columns if column not in header]
+            if missing:
+                raise ValueError(f"Missing feature columns: {missing}")
+            columns = [header.index(column) for column in self.feature_columns]
+            address = header.index('Address') if 'Address' in header else None
+            writer = csv.writer(target)
+            writer.writerow(['Address', 'Score', 'Prediction'] if address is not None else ['Score', 'Prediction'])
+            rows = 0
+            while True:
+                block = [row for _, row in zip(range(chunk_size), reader)]
+                if not block:
+                    break
+                X = np.array([[float(row[column]) if row[column] != '' else np.nan for column in columns]
+                              for row in block])
+                scores = self.score(X, chunk_size)
+                for row, score in zip(block, scores.tolist()):
+                    prediction = int(score >= self.threshold_score)
+                    writer.writerow([row[address], score, prediction] if address is not None else [score, prediction])
+                rows += len(block)
+        return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score a CSV with a compiled tree ensemble')
+    parser.add_argument('artifact')
+    parser.add_argument('input')
+    parser.add_argument('output')
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    ensemble = CompiledEnsemble.load(args.artifact)
+    rows = ensemble.score_csv(args.input, args.output)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {rows} rows with {ensemble.version} ({ensemble.model_name}) in {elapsed:.3f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
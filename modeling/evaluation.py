@@ -1,18 +1,29 @@
+import os
 from sklearn.metrics import precision_recall_curve, auc
 import matplotlib.pyplot as plt
+from instrumentation.figures import show_figure
 
 class AUPRCPlotter:
-    def __init__(self, model_evaluator):
+    def __init__(self, model_evaluator, output_dir=None):
         self.model_evaluator = model_evaluator
+        # With an output directory the plots are saved instead of blocking on plt.show()
+        self.output_dir = output_dir
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+
+    def _score(self, model, X):
+        # Models without predict_proba (e.g. SVC(probability=False)) are ranked by their decision function
+        if hasattr(model, 'predict_proba'):
+            return model.predict_proba(X)[:, 1]
+        return model.decision_function(X)
 
     def plot_auprc(self):
         # Find the best model based on F1-Score
         best_model_name = self.model_evaluator.results_df.sort_values('F1-Score', ascending=False).iloc[0]['Model']
-        best_model = [model for name, (model, _) in self.model_evaluator.models.items() if name == best_model_name][0]
 
-        # Train the best model on the full training set and predict probabilities on the test set
-        best_model.fit(self.model_evaluator.X_train_scaled, self.model_evaluator.y_train)
-        y_scores = best_model.predict_proba(self.model_evaluator.X_test_scaled)[:, 1]
+        # Reuse the fitted object that produced the results instead of training the untuned estimator again
+        best_model = self.model_evaluator.fitted_models[best_model_name]
+        y_scores = self._score(best_model, self.model_evaluator.X_test_scaled)
 
         # Calculate precision and recall for various thresholds
         precision, recall, _ = precision_recall_curve(self.model_evaluator.y_test, y_scores)
@@ -27,4 +38,20 @@ class AUPRCPlotter:
         plt.ylabel('Precision')
         plt.title(f'Precision-Recall Curve for {best_model_name}')
         plt.legend(loc='best')
-        plt.show()
\ No newline at end of file
+        show_figure(self.output_dir, 'auprc')
+
+    def plot_oof_auprc(self, oof_store):
+        # Every model's curve comes from the stored out-of-fold scores, so nothing is refit here
+        summary = oof_store.summary()
+        curves = oof_store.precision_recall_curves()
+        plt.figure(figsize=(10, 6))
+        for _, row in summary.iterrows():
+            precision, recall, _ = curves[row['Model']]
+            plt.step(recall, precision, where='post',
+                     label=f"{row['Model']}: AUPRC = {row['AUPRC']:.2f} [{row['AUPRC CI Low']:.2f}, {row['AUPRC CI High']:.2f}]")
+        plt.xlabel('Recall')
+        plt.ylabel('Precision')
+        plt.title('Out-of-Fold Precision-Recall Curves')
+        plt.legend(loc='best')
+        show_figure(self.output_dir, 'oof_auprc')
+        return summary
@@ -0,0 +1,44 @@
+import os
+import joblib
+
+
+class FitCache:
+    def __init__(self, cache_dir, max_entries=128):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, estimator, data_hash, spec=None):
+        # Fitted objects are identified by the training data, the estimator class and its
+        # parameters, plus whatever search produced them
+        estimator_class = f"{type(estimator).__module__}.{type(estimator).__qualname__}"
+        return joblib.hash((data_hash, estimator_class, estimator.get_params(deep=False), spec))
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.joblib")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            entry = joblib.load(path)
+            # Loads count as use for LRU eviction
+            os.utime(path)
+        except (OSError, EOFError, ValueError):
+            return None
+        return entry
+
+    def put(self, key, entry):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(entry, tmp_path)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = sorted((entry.stat().st_mtime, entry.path) for entry in os.scandir(self.cache_dir)
+                         if entry.name.endswith('.joblib'))
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
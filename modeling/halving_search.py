@@ -0,0 +1,83 @@
+import math
+import time
+import numpy as np
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid, cross_validate, train_test_split
+
+
+class BudgetedHalvingSearch:
+    def __init__(self, estimator, param_grid, scoring='f1', cv=3, factor=3, min_resources=None,
+                 time_budget=None, random_state=42, n_jobs=1):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.cv = cv
+        self.factor = factor
+        self.min_resources = min_resources
+        self.time_budget = time_budget
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+
+    def _subsample(self, X, y, n_samples):
+        if n_samples >= len(y):
+            return X, y
+        X_sub, _, y_sub, _ = train_test_split(X, y, train_size=n_samples, stratify=y,
+                                              random_state=self.random_state)
+        return X_sub, y_sub
+
+    def _schedule(self, n_candidates, n_samples):
+        # Candidates shrink by `factor` per round while the subsample grows by `factor`,
+        # ending on the full training set
+        n_rounds = max(1, math.ceil(math.log(n_candidates, self.factor))) if n_candidates > 1 else 1
+        min_resources = self.min_resources or max(n_samples // self.factor ** (n_rounds - 1), self.cv * 20)
+        return [min(n_samples, min_resources * self.factor ** i) for i in range(n_rounds)]
+
+    def fit(self, X, y):
+        start = time.perf_counter()
+        deadline = start + self.time_budget if self.time_budget else None
+        candidates = list(ParameterGrid(self.param_grid))
+        survivors = list(range(len(candidates)))
+        best_round = {}
+        self.history_ = []
+        self.n_fits_ = 0
+        self.budget_exhausted_ = False
+
+        for resources in self._schedule(len(candidates), len(y)):
+            X_round, y_round = self._subsample(X, y, resources)
+            round_scores = {}
+            timings = {}
+            for index in survivors:
+                if deadline is not None and time.perf_counter() > deadline:
+                    # Out of budget: stop early and keep the best configuration seen so far
+                    self.budget_exhausted_ = True
+                    break
+                model = clone(self.estimator).set_params(**candidates[index])
+                try:
+                    scores = cross_validate(model, X_round, y_round, scoring=self.scoring, cv=self.cv,
+                                            n_jobs=self.n_jobs)
+                    score = np.mean(scores['test_score'])
+                    timings[index] = (np.mean(scores['fit_time']), np.mean(scores['score_time']))
+                except ValueError:
+                    # Invalid configurations (every fold failed) rank last, as in GridSearchCV
+                    score = np.nan
+                    timings[index] = (np.nan, np.nan)
+                self.n_fits_ += self.cv
+                round_scores[index] = -np.inf if np.isnan(score) else score
+            if round_scores:
+                best_round = round_scores
+            for index, score in round_scores.items():
+                self.history_.append({'params': candidates[index], 'n_samples': resources, 'score': score,
+                                     'fit_time': timings[index][0], 'score_time': timings[index][1]})
+            if self.budget_exhausted_ or not round_scores:
+                break
+            # Weak configurations are dropped on the subsample before anyone pays for a full fit
+            ranked = sorted(round_scores, key=round_scores.get, reverse=True)
+            survivors = ranked[:max(1, math.ceil(len(ranked) / self.factor))]
+
+        # The winner comes from the largest subsample any candidate reached
+        best_index = max(best_round, key=best_round.get) if best_round else 0
+        self.best_params_ = candidates[best_index]
+        self.best_score_ = best_round.get(best_index, np.nan)
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X, y)
+        self.elapsed_ = time.perf_counter() - start
+        return self
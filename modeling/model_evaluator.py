@@ -0,0 +1,255 @@
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split, GridSearchCV, ParameterGrid, cross_val_score
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+from modeling.halving_search import BudgetedHalvingSearch
+from modeling.fit_cache import FitCache
+from instrumentation.metrics import metrics, instrumented_stage
+
+RESULT_COLUMNS = ['Model', 'Accuracy', 'Precision', 'Recall', 'F1-Score', 'Fit Time (s)', 'Cached']
+
+
+def _search_and_fit(model, param_grid, hyperparameter_tuning, inner_jobs, search, time_budget,
+                    compare_exhaustive, X_train, y_train):
+    start = time.perf_counter()
+    extra = {}
+    # Mean per-fold (params, rows, fit seconds, score seconds) for every search candidate
+    candidates = []
+    if hyperparameter_tuning and param_grid is not None and search == 'halving':
+        # Successive halving: weak configurations are dropped on subsamples within the time budget
+        halving = BudgetedHalvingSearch(model, param_grid, scoring='f1', cv=3, time_budget=time_budget,
+                                        n_jobs=inner_jobs).fit(X_train, y_train)
+        best_model = halving.best_estimator_
+        extra = {'Search CV F1': halving.best_score_, 'Search Fits': halving.n_fits_,
+                 'Budget Exhausted': halving.budget_exhausted_}
+        candidates = [(entry['params'], entry['n_samples'], entry['fit_time'], entry['score_time'])
+                      for entry in halving.history_]
+    elif hyperparameter_tuning and param_grid is not None:
+        # Use grid search for hyperparameter tuning; refit=True already leaves best_estimator_ fitted
+        grid_search = GridSearchCV(model, param_grid, scoring='f1', cv=3, n_jobs=inner_jobs)
+        grid_search.fit(X_train, y_train)
+        best_model = grid_search.best_estimator_
+        cv_results = grid_search.cv_results_
+        candidates = list(zip(cv_results['params'], [len(y_train)] * len(cv_results['params']),
+                              cv_results['mean_fit_time'], cv_results['mean_score_time']))
+    else:
+        best_model = model
+        best_model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    if extra and compare_exhaustive:
+        # Score the halving winner with the same full-data CV the exhaustive grid uses
+        extra['Search CV F1'] = np.mean(cross_val_score(clone(best_model), X_train, y_train, scoring='f1', cv=3,
+                                                        n_jobs=inner_jobs))
+        grid_start = time.perf_counter()
+        grid_search = GridSearchCV(model, param_grid, scoring='f1', cv=3, n_jobs=inner_jobs).fit(X_train, y_train)
+        extra.update({'Exhaustive CV F1': grid_search.best_score_,
+                      'Exhaustive Time (s)': time.perf_counter() - grid_start})
+    return best_model, fit_time, extra, candidates
+
+
+def _fit_and_score(name, model, param_grid, hyperparameter_tuning, inner_jobs, search, time_budget,
+                   compare_exhaustive, fit_cache, data_hash, X_train, y_train, X_test, y_test):
+    # Runs in a worker process; the arrays arrive as read-only memmaps, not copies
+    entry = None
+    candidates = []
+    if fit_cache is not None:
+        key = fit_cache.key(model, data_hash, spec=(param_grid if hyperparameter_tuning else None,
+                                                    search, time_budget, compare_exhaustive))
+        entry = fit_cache.get(key)
+    if entry is None:
+        best_model, fit_time, extra, candidates = _search_and_fit(model, param_grid, hyperparameter_tuning, inner_jobs,
+                                                      search, time_budget, compare_exhaustive, X_train, y_train)
+        if fit_cache is not None:
+            fit_cache.put(key, {'model': best_model, 'fit_time': fit_time, 'extra': extra})
+        cached = False
+    else:
+        # Unchanged data, estimator and search: reuse the fitted object, no training
+        best_model, fit_time, extra = entry['model'], entry['fit_time'], entry['extra']
+        cached = True
+    predict_start = time.perf_counter()
+    y_pred = best_model.predict(X_test)
+    predict_time = time.perf_counter() - predict_start
+
+    # Evaluate
+    result = {
+        'Model': name,
+        'Accuracy': accuracy_score(y_test, y_pred),
+        'Precision': precision_score(y_test, y_pred),
+        'Recall': recall_score(y_test, y_pred),
+        'F1-Score': f1_score(y_test, y_pred),
+        'Fit Time (s)': fit_time,
+        'Cached': cached,
+        **extra,
+    }
+    # Timings travel back with the result because the registry lives in the parent process
+    timings = {'fit': fit_time, 'predict': predict_time, 'cached': cached, 'candidates': candidates}
+    return result, best_model, timings
+
+
+class PreparedSplits:
+    def __init__(self, max_entries=2):
+        # Scaled train/test splits by data key, least recently used first; evaluators given the same
+        # instance share a split instead of rescaling and re-dumping it
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                _, evicted = self.entries.popitem(last=False)
+                # Worker processes reopen the memory-mapped files by path, so max_entries should cover
+                # the datasets evaluated side by side
+                shutil.rmtree(evicted['folder'], ignore_errors=True)
+
+
+class ModelEvaluator:
+    def __init__(self, models, features, target, test_size=0.2, random_state=42, hyperparameter_tuning=False,
+                 n_jobs=None, search='grid', time_budget=None, compare_exhaustive=False, fit_cache=None,
+                 prepared_splits=None, split=None):
+        if search not in ('grid', 'halving'):
+            raise ValueError("search must be 'grid' or 'halving'")
+        self.models = models
+        self.features = features
+        self.target = target
+        self.test_size = test_size
+        self.random_state = random_state
+        self.hyperparameter_tuning = hyperparameter_tuning
+        self.n_jobs = n_jobs
+        self.search = search
+        self.time_budget = time_budget
+        self.compare_exhaustive = compare_exhaustive
+        self.fit_cache = FitCache(fit_cache) if isinstance(fit_cache, str) else fit_cache
+        # Pass one PreparedSplits to evaluators on the same data to share the scaled split
+        self.prepared_splits = prepared_splits if prepared_splits is not None else PreparedSplits(max_entries=1)
+        # (train positions, test positions) into `features`, for a split drawn elsewhere (the pipeline's
+        # graph hold-out); by default train_test_split draws one from test_size and random_state
+        self.split = None if split is None else (np.asarray(split[0]), np.asarray(split[1]))
+        self.fitted_models = {}
+        self.candidate_params = {}
+
+    def _data_key(self):
+        content_hash = joblib.hash(pd.util.hash_pandas_object(self.features, index=True).to_numpy())
+        split = None if self.split is None else joblib.hash(self.split)
+        return (content_hash, tuple(self.features.columns), self.target, self.test_size, self.random_state, split)
+
+    def _preprocess_data(self):
+        key = self._data_key()
+        prepared = self.prepared_splits.get(key)
+        if prepared is None:
+            X = self.features.drop(self.target, axis=1)
+            y = self.features[self.target]
+
+            # Train-test split
+            if self.split is None:
+                X_train, X_test, y_train, y_test = train_test_split(
+                    X, y, test_size=self.test_size, random_state=self.random_state
+                )
+            else:
+                train_index, test_index = self.split
+                X_train, X_test = X.iloc[train_index], X.iloc[test_index]
+                y_train, y_test = y.iloc[train_index], y.iloc[test_index]
+
+            # Feature scaling
+            scaler = StandardScaler()
+            X_train_scaled = scaler.fit_transform(X_train)
+            X_test_scaled = scaler.transform(X_test)
+
+            # Dump the scaled arrays once and reopen them memory-mapped so worker processes share pages
+            folder = tempfile.mkdtemp(prefix='model_evaluator_')
+            atexit.register(shutil.rmtree, folder, ignore_errors=True)
+            arrays = {}
+            for name, array in (('X_train_scaled', X_train_scaled), ('X_test_scaled', X_test_scaled),
+                                ('y_train', y_train.to_numpy()), ('y_test', y_test.to_numpy())):
+                path = os.path.join(folder, f"{name}.joblib")
+                joblib.dump(array, path)
+                arrays[name] = joblib.load(path, mmap_mode='r')
+            prepared = dict(arrays, X_train=X_train, X_test=X_test, scaler=scaler, folder=folder,
+                            y_train_series=y_train, y_test_series=y_test,
+                            data_hash=joblib.hash((X_train_scaled, y_train.to_numpy())))
+            self.prepared_splits.put(key, prepared)
+
+        self.X_train, self.X_test = prepared['X_train'], prepared['X_test']
+        self.y_train, self.y_test = prepared['y_train_series'], prepared['y_test_series']
+        self.scaler = prepared['scaler']
+        self.X_train_scaled, self.X_test_scaled = prepared['X_train_scaled'], prepared['X_test_scaled']
+        self._y_train_shared, self._y_test_shared = prepared['y_train'], prepared['y_test']
+        self.data_hash = prepared['data_hash']
+
+    def _worker_budget(self):
+        # Split the core budget between model workers and each GridSearchCV so the two never
+        # multiply into more processes than cores
+        total = self.n_jobs if self.n_jobs and self.n_jobs > 0 else os.cpu_count() or 1
+        workers = max(1, min(len(self.models), total))
+        return workers, max(1, total // workers)
+
+    def _time_budgets(self, workers):
+        # Split the global wall-clock budget by grid size: with `workers` models running at once
+        # there are budget * workers worker-seconds to share, but no model may outlive the budget
+        if not self.time_budget:
+            return {name: None for name in self.models}
+        sizes = {name: len(ParameterGrid(grid)) if grid else 1 for name, (_, grid) in self.models.items()}
+        total = sum(sizes.values())
+        return {name: min(self.time_budget, self.time_budget * workers * size / total)
+                for name, size in sizes.items()}
+
+    def _record_timings(self, outputs):
+        for result, _, timings in outputs:
+            labels = {'evaluator': type(self).__name__, 'model': result['Model']}
+            metrics.set('model_fit_seconds', timings['fit'], labels=labels)
+            metrics.set('model_predict_seconds', timings['predict'], labels=labels)
+            metrics.inc('model_fits_total', labels=dict(labels, cached=str(timings['cached']).lower()))
+            for params, n_samples, fit_seconds, score_seconds in timings['candidates']:
+                # A short hash keeps the label bounded; candidate_params maps it back to the settings
+                params_id = joblib.hash(sorted(params.items()))[:12]
+                self.candidate_params[params_id] = params
+                candidate = dict(labels, search=self.search, params_id=params_id, n_samples=n_samples)
+                metrics.set('model_candidate_fit_seconds', fit_seconds, labels=candidate)
+                metrics.set('model_candidate_score_seconds', score_seconds, labels=candidate)
+
+    @instrumented_stage('evaluation')
+    def evaluate_models(self):
+        self._preprocess_data()
+        workers, inner_jobs = self._worker_budget()
+        budgets = self._time_budgets(workers)
+
+        # Train and evaluate each model in a process pool
+        outputs = Parallel(n_jobs=workers)(
+            delayed(_fit_and_score)(name, clone(model), param_grid, self.hyperparameter_tuning, inner_jobs,
+                                    self.search, budgets[name], self.compare_exhaustive,
+                                    self.fit_cache, self.data_hash, self.X_train_scaled, self._y_train_shared, self.X_test_scaled, self._y_test_shared)
+            for name, (model, param_grid) in self.models.items()
+        )
+
+        # Create a DataFrame to store model comparison results
+        self._record_timings(outputs)
+        results = [result for result, _, _ in outputs]
+        extra_columns = list(dict.fromkeys(column for result in results for column in result
+                                           if column not in RESULT_COLUMNS))
+        self.results_df = pd.DataFrame(results, columns=RESULT_COLUMNS + extra_columns)
+        self.fitted_models = {result['Model']: model for result, model, _ in outputs}
+
+        # Display the results
+        print(self.results_df)
+        return self.results_df
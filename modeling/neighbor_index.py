@@ -0,0 +1,209 @@
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from joblib import Parallel, delayed
+from sklearn.neighbors import KDTree, BallTree, KNeighborsClassifier
+from instrumentation.metrics import metrics
+
+INDEX_FORMAT = 1
+# Past this many dimensions a ball tree prunes better than a KD-tree (sklearn's 'auto' uses the same cut-off)
+KD_TREE_MAX_DIMENSIONS = 15
+
+
+class NeighborIndex:
+    def __init__(self, tree, labels, positive_tree, positive_rows, ids=None, scaler=None, feature_columns=None,
+                 positive_label=1, n_neighbors=5, weights='uniform'):
+        # `tree` covers every indexed row, `positive_tree` only the flagged ones (positions in positive_rows)
+        self.tree = tree
+        self.labels = labels
+        self.positive_tree = positive_tree
+        self.positive_rows = positive_rows
+        self.ids = ids
+        self.scaler = scaler
+        self.feature_columns = list(feature_columns) if feature_columns is not None else None
+        self.positive_label = positive_label
+        # Defaults for predict_proba, taken from the tuned KNeighborsClassifier when there is one
+        self.n_neighbors = n_neighbors
+        self.weights = weights
+
+    @classmethod
+    def build(cls, X_scaled, labels, ids=None, scaler=None, feature_columns=None, positive_label=1, leaf_size=30,
+              n_neighbors=5, weights='uniform'):
+        X_scaled = np.ascontiguousarray(X_scaled, dtype=np.float64)
+        labels = np.asarray(labels)
+        tree_class = KDTree if X_scaled.shape[1] <= KD_TREE_MAX_DIMENSIONS else BallTree
+        start = time.perf_counter()
+        positive_rows = np.flatnonzero(labels == positive_label)
+        positive_tree = tree_class(X_scaled[positive_rows], leaf_size=leaf_size) if len(positive_rows) else None
+        index = cls(tree_class(X_scaled, leaf_size=leaf_size), labels, positive_tree, positive_rows,
+                    # Fixed-width bytes, not objects, so the ids are memory-mapped along with the trees
+                    ids=np.asarray(ids).astype('S') if ids is not None else None,
+                    scaler=scaler, feature_columns=feature_columns, positive_label=positive_label,
+                    n_neighbors=n_neighbors, weights=weights)
+        print(f"Built {tree_class.__name__} over {len(X_scaled)} rows ({len(positive_rows)} flagged) "
+              f"in {time.perf_counter() - start:.2f}s")
+        return index
+
+    @classmethod
+    def from_evaluator(cls, model_evaluator, ids=None, model_name='KNeighbors', leaf_size=30):
+        # The evaluator's scaled training split; ids (e.g. addresses) are aligned to X_train's index
+        if ids is not None and isinstance(ids, pd.Series):
+            ids = ids.loc[model_evaluator.X_train.index].to_numpy()
+        knn = model_evaluator.fitted_models.get(model_name)
+        settings = {}
+        if isinstance(knn, KNeighborsClassifier):
+            settings = {'n_neighbors': knn.n_neighbors, 'weights': knn.weights}
+        return cls.build(model_evaluator.X_train_scaled, model_evaluator.y_train.to_numpy(), ids=ids,
+                         scaler=model_evaluator.scaler, feature_columns=model_evaluator.X_train.columns,
+                         leaf_size=leaf_size, **settings)
+
+    def save(self, path):
+        artifact = {
+            'format': INDEX_FORMAT,
+            'tree': self.tree,
+            'labels': self.labels,
+            'positive_tree': self.positive_tree,
+            'positive_rows': self.positive_rows,
+            'ids': self.ids,
+            'scaler': self.scaler,
+            'feature_columns': self.feature_columns,
+            'positive_label': self.positive_label,
+            'n_neighbors': self.n_neighbors,
+            'weights': self.weights,
+            'sklearn_version': sklearn.__version__,
+        }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, path)
+        print(f"Saved neighbour index ({len(self)} rows) to {path}")
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        # The tree arrays are memory-mapped, so loading is near-instant and processes share the pages
+        artifact = joblib.load(path, mmap_mode=mmap_mode)
+        if artifact.get('format') != INDEX_FORMAT:
+            raise ValueError(f"Unsupported neighbour index format: {artifact.get('format')}")
+        if artifact['sklearn_version'] != sklearn.__version__:
+            print(f"Warning: index was built with scikit-learn {artifact['sklearn_version']}, "
+                  f"running {sklearn.__version__}")
+        return cls(artifact['tree'], artifact['labels'], artifact['positive_tree'], artifact['positive_rows'],
+                   ids=artifact['ids'], scaler=artifact['scaler'], feature_columns=artifact['feature_columns'],
+                   positive_label=artifact['positive_label'], n_neighbors=artifact['n_neighbors'],
+                   weights=artifact['weights'])
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _scaled(self, rows):
+        # Raw feature rows (a DataFrame or arrays in feature order) when there is a scaler, else scaled rows
+        if isinstance(rows, pd.DataFrame):
+            columns = self.feature_columns if self.feature_columns is not None else list(rows.columns)
+            missing = [column for column in columns if column not in rows.columns]
+            if missing:
+                raise ValueError(f"Missing feature columns: {missing}")
+            rows = rows[columns]
+        elif self.scaler is not None and hasattr(self.scaler, 'feature_names_in_'):
+            rows = pd.DataFrame(np.asarray(rows, dtype=np.float64).reshape(-1, len(self.feature_columns)),
+                                columns=self.feature_columns)
+        X = rows if self.scaler is None else self.scaler.transform(rows)
+        X = np.asarray(X, dtype=np.float64)
+        return X.reshape(1, -1) if X.ndim == 1 else X
+
+    def _chunked(self, query, X, chunk_size, n_jobs):
+        # Tree queries release the GIL, so chunks run on threads
+        chunks = [X[start:start + chunk_size] for start in range(0, len(X), chunk_size)]
+        return Parallel(n_jobs=n_jobs, prefer='threads')(delayed(query)(chunk) for chunk in chunks)
+
+    def kneighbors(self, rows, k=None, positive_only=False, chunk_size=10000, n_jobs=None):
+        # Distances and row positions of the k nearest indexed rows (or flagged rows), nearest first
+        k = k or self.n_neighbors
+        tree = self.positive_tree if positive_only else self.tree
+        X = self._scaled(rows)
+        k = min(k, len(self.positive_rows) if positive_only else len(self))
+        if not len(X) or not k:
+            return np.empty((len(X), 0)), np.empty((len(X), 0), dtype=np.int64)
+        results = self._chunked(lambda chunk: tree.query(chunk, k=k), X, chunk_size, n_jobs)
+        distances = np.vstack([distance for distance, _ in results])
+        positions = np.vstack([position for _, position in results])
+        if positive_only:
+            positions = self.positive_rows[positions]
+        return distances, positions
+
+    def radius_neighbors(self, rows, radius, positive_only=False, chunk_size=10000, n_jobs=None):
+        # Per query row, the (distances, positions) of every indexed row within radius, nearest first
+        tree = self.positive_tree if positive_only else self.tree
+        X = self._scaled(rows)
+        if tree is None:
+            return [np.empty(0) for _ in X], [np.empty(0, dtype=np.int64) for _ in X]
+        results = self._chunked(lambda chunk: tree.query_radius(chunk, r=radius, return_distance=True,
+                                                                sort_results=True), X, chunk_size, n_jobs)
+        positions = [position for chunk_positions, _ in results for position in chunk_positions]
+        distances = [distance for _, chunk_distances in results for distance in chunk_distances]
+        if positive_only:
+            positions = [self.positive_rows[position] for position in positions]
+        return distances, positions
+
+    def predict_proba(self, rows, k=None, weights=None, chunk_size=10000, n_jobs=None):
+        # Flagged-class probability, as KNeighborsClassifier.predict_proba computes it over the same rows
+        weights = weights or self.weights
+        distances, positions = self.kneighbors(rows, k, chunk_size=chunk_size, n_jobs=n_jobs)
+        if weights == 'uniform':
+            neighbor_weights = np.ones_like(distances)
+        elif weights == 'distance':
+            with np.errstate(divide='ignore'):
+                neighbor_weights = 1.0 / distances
+            # An exact match takes all the weight
+            exact = np.isinf(neighbor_weights).any(axis=1)
+            neighbor_weights[exact] = np.isinf(neighbor_weights[exact])
+        else:
+            raise ValueError("weights must be 'uniform' or 'distance'")
+        flagged = self.labels[positions] == self.positive_label
+        return (neighbor_weights * flagged).sum(axis=1) / neighbor_weights.sum(axis=1)
+
+    def _ids(self, positions):
+        return self.ids[positions].astype(str) if self.ids is not None else positions
+
+    def similar(self, rows, k=5, radius=None, n_jobs=None):
+        # Known-fraud rows most similar to each query row: the k nearest, or all within radius
+        if radius is None:
+            distances, positions = self.kneighbors(rows, k, positive_only=True, n_jobs=n_jobs)
+            query = np.repeat(np.arange(len(positions)), positions.shape[1])
+            rank = np.tile(np.arange(positions.shape[1]), len(positions))
+            distances, positions = distances.ravel(), positions.ravel()
+        else:
+            row_distances, row_positions = self.radius_neighbors(rows, radius, positive_only=True, n_jobs=n_jobs)
+            counts = [len(position) for position in row_positions]
+            query = np.repeat(np.arange(len(counts)), counts)
+            rank = np.concatenate([np.arange(count) for count in counts]) if counts else np.empty(0, dtype=np.int64)
+            distances = np.concatenate(row_distances) if counts else np.empty(0)
+            positions = np.concatenate(row_positions).astype(np.int64) if counts else np.empty(0, dtype=np.int64)
+        return pd.DataFrame({'query': query, 'rank': rank, 'id': self._ids(positions), 'distance': distances})
+
+    def benchmark(self, rows, k=None, radius=None, repeats=3, n_jobs=None):
+        # Measured query throughput on this machine, also exported as gauges
+        X = self._scaled(rows)
+        scaled = NeighborIndex(self.tree, self.labels, self.positive_tree, self.positive_rows, ids=self.ids,
+                               positive_label=self.positive_label, n_neighbors=self.n_neighbors, weights=self.weights)
+        queries = {'knn': lambda: scaled.kneighbors(X, k, n_jobs=n_jobs)}
+        if radius is not None:
+            queries['radius'] = lambda: scaled.radius_neighbors(X, radius, n_jobs=n_jobs)
+        report = {'rows': len(X), 'indexed_rows': len(self)}
+        for name, query in queries.items():
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                query()
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            report[f'{name}_seconds'] = best
+            report[f'{name}_queries_per_second'] = len(X) / best
+            metrics.set('neighbor_queries_per_second', len(X) / best, labels={'query': name})
+            print(f"Neighbour {name} queries: {len(X)} rows in {best:.4f}s ({len(X) / best:.0f} queries/s)")
+        return report
@@ -0,0 +1,163 @@
+import json
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from data_collection_and_processing.transaction_graph import LABEL_DERIVED_COLUMNS
+from instrumentation.metrics import instrumented_stage
+
+
+def _fold_scores(model, X, y, train_index, test_index):
+    # The scaler is refit inside each fold so out-of-fold scores never see their own rows
+    pipeline = make_pipeline(StandardScaler(), clone(model)).fit(X[train_index], y[train_index])
+    if hasattr(pipeline, 'predict_proba'):
+        return pipeline.predict_proba(X[test_index])[:, 1]
+    return pipeline.decision_function(X[test_index])
+
+
+def _ranked(scores, y):
+    # Sort every row by descending score once; the helpers below work on these sorted views
+    order = np.argsort(-scores, axis=-1, kind='stable')
+    sorted_scores = np.take_along_axis(scores, order, axis=-1)
+    sorted_y = np.take_along_axis(np.broadcast_to(y, scores.shape), order, axis=-1).astype(np.float64)
+    tp = np.cumsum(sorted_y, axis=-1)
+    fp = np.arange(1, scores.shape[-1] + 1) - tp
+    # A threshold only exists at the last element of each run of tied scores
+    is_last = np.ones(scores.shape, dtype=bool)
+    is_last[..., :-1] = sorted_scores[..., 1:] != sorted_scores[..., :-1]
+    return sorted_scores, sorted_y, tp, fp, is_last
+
+
+def average_precision(scores, y):
+    # Vectorised over any leading axes (models, bootstrap replicates): each positive contributes
+    # the precision at the end of its tie group, which equals sklearn's average_precision_score
+    _, sorted_y, tp, fp, is_last = _ranked(scores, y)
+    n = scores.shape[-1]
+    positions = np.where(is_last, np.arange(n), n - 1)
+    group_end = np.flip(np.minimum.accumulate(np.flip(positions, axis=-1), axis=-1), axis=-1)
+    precision = tp / (tp + fp)
+    n_positive = sorted_y.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sorted_y * np.take_along_axis(precision, group_end, axis=-1)).sum(axis=-1) / n_positive
+
+
+class OutOfFoldStore:
+    def __init__(self, store_dir, n_splits=5, random_state=42, n_jobs=-1):
+        self.store_dir = store_dir
+        self.n_splits = n_splits
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+        self.scores = None
+        self.y = None
+        self.model_names = []
+
+    def _paths(self):
+        return (os.path.join(self.store_dir, 'scores.npy'), os.path.join(self.store_dir, 'labels.npy'),
+                os.path.join(self.store_dir, 'meta.json'))
+
+    def _fingerprint(self, models, X, y):
+        params = {name: (type(model).__name__, model.get_params(deep=False)) for name, model in models.items()}
+        return joblib.hash((X, y, params, self.n_splits, self.random_state))
+
+    def load(self):
+        scores_path, labels_path, meta_path = self._paths()
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+        # Memory-mapped: comparing models later touches the stored array without refitting anything
+        self.scores = np.load(scores_path, mmap_mode='r')
+        self.y = np.load(labels_path)
+        self.model_names = meta['models']
+        return meta
+
+    @instrumented_stage('oof_evaluation')
+    def compute(self, models, X, y):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y).astype(np.int8)
+        fingerprint = self._fingerprint(models, X, y)
+        try:
+            if self.load()['fingerprint'] == fingerprint:
+                return self
+        except (OSError, ValueError, KeyError):
+            pass
+
+        folds = list(StratifiedKFold(n_splits=self.n_splits, shuffle=True,
+                                     random_state=self.random_state).split(X, y))
+        tasks = [(name, fold) for name in models for fold in range(len(folds))]
+        # Every (model, fold) fit runs in parallel; joblib memory-maps X for the workers
+        outputs = Parallel(n_jobs=self.n_jobs)(
+            delayed(_fold_scores)(models[name], X, y, *folds[fold]) for name, fold in tasks
+        )
+
+        scores = np.empty((len(models), len(y)), dtype=np.float32)
+        names = list(models)
+        for (name, fold), fold_scores in zip(tasks, outputs):
+            scores[names.index(name), folds[fold][1]] = fold_scores
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        scores_path, labels_path, meta_path = self._paths()
+        np.save(scores_path, scores)
+        np.save(labels_path, y)
+        with open(meta_path, 'w') as meta_file:
+            json.dump({'models': names, 'fingerprint': fingerprint, 'n_splits': self.n_splits}, meta_file)
+        self.load()
+        return self
+
+    @classmethod
+    def from_evaluator(cls, model_evaluator, store_dir, **kwargs):
+        # Out-of-fold scores for the configurations the evaluator settled on, over its training rows only, so
+        # its held-out rows stay unseen. Columns built from the training labels would carry each fold's
+        # validation labels into its training rows, so they are left out here.
+        models = model_evaluator.fitted_models or {name: model for name, (model, _) in model_evaluator.models.items()}
+        if not hasattr(model_evaluator, 'X_train'):
+            model_evaluator._preprocess_data()
+        X_train = model_evaluator.X_train.drop(columns=LABEL_DERIVED_COLUMNS, errors='ignore')
+        return cls(store_dir, **kwargs).compute(models, X_train, model_evaluator.y_train)
+
+    def average_precision(self):
+        return average_precision(np.asarray(self.scores, dtype=np.float64), self.y)
+
+    def best_f1(self):
+        sorted_scores, sorted_y, tp, fp, is_last = _ranked(np.asarray(self.scores, dtype=np.float64), self.y)
+        f1 = np.where(is_last, 2 * tp / (tp + fp + sorted_y.sum(axis=-1, keepdims=True)), -1)
+        best = np.argmax(f1, axis=-1)
+        rows = np.arange(len(best))
+        return f1[rows, best], sorted_scores[rows, best]
+
+    def bootstrap_ci(self, n_bootstrap=1000, confidence=0.95, chunk_size=50, random_state=42):
+        # Paired bootstrap: every model is scored on the same resampled rows
+        rng = np.random.default_rng(random_state)
+        scores = np.asarray(self.scores, dtype=np.float64)
+        n = scores.shape[1]
+        replicates = []
+        for start in range(0, n_bootstrap, chunk_size):
+            size = min(chunk_size, n_bootstrap - start)
+            index = rng.integers(0, n, size=(size, n))
+            replicates.append(average_precision(scores[:, index], self.y[index]))
+        replicates = np.concatenate(replicates, axis=1)
+        alpha = (1 - confidence) / 2
+        return np.nanquantile(replicates, alpha, axis=1), np.nanquantile(replicates, 1 - alpha, axis=1)
+
+    def precision_recall_curves(self):
+        sorted_scores, sorted_y, tp, fp, is_last = _ranked(np.asarray(self.scores, dtype=np.float64), self.y)
+        precision = tp / (tp + fp)
+        recall = tp / sorted_y.sum(axis=-1, keepdims=True)
+        return {name: (precision[i, is_last[i]], recall[i, is_last[i]], sorted_scores[i, is_last[i]])
+                for i, name in enumerate(self.model_names)}
+
+    def summary(self, n_bootstrap=1000, confidence=0.95):
+        best_f1, threshold = self.best_f1()
+        low, high = self.bootstrap_ci(n_bootstrap, confidence)
+        summary_df = pd.DataFrame({
+            'Model': self.model_names,
+            'AUPRC': self.average_precision(),
+            'AUPRC CI Low': low,
+            'AUPRC CI High': high,
+            'Best F1': best_f1,
+            'Best Threshold': threshold,
+        })
+        return summary_df.sort_values('AUPRC', ascending=False, ignore_index=True)
@@ -0,0 +1,140 @@
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from data_collection_and_processing.dataset_store import iter_dataset
+from instrumentation.metrics import instrumented_stage
+
+ARTIFACT_FORMAT = 1
+# Default decision threshold per score kind: probabilities split at 0.5, decision_function
+# margins (e.g. SVC without probability=True) at 0
+DEFAULT_THRESHOLDS = {'probability': 0.5, 'decision': 0.0}
+
+
+def score_kind(model):
+    return 'probability' if hasattr(model, 'predict_proba') else 'decision'
+
+
+class ScoringPipeline:
+    def __init__(self, model, scaler, feature_columns, model_name=None, version=None, threshold=None):
+        self.model = model
+        self.scaler = scaler
+        self.feature_columns = list(feature_columns)
+        self.model_name = model_name or type(model).__name__
+        self.version = version or time.strftime('%Y%m%d%H%M%S')
+        self.score_kind = score_kind(model)
+        self.threshold = DEFAULT_THRESHOLDS[self.score_kind] if threshold is None else threshold
+
+    @classmethod
+    def from_evaluator(cls, model_evaluator, model_name=None, version=None, threshold=None):
+        # Defaults to the model with the best F1 on the evaluator's test split
+        if model_name is None:
+            model_name = model_evaluator.results_df.sort_values('F1-Score', ascending=False).iloc[0]['Model']
+        version = version or f"{model_name}-{model_evaluator.data_hash[:12]}"
+        return cls(model_evaluator.fitted_models[model_name], model_evaluator.scaler,
+                   model_evaluator.X_train.columns, model_name=model_name, version=version, threshold=threshold)
+
+    def save(self, path):
+        # Scaler, feature order and model travel together so they can never be paired wrongly
+        artifact = {
+            'format': ARTIFACT_FORMAT,
+            'version': self.version,
+            'model_name': self.model_name,
+            'feature_columns': self.feature_columns,
+            'scaler': self.scaler,
+            'model': self.model,
+            'score_kind': self.score_kind,
+            'threshold': self.threshold,
+            'sklearn_version': sklearn.__version__,
+        }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, path)
+        print(f"Saved scoring pipeline {self.version} ({self.model_name}) to {path}")
+        return path
+
+    @classmethod
+    def load(cls, path):
+        artifact = joblib.load(path)
+        if artifact.get('format') != ARTIFACT_FORMAT:
+            raise ValueError(f"Unsupported scoring artifact format: {artifact.get('format')}")
+        if artifact['sklearn_version'] != sklearn.__version__:
+            print(f"Warning: artifact was built with scikit-learn {artifact['sklearn_version']}, "
+                  f"running {sklearn.__version__}")
+        return cls(artifact['model'], artifact['scaler'], artifact['feature_columns'],
+                   model_name=artifact['model_name'], version=artifact['version'], threshold=artifact['threshold'])
+
+    def matrix(self, rows):
+        # Feature rows (a DataFrame, or lists in artifact order) as a float64 matrix, validated
+        if isinstance(rows, pd.DataFrame):
+            missing = [column for column in self.feature_columns if column not in rows.columns]
+            if missing:
+                raise ValueError(f"Missing feature columns: {missing}")
+            return rows[self.feature_columns].to_numpy(dtype=np.float64)
+        X = np.asarray(rows, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != len(self.feature_columns):
+            raise ValueError(f"Expected {len(self.feature_columns)} features, got {X.shape[1]}")
+        return X
+
+    def _score_block(self, X):
+        if hasattr(self.scaler, 'feature_names_in_'):
+            # The evaluator fits its scaler on a DataFrame; keep the names so sklearn can check them
+            X = pd.DataFrame(X, columns=self.feature_columns)
+        X_scaled = self.scaler.transform(X)
+        if self.score_kind == 'probability':
+            return self.model.predict_proba(X_scaled)[:, 1]
+        return self.model.decision_function(X_scaled)
+
+    def score(self, rows, chunk_size=50000):
+        # Rows are scored in fixed-size blocks so memory stays flat for any input size
+        X = self.matrix(rows)
+        scores = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), chunk_size):
+            scores[start:start + chunk_size] = self._score_block(X[start:start + chunk_size])
+        return scores
+
+    def score_frame(self, frame, chunk_size=50000):
+        scores = self.score(frame, chunk_size)
+        result = pd.DataFrame({'Score': scores, 'Prediction': (scores >= self.threshold).astype(np.int8)},
+                              index=frame.index)
+        if 'Address' in frame.columns:
+            result.insert(0, 'Address', frame['Address'].to_numpy())
+        return result
+
+    @instrumented_stage('scoring')
+    def score_csv(self, input_path, output_path=None, chunksize=100000, dataset_store=None):
+        # Reads only Address plus the model's features from address_data_ethereum.csv-style files;
+        # with a dataset_store only those columns of the memory-mapped copy are touched
+        header = pd.read_csv(input_path, nrows=0).columns
+        usecols = [column for column in header if column == 'Address' or column in self.feature_columns]
+        results = []
+        for index, chunk in enumerate(iter_dataset(input_path, chunksize, columns=usecols,
+                                                   dataset_store=dataset_store)):
+            result = self.score_frame(chunk, chunksize)
+            if output_path is not None:
+                result.to_csv(output_path, mode='w' if index == 0 else 'a', index=False, header=index == 0)
+            else:
+                results.append(result)
+        if output_path is not None:
+            return output_path
+        return pd.concat(results, ignore_index=True) if results else pd.DataFrame(columns=['Address', 'Score', 'Prediction'])
+
+    def benchmark(self, rows, chunk_size=50000, repeats=5):
+        # Batch throughput for this machine; the numbers are measured, not estimated
+        X = self.matrix(rows)
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            self.score(X, chunk_size)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        report = {'rows': len(X), 'best_seconds': best, 'rows_per_second': len(X) / best}
+        print(f"Batch scoring: {report['rows']} rows in {best:.4f}s ({report['rows_per_second']:.0f} rows/s)")
+        return report
@@ -0,0 +1,208 @@
+import argparse
+import json
+import queue
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from modeling.scoring_pipeline import ScoringPipeline
+from modeling.neighbor_index import NeighborIndex
+
+
+class MicroBatcher:
+    def __init__(self, pipeline, max_batch_size=512, max_wait_ms=2):
+        self.pipeline = pipeline
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.batches = 0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, X):
+        future = Future()
+        self.requests.put((X, future))
+        return future
+
+    def _loop(self):
+        while not self._stopped:
+            try:
+                pending = [self.requests.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            # Wait briefly for concurrent requests so they share one vectorised model call
+            rows = len(pending[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                rows += len(item[0])
+            try:
+                scores = self.pipeline.score(np.vstack([X for X, _ in pending]))
+            except Exception as error:
+                for _, future in pending:
+                    future.set_exception(error)
+                continue
+            self.batches += 1
+            offset = 0
+            for X, future in pending:
+                future.set_result(scores[offset:offset + len(X)])
+                offset += len(X)
+
+    def close(self):
+        self._stopped = True
+        self._thread.join()
+
+
+class ScoringRequestHandler(BaseHTTPRequestHandler):
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        pipeline = self.server.batcher.pipeline
+        if self.path != '/health':
+            return self._send(404, {'error': 'not found'})
+        self._send(200, {'model': pipeline.model_name, 'version': pipeline.version,
+                         'features': pipeline.feature_columns, 'score_kind': pipeline.score_kind,
+                         'threshold': pipeline.threshold})
+
+    def _similar(self):
+        # Known-fraud rows nearest to each posted row, from the memory-mapped neighbour index
+        neighbor_index = self.server.neighbor_index
+        if neighbor_index is None:
+            return self._send(404, {'error': 'no neighbour index loaded'})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            rows = body['rows']
+            if rows and isinstance(rows[0], dict):
+                rows = [[row[column] for column in neighbor_index.feature_columns] for row in rows]
+            similar = neighbor_index.similar(np.asarray(rows, dtype=np.float64), k=int(body.get('k', 5)),
+                                             radius=body.get('radius'))
+        except (ValueError, KeyError, TypeError) as error:
+            return self._send(400, {'error': str(error)})
+        neighbors = [[] for _ in rows]
+        for query, row_id, distance in zip(similar['query'], similar['id'], similar['distance']):
+            neighbors[query].append({'id': str(row_id), 'distance': float(distance)})
+        self._send(200, {'neighbors': neighbors})
+
+    def do_POST(self):
+        if self.path == '/similar':
+            return self._similar()
+        if self.path != '/score':
+            return self._send(404, {'error': 'not found'})
+        pipeline = self.server.batcher.pipeline
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            # Rows are either feature lists in artifact order or objects keyed by feature name
+            rows = body['rows']
+            if rows and isinstance(rows[0], dict):
+                rows = [[row[column] for column in pipeline.feature_columns] for row in rows]
+            X = pipeline.matrix(rows)
+        except (ValueError, KeyError, TypeError) as error:
+            return self._send(400, {'error': str(error)})
+        try:
+            scores = self.server.batcher.submit(X).result()
+        except Exception as error:
+            return self._send(500, {'error': str(error)})
+        self._send(200, {'version': pipeline.version, 'scores': scores.tolist(),
+                         'predictions': (scores >= pipeline.threshold).astype(int).tolist()})
+
+    def log_message(self, format, *args):
+        # Per-request access logs would dominate the cost of small requests
+        pass
+
+
+class _ScoringHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under concurrent clients and adds
+    # a one-second SYN retry to the tail latency
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class ScoringServer:
+    def __init__(self, pipeline, host='127.0.0.1', port=8000, max_batch_size=512, max_wait_ms=2, neighbor_index=None):
+        if isinstance(pipeline, str):
+            pipeline = ScoringPipeline.load(pipeline)
+        if isinstance(neighbor_index, str):
+            neighbor_index = NeighborIndex.load(neighbor_index)
+        self.batcher = MicroBatcher(pipeline, max_batch_size, max_wait_ms)
+        self.httpd = _ScoringHTTPServer((host, port), ScoringRequestHandler)
+        self.httpd.batcher = self.batcher
+        self.httpd.neighbor_index = neighbor_index
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"Scoring {self.batcher.pipeline.version} at {self.url}/score")
+        return self
+
+    def serve_forever(self):
+        print(f"Scoring {self.batcher.pipeline.version} at {self.url}/score")
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.batcher.close()
+
+
+def benchmark_endpoint(url, rows, clients=16, requests_per_client=200, rows_per_request=1):
+    # Concurrent single-row (or small-batch) requests against a running server
+    rows = [list(map(float, row)) for row in np.asarray(rows, dtype=np.float64)]
+    bodies = [json.dumps({'rows': rows[i:i + rows_per_request]}).encode()
+              for i in range(0, len(rows) - rows_per_request + 1, rows_per_request)]
+
+    def client(index):
+        latencies = []
+        for request_number in range(requests_per_client):
+            body = bodies[(index * requests_per_client + request_number) % len(bodies)]
+            request = urllib.request.Request(f"{url}/score", data=body, headers={'Content-Type': 'application/json'})
+            start = time.perf_counter()
+            with urllib.request.urlopen(request) as response:
+                response.read()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = np.concatenate([np.asarray(result) for result in executor.map(client, range(clients))])
+    elapsed = time.perf_counter() - start
+    report = {
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / elapsed,
+        'rows_per_second': len(latencies) * rows_per_request / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+    }
+    print(f"Endpoint: {report['requests']} requests, {report['requests_per_second']:.0f} req/s, "
+          f"p50 {report['p50_ms']:.2f} ms, p99 {report['p99_ms']:.2f} ms")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a saved scoring pipeline over HTTP')
+    parser.add_argument('artifact')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=512)
+    parser.add_argument('--max-wait-ms', type=float, default=2)
+    parser.add_argument('--neighbor-index', default=None, help='neighbour index artifact to serve /similar from')
+    args = parser.parse_args()
+    ScoringServer(args.artifact, args.host, args.port, args.max_batch_size, args.max_wait_ms,
+                  args.neighbor_index).serve_forever()
@@ -0,0 +1,161 @@
+import json
+import socket
+import time
+from collections import deque
+from data_collection_and_processing.sliding_window import DATASET_COLUMNS, SlidingWindowStore
+from modeling.scoring_pipeline import ScoringPipeline
+
+STAT_FOR_COLUMN = {column: stat for stat, column in DATASET_COLUMNS.items()}
+
+
+def replay_file(path):
+    # JSON lines of txlist transactions, or a saved txlist response / JSON array
+    with open(path) as feed:
+        try:
+            first = json.loads(feed.readline())
+        except ValueError:
+            first = None
+        if isinstance(first, dict) and 'from' in first:
+            yield first
+            for line in feed:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        feed.seek(0)
+        payload = json.load(feed)
+    yield from payload['result'] if isinstance(payload, dict) else payload
+
+
+def read_socket(host, port, heartbeat=1.0):
+    # A TCP feed of newline-delimited txlist transactions. When nothing arrives for `heartbeat`
+    # seconds it yields None, so the detector can score pending changes on a quiet feed.
+    with socket.create_connection((host, port)) as connection:
+        connection.settimeout(heartbeat)
+        buffer = b''
+        while True:
+            try:
+                data = connection.recv(65536)
+            except socket.timeout:
+                yield None
+                continue
+            if not data:
+                # A line cut off by the connection closing is dropped rather than parsed
+                return
+            *lines, buffer = (buffer + data).split(b'\n')
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class StreamingDetector:
+    def __init__(self, pipeline, watch=None, window_seconds=30 * 24 * 3600, max_events=256,
+                 idle_seconds=7 * 24 * 3600, max_addresses=100000, score_every=2048, max_delay=1.0,
+                 evict_every=10000, report_every=100000, on_alert=None, max_alerts=10000):
+        self.pipeline = ScoringPipeline.load(pipeline) if isinstance(pipeline, str) else pipeline
+        missing = [column for column in self.pipeline.feature_columns if column not in STAT_FOR_COLUMN]
+        if missing:
+            raise ValueError(f"Model features without a streaming definition: {missing}")
+        self.stat_keys = [STAT_FOR_COLUMN[column] for column in self.pipeline.feature_columns]
+        self.watch = {address.lower() for address in watch} if watch is not None else None
+        self.store = SlidingWindowStore(window_seconds, max_events, idle_seconds, max_addresses,
+                                        on_evict=self._forget)
+        self.score_every = score_every
+        self.max_delay = max_delay
+        self.evict_every = evict_every
+        self.report_every = report_every
+        self.on_alert = on_alert
+        self.dirty = set()
+        self.dirty_since = None
+        self.flagged = set()
+        self.scores = {}
+        # The most recent alerts only; on_alert sees every one
+        self.alerts = deque(maxlen=max_alerts)
+        self.alert_count = 0
+        self.events = 0
+        self.scored = 0
+
+    def _addresses(self, transaction):
+        addresses = {transaction['from'].lower(), transaction['to'].lower()} - {''}
+        return addresses if self.watch is None else addresses & self.watch
+
+    def score_due(self):
+        # Changed addresses are scored together, each with its latest state, once `score_every` of them
+        # are waiting or the oldest change has waited `max_delay` seconds; a `watch` list is small, so
+        # its addresses are scored on every change
+        if not self.dirty:
+            return False
+        return (self.watch is not None or len(self.dirty) >= self.score_every
+                or time.monotonic() - self.dirty_since >= self.max_delay)
+
+    def process(self, transaction):
+        for address in self._addresses(transaction):
+            if self.store.observe(address, transaction):
+                if not self.dirty:
+                    self.dirty_since = time.monotonic()
+                self.dirty.add(address)
+        self.events += 1
+        if self.score_due():
+            self.score_dirty()
+        if self.events % self.evict_every == 0:
+            self.store.evict_idle()
+
+    def _forget(self, addresses):
+        for address in addresses:
+            self.dirty.discard(address)
+            self.flagged.discard(address)
+            self.scores.pop(address, None)
+
+    def score_dirty(self):
+        addresses = [address for address in self.dirty if address in self.store.windows]
+        self.dirty.clear()
+        if not addresses:
+            return
+        scores = self.pipeline.score(self.store.stats_matrix(addresses, self.stat_keys))
+        self.scored += len(addresses)
+        for address, score in zip(addresses, scores):
+            self.scores[address] = score
+            if score >= self.pipeline.threshold and address not in self.flagged:
+                # Alert once per crossing, not on every change while the address stays suspicious
+                self.flagged.add(address)
+                alert = {'address': address, 'score': float(score), 'timestamp': self.store.clock}
+                self.alerts.append(alert)
+                self.alert_count += 1
+                if self.on_alert is not None:
+                    self.on_alert(alert)
+            elif score < self.pipeline.threshold:
+                self.flagged.discard(address)
+
+    def _report(self, start):
+        elapsed = time.perf_counter() - start
+        return {
+            'events': self.events,
+            'seconds': elapsed,
+            'events_per_second': self.events / elapsed if elapsed else float('nan'),
+            'scored': self.scored,
+            'alerts': self.alert_count,
+            'tracked_addresses': len(self.store),
+            'evicted_addresses': self.store.evicted,
+            'state_bytes': self.store.nbytes(),
+        }
+
+    def run(self, transactions, max_events=None):
+        start = time.perf_counter()
+        for transaction in transactions:
+            if transaction is None:
+                # A feed heartbeat: nothing arrived, but pending changes may be overdue
+                if self.score_due():
+                    self.score_dirty()
+                continue
+            self.process(transaction)
+            if self.events % self.report_every == 0:
+                report = self._report(start)
+                print(f"{report['events']} events, {report['events_per_second']:.0f} events/s, "
+                      f"{report['tracked_addresses']} addresses, {report['alerts']} alerts")
+            if max_events is not None and self.events >= max_events:
+                break
+        self.score_dirty()
+        report = self._report(start)
+        print(f"Processed {report['events']} events in {report['seconds']:.2f}s "
+              f"({report['events_per_second']:.0f} events/s), {report['alerts']} alerts, "
+              f"{report['tracked_addresses']} addresses tracked, {report['evicted_addresses']} evicted.")
+        return report
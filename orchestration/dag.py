@@ -0,0 +1,246 @@
+import hashlib
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import joblib
+from instrumentation.metrics import metrics
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ArtifactHasher:
+    def __init__(self, memo=None):
+        # Content hashes are memoised by (size, mtime_ns), so unchanged multi-GB CSVs are read once
+        self.memo = memo if memo is not None else {}
+        self.lock = threading.Lock()
+
+    def _file_hash(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        with self.lock:
+            cached = self.memo.get(key)
+        if cached is not None and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as artifact:
+            for block in iter(lambda: artifact.read(1 << 20), b''):
+                digest.update(block)
+        with self.lock:
+            self.memo[key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def hash(self, path):
+        if os.path.isfile(path):
+            return self._file_hash(path)
+        if os.path.isdir(path):
+            digest = hashlib.sha256()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    file_path = os.path.join(root, name)
+                    digest.update(os.path.relpath(file_path, path).encode())
+                    digest.update(self._file_hash(file_path).encode())
+            return digest.hexdigest()
+        return None
+
+
+def source_files(objects):
+    # The modules defining the given classes, functions or modules, plus every project module they
+    # import (directly or through a name they import), so an edit anywhere down the call chain counts
+    files, seen, stack = set(), set(), [obj if inspect.ismodule(obj) else sys.modules[obj.__module__]
+                                        for obj in objects]
+    while stack:
+        module = stack.pop()
+        if module.__name__ in seen:
+            continue
+        seen.add(module.__name__)
+        path = getattr(module, '__file__', None)
+        if path is None or not os.path.abspath(path).startswith(PROJECT_ROOT + os.sep):
+            continue
+        files.add(os.path.abspath(path))
+        for value in list(vars(module).values()):
+            name = value.__name__ if inspect.ismodule(value) else getattr(value, '__module__', None)
+            if isinstance(name, str) and name in sys.modules:
+                stack.append(sys.modules[name])
+    return sorted(files)
+
+
+class Stage:
+    def __init__(self, name, func, inputs=(), outputs=(), params=None, exclusive=False, code=()):
+        self.name = name
+        self.func = func
+        # Classes, functions or modules the stage runs; their source files are part of the fingerprint
+        self.code = list(code)
+        self.inputs = [os.path.normpath(path) for path in inputs]
+        self.outputs = [os.path.normpath(path) for path in outputs]
+        self.params = params
+        # Exclusive stages never overlap each other (e.g. anything drawing with pyplot, which is not thread-safe)
+        self.exclusive = exclusive
+
+    def fingerprint(self, hasher):
+        # A stage is identified by its code, its parameters and the content of every input
+        inputs = {path: hasher.hash(path) for path in self.inputs}
+        missing = [path for path, digest in inputs.items() if digest is None]
+        if missing:
+            raise FileNotFoundError(f"Stage {self.name} is missing inputs: {missing}")
+        code = [(os.path.relpath(path, PROJECT_ROOT), hasher.hash(path)) for path in source_files(self.code)]
+        return joblib.hash((inspect.getsource(self.func), code, self.params, sorted(inputs.items())))
+
+
+class StageGraph:
+    def __init__(self, stages, state_path):
+        self.stages = {}
+        producers = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage {stage.name}")
+            self.stages[stage.name] = stage
+            for path in stage.outputs:
+                if path in producers:
+                    raise ValueError(f"{path} is produced by both {producers[path]} and {stage.name}")
+                producers[path] = stage.name
+        # Edges come from artifacts: a stage depends on whichever stage produces one of its inputs
+        self.dependencies = {stage.name: sorted({producers[path] for path in stage.inputs if path in producers})
+                             for stage in stages}
+        self.order = self._topological_order()
+        self.state_path = state_path
+        self.state = self._load_state()
+        self.hasher = ArtifactHasher(self.state.setdefault('hashes', {}))
+        self._state_lock = threading.Lock()
+        self._exclusive_lock = threading.Lock()
+
+    def _topological_order(self):
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle through stage {name}")
+            visiting.add(name)
+            for dependency in self.dependencies[name]:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as state_file:
+                return json.load(state_file)
+        return {'stages': {}, 'hashes': {}}
+
+    def _save_state(self):
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.hasher.lock:
+            text = json.dumps(self.state, indent=2)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as state_file:
+            state_file.write(text)
+        os.replace(tmp_path, self.state_path)
+
+    def select(self, targets=None):
+        # The targets plus everything upstream of them, in run order
+        if not targets:
+            return list(self.order)
+        unknown = set(targets) - set(self.stages)
+        if unknown:
+            raise ValueError(f"Unknown stages: {sorted(unknown)}")
+        needed, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.dependencies[name])
+        return [name for name in self.order if name in needed]
+
+    def _up_to_date(self, stage, fingerprint):
+        record = self.state['stages'].get(stage.name)
+        if record is None or record['fingerprint'] != fingerprint:
+            return False
+        # Outputs that were deleted or edited since the last run make the stage stale too
+        return all(self.hasher.hash(path) == record['outputs'].get(path) for path in stage.outputs)
+
+    def plan(self, targets=None, force=()):
+        # Dry run: stages downstream of a stale stage cannot be fingerprinted until it has run
+        status = {}
+        for name in self.select(targets):
+            stage = self.stages[name]
+            if any(status[dependency] != 'up to date' for dependency in self.dependencies[name]):
+                status[name] = 'waits on upstream'
+            elif name in force or 'all' in force:
+                status[name] = 'forced'
+            else:
+                try:
+                    fingerprint = stage.fingerprint(self.hasher)
+                except FileNotFoundError:
+                    status[name] = 'missing inputs'
+                    continue
+                status[name] = 'up to date' if self._up_to_date(stage, fingerprint) else 'stale'
+        return status
+
+    def _run_stage(self, stage, forced):
+        fingerprint = stage.fingerprint(self.hasher)
+        if not forced and self._up_to_date(stage, fingerprint):
+            print(f"[{stage.name}] up to date")
+            metrics.inc('pipeline_stages_total', labels={'stage': stage.name, 'status': 'skipped'})
+            return 'skipped'
+        print(f"[{stage.name}] running")
+        start = time.perf_counter()
+        if stage.exclusive:
+            with self._exclusive_lock:
+                stage.func()
+        else:
+            stage.func()
+        outputs = {path: self.hasher.hash(path) for path in stage.outputs}
+        missing = [path for path, digest in outputs.items() if digest is None]
+        if missing:
+            raise RuntimeError(f"Stage {stage.name} did not produce {missing}")
+        with self._state_lock:
+            self.state['stages'][stage.name] = {'fingerprint': fingerprint, 'outputs': outputs,
+                                                'seconds': time.perf_counter() - start,
+                                                'finished': time.strftime('%Y-%m-%dT%H:%M:%S')}
+            self._save_state()
+        print(f"[{stage.name}] finished in {time.perf_counter() - start:.1f}s")
+        metrics.inc('pipeline_stages_total', labels={'stage': stage.name, 'status': 'ran'})
+        return 'ran'
+
+    def run(self, targets=None, force=(), max_parallel=2):
+        # Every stage whose dependencies are done is submitted at once, so independent branches
+        # run side by side; a stage is skipped when its fingerprint and outputs match the last run
+        selected = self.select(targets)
+        pending = list(selected)
+        results, running, failure = {}, {}, None
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            while pending or running:
+                if failure is None:
+                    for name in [name for name in pending
+                                 if all(dependency in results for dependency in self.dependencies[name])]:
+                        pending.remove(name)
+                        forced = name in force or 'all' in force
+                        running[executor.submit(self._run_stage, self.stages[name], forced)] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as error:
+                        print(f"[{name}] failed: {error}")
+                        failure = failure or error
+        if failure is not None:
+            raise failure
+        with self._state_lock:
+            self._save_state()
+        return results
@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import matplotlib
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from sklearn.ensemble import (
+    RandomForestClassifier,
+    GradientBoostingClassifier,
+    AdaBoostClassifier,
+    ExtraTreesClassifier,
+)
+from sklearn.svm import SVC
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.neural_network import MLPClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import GaussianNB
+from sklearn.tree import DecisionTreeClassifier
+from data_collection_and_processing.mining_data import EthereumTransactionAnalyzer
+from data_collection_and_processing.combining_data import DataCombiner
+from data_collection_and_processing.exploratory_data_analysis import DataAnalyzer
+from data_collection_and_processing.feature_selection import FeatureSelector
+from data_collection_and_processing.dataset_store import DatasetStore
+from data_collection_and_processing.address_index import AddressIndex
+from data_collection_and_processing.transaction_graph import GRAPH_COLUMNS, graph_coverage
+from modeling.base_model_allfeatures import AllFeaturesBaseModel
+from modeling.base_model_extractedfeatures import ExtractedFeaturesBaseModel
+from modeling.tuned_model_allfeatures import TunedModel
+from modeling.evaluation import AUPRCPlotter
+from modeling.fit_cache import FitCache
+from modeling.model_evaluator import PreparedSplits
+from modeling.oof_evaluation import OutOfFoldStore
+from modeling.scoring_pipeline import ScoringPipeline
+from modeling.neighbor_index import NeighborIndex
+from modeling.ensemble_export import is_exportable, export_scoring_pipeline
+from orchestration.dag import Stage, StageGraph
+from instrumentation.metrics import metrics
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data')
+# Largest gap between the classes' shares of rows in the transaction graph before evaluation refuses to run
+MAX_GRAPH_COVERAGE_GAP = 0.2
+
+
+def default_models():
+    # Models with hyperparameter grids
+    return {
+        'RandomForest': (RandomForestClassifier(random_state=42), {'n_estimators': [50, 100, 200], 'max_depth': [None, 10, 20]}),
+        'SVM': (SVC(random_state=42), {'C': [1, 10, 100], 'kernel': ['linear', 'rbf'], 'gamma': ['scale', 'auto']}),
+        'KNeighbors': (KNeighborsClassifier(), {'n_neighbors': [3, 5, 7], 'weights': ['uniform', 'distance']}),
+        'MLP': (MLPClassifier(random_state=42), {'hidden_layer_sizes': [(100,), (50, 50), (30, 30, 30)], 'alpha': [0.0001, 0.001, 0.01]}),
+        'LogisticRegression': (LogisticRegression(random_state=42), {'C': [0.1, 1, 10], 'penalty': ['l1', 'l2']}),
+        'GradientBoosting': (GradientBoostingClassifier(random_state=42), {'n_estimators': [50, 100, 200], 'max_depth': [3, 5, 7]}),
+        'GaussianNB': (GaussianNB(), {}),
+        'DecisionTree': (DecisionTreeClassifier(random_state=42), {'max_depth': [None, 10, 20], 'min_samples_split': [2, 5, 10]}),
+        'AdaBoost': (AdaBoostClassifier(random_state=42), {'n_estimators': [50, 100, 200], 'learning_rate': [0.1, 0.5, 1.0]}),
+        'ExtraTrees': (ExtraTreesClassifier(random_state=42), {'n_estimators': [50, 100, 200], 'max_depth': [None, 10, 20]}),
+    }
+
+
+class EthereumPipeline:
+    def __init__(self, data_dir=DEFAULT_DATA_DIR, work_dir=None, models=None, api_key=None, max_parallel=2,
+                 n_jobs=None, embedding='tsne', feature_mode='stability', top_n='auto', graph_features=False,
+                 allow_graph_coverage_gap=False):
+        self.data_dir = data_dir
+        # Reports, figures, scores, metrics and the stage state go under work_dir. data_dir holds the source
+        # CSVs and the derived data other runs and the serving tools reuse: the mined and combined CSVs,
+        # edges, columnar copies, fit/feature/Etherscan caches, the OOF store and the model artifacts
+        self.work_dir = work_dir or os.path.join(data_dir, 'pipeline')
+        self.models = models or default_models()
+        self.api_key = api_key or os.environ.get('ETHERSCAN_API_KEY')
+        self.max_parallel = max_parallel
+        # Parallel branches split the cores instead of each claiming all of them
+        self.n_jobs = n_jobs or max(1, (os.cpu_count() or 1) // max_parallel)
+        self.embedding = embedding
+        self.feature_mode = feature_mode
+        self.top_n = top_n
+        # Mining collects counterparty edges and combining joins the transaction-graph columns
+        self.graph_features = graph_features
+        # Evaluating graph columns whose coverage follows the label is an explicit choice, not a warning
+        self.allow_graph_coverage_gap = allow_graph_coverage_gap
+        self.dataset_store = DatasetStore(os.path.join(data_dir, 'columnar'))
+        self.fit_cache = FitCache(os.path.join(data_dir, 'fit_cache'))
+        # The all-features and tuned evaluations share one scaled split; selected features add a second
+        self.prepared_splits = PreparedSplits(max_entries=2)
+        self._frame_lock = threading.Lock()
+        self._frame = None
+        self._addresses = None
+
+    def data(self, name):
+        return os.path.join(self.data_dir, name)
+
+    def work(self, *names):
+        return os.path.join(self.work_dir, *names)
+
+    def _combined_frame(self):
+        # Loaded once and shared by the evaluation branches running side by side
+        with self._frame_lock:
+            if self._frame is None:
+                frame = self.dataset_store.load_compatible(self.data('address_data_combined.csv'))
+                if self.graph_features:
+                    self._check_graph_coverage(frame)
+                self._addresses = frame['Address']
+                self._frame = frame.drop(['Address'], axis=1)
+            return self._frame
+
+    def _split(self, addresses):
+        # With graph features, every evaluator tests on the rows combining held out of the flagged-neighbour
+        # fraction; they are matched by address, so the split never depends on row order
+        if not self.graph_features:
+            return None
+        held_out = pd.read_csv(self.data('address_data_holdout.csv'))['Address'].to_numpy()
+        test = AddressIndex(held_out).lookup(np.asarray(addresses)) >= 0
+        return np.flatnonzero(~test), np.flatnonzero(test)
+
+    def _check_graph_coverage(self, frame):
+        coverage = graph_coverage(frame)
+        if max(coverage.values()) - min(coverage.values()) > MAX_GRAPH_COVERAGE_GAP:
+            shares = ', '.join(f"FLAG={label}: {share:.0%}" for label, share in sorted(coverage.items()))
+            message = (f"the classes are not equally covered by the transaction graph ({shares} of rows have "
+                       f"edges), so the graph columns partly encode which source a row came from and the "
+                       f"evaluation scores overstate them")
+            if not self.allow_graph_coverage_gap:
+                raise ValueError(f"Graph features refused: {message}. Collect edges for both classes, or pass "
+                                 f"allow_graph_coverage_gap=True (--allow-graph-coverage-gap) to evaluate anyway")
+            print(f"Warning: {message}; validate on independently labelled data")
+        return coverage
+
+    def eda(self):
+        # The Kaggle file's two row counters say nothing about an address, so they are not read
+        kaggle = self.data('address_data_kaggle.csv')
+        columns = [column for column in pd.read_csv(kaggle, nrows=0).columns if column not in ('Unnamed: 0', 'Index')]
+        analyzer = DataAnalyzer(kaggle, dataset_store=self.dataset_store, output_dir=self.work('eda'), columns=columns)
+        analyzer.execute_headless(embedding=self.embedding)
+
+    def mine(self):
+        output_path = self.data('address_data_ethereum.csv')
+        edge_dir = self.data('edges') if self.graph_features else None
+        if not self.api_key:
+            if edge_dir is not None and not os.path.isdir(edge_dir):
+                raise ValueError("Graph features need the edges of a mining run with ETHERSCAN_API_KEY set")
+            if os.path.exists(output_path):
+                print(f"No ETHERSCAN_API_KEY set; using the existing {output_path}")
+                return
+            raise ValueError("Mining needs ETHERSCAN_API_KEY (or api_key=)")
+        analyzer = EthereumTransactionAnalyzer(self.api_key, self.data('addresses_mined_not_in_kaggle.csv'),
+                                               output_path, cache_dir=self.data('etherscan_cache'), edge_dir=edge_dir)
+        analyzer.process_addresses(concurrent=True, max_workers=8, calls_per_second=5, resume=True)
+
+    def combine(self):
+        combiner = DataCombiner(self.data('address_data_ethereum.csv'), self.data('address_data_kaggle.csv'),
+                                self.data('address_data_combined.csv'), dataset_store=self.dataset_store,
+                                edge_dir=self.data('edges') if self.graph_features else None,
+                                holdout_path=self.data('address_data_holdout.csv') if self.graph_features else None)
+        combiner.execute()
+
+    def select_features(self):
+        feature_selector = FeatureSelector(self._combined_frame(), mode=self.feature_mode, n_jobs=self.n_jobs,
+                                           cache_dir=self.data('feature_cache'))
+        feature_selector.fit_model()
+        feature_selector.get_feature_importances().to_csv(self.work('feature_importances.csv'), index=False)
+        feature_selector.select_top_features(top_n=self.top_n)
+        with open(self.work('selected_features.json'), 'w') as features_file:
+            json.dump(list(feature_selector.selected_features), features_file, indent=2)
+
+    def evaluate_all_features(self):
+        frame = self._combined_frame()
+        model_evaluator = AllFeaturesBaseModel(models=self.models, features=frame, target='FLAG',
+                                               n_jobs=self.n_jobs, fit_cache=self.fit_cache,
+                                               prepared_splits=self.prepared_splits, split=self._split(self._addresses))
+        model_evaluator.evaluate_models().to_csv(self.work('results_all_features.csv'), index=False)
+
+    def evaluate_selected_features(self):
+        with open(self.work('selected_features.json')) as features_file:
+            selected_features = json.load(features_file)
+        # Only the selected columns of the memory-mapped combined data are read
+        selected_df = self.dataset_store.load_compatible(self.data('address_data_combined.csv'),
+                                                         columns=['Address', 'FLAG'] + selected_features)
+        split = self._split(selected_df.pop('Address'))
+        model_evaluator = ExtractedFeaturesBaseModel(models=self.models, features=selected_df, target='FLAG',
+                                                     n_jobs=self.n_jobs, fit_cache=self.fit_cache,
+                                                     prepared_splits=self.prepared_splits, split=split)
+        model_evaluator.evaluate_models().to_csv(self.work('results_selected_features.csv'), index=False)
+
+    def evaluate_tuned(self):
+        frame = self._combined_frame()
+        model_evaluator = TunedModel(models=self.models, features=frame, target='FLAG',
+                                     hyperparameter_tuning=True, n_jobs=self.n_jobs, fit_cache=self.fit_cache,
+                                     prepared_splits=self.prepared_splits, split=self._split(self._addresses))
+        model_evaluator.evaluate_models().to_csv(self.work('results_tuned.csv'), index=False)
+        auprc_plotter = AUPRCPlotter(model_evaluator, output_dir=self.work('plots'))
+        auprc_plotter.plot_auprc()
+        oof_store = OutOfFoldStore.from_evaluator(model_evaluator, self.data('oof_store'), n_jobs=self.n_jobs)
+        auprc_plotter.plot_oof_auprc(oof_store).to_csv(self.work('oof_summary.csv'), index=False)
+        scoring_pipeline = ScoringPipeline.from_evaluator(model_evaluator)
+        scoring_pipeline.save(self.data(os.path.join('models', 'scoring_pipeline.joblib')))
+        # Tree ensembles are also compiled for the numpy-only runtime; other models have no compiled form
+        compiled_artifact = self.data(os.path.join('models', 'scoring_ensemble.npz'))
+        if is_exportable(scoring_pipeline.model):
+            export_scoring_pipeline(scoring_pipeline, compiled_artifact)
+        else:
+            print(f"{scoring_pipeline.model_name} is not a tree ensemble; no compiled artifact written")
+            if os.path.exists(compiled_artifact):
+                os.remove(compiled_artifact)
+        # Built once over the same scaled training split, for KNN scoring and similar-fraud lookups
+        neighbor_index = NeighborIndex.from_evaluator(model_evaluator, ids=self._addresses)
+        neighbor_index.save(self.data(os.path.join('models', 'neighbor_index.joblib')))
+        neighbor_index.benchmark(model_evaluator.X_test)
+
+    def score(self):
+        scoring_pipeline = ScoringPipeline.load(self.data(os.path.join('models', 'scoring_pipeline.joblib')))
+        if not self.graph_features:
+            scoring_pipeline.score_csv(self.data('address_data_ethereum.csv'), self.work('scores.csv'),
+                                       dataset_store=self.dataset_store)
+            return
+        # Graph columns depend on the whole labelled graph, so they are looked up in the combined data
+        mined_path = self.data('address_data_ethereum.csv')
+        mined = self.dataset_store.load_compatible(
+            mined_path, columns=[column for column in pd.read_csv(mined_path, nrows=0).columns
+                                 if column == 'Address' or column in scoring_pipeline.feature_columns])
+        combined = self.dataset_store.load_compatible(self.data('address_data_combined.csv'),
+                                                      columns=['Address'] + GRAPH_COLUMNS)
+        rows = AddressIndex(combined['Address'].to_numpy()).lookup(mined['Address'].to_numpy())
+        for column in GRAPH_COLUMNS:
+            mined[column] = np.where(rows >= 0, combined[column].to_numpy()[rows], 0.0)
+        scoring_pipeline.score_frame(mined).to_csv(self.work('scores.csv'), index=False)
+
+    def stages(self):
+        kaggle = self.data('address_data_kaggle.csv')
+        mined = self.data('address_data_ethereum.csv')
+        combined = self.data('address_data_combined.csv')
+        selected = self.work('selected_features.json')
+        scoring_artifact = self.data(os.path.join('models', 'scoring_pipeline.joblib'))
+        neighbor_artifact = self.data(os.path.join('models', 'neighbor_index.joblib'))
+        edges = [self.data('edges')] if self.graph_features else []
+        holdout = [self.data('address_data_holdout.csv')] if self.graph_features else []
+        # Estimators hash by class and parameters, so editing a grid reruns only the evaluations; code= names
+        # what each stage runs, and the source of those modules and the project modules they import is hashed
+        models = self.models
+        return [
+            Stage('eda', self.eda, inputs=[kaggle],
+                  outputs=[self.work('eda', 'summary.json'), self.work('eda', 'correlation.csv')],
+                  params=self.embedding, exclusive=True, code=[DataAnalyzer]),
+            # Without a key mining keeps the existing file, so the key's presence is part of the fingerprint:
+            # the first run with a key mines instead of finding the stage up to date
+            Stage('mine', self.mine, inputs=[self.data('addresses_mined_not_in_kaggle.csv')], outputs=[mined] + edges,
+                  params=bool(self.api_key), code=[EthereumTransactionAnalyzer]),
+            Stage('combine', self.combine, inputs=[mined, kaggle] + edges, outputs=[combined] + holdout,
+                  code=[DataCombiner]),
+            Stage('select_features', self.select_features, inputs=[combined],
+                  outputs=[selected, self.work('feature_importances.csv')], params=(self.feature_mode, self.top_n),
+                  code=[FeatureSelector, DatasetStore]),
+            Stage('evaluate_all_features', self.evaluate_all_features, inputs=[combined] + holdout,
+                  outputs=[self.work('results_all_features.csv')], params=models,
+                  code=[AllFeaturesBaseModel, DatasetStore]),
+            Stage('evaluate_selected_features', self.evaluate_selected_features, inputs=[combined, selected] + holdout,
+                  outputs=[self.work('results_selected_features.csv')], params=models,
+                  code=[ExtractedFeaturesBaseModel, DatasetStore]),
+            Stage('evaluate_tuned', self.evaluate_tuned, inputs=[combined] + holdout,
+                  outputs=[self.work('results_tuned.csv'), self.work('oof_summary.csv'), scoring_artifact,
+                           neighbor_artifact],
+                  params=models, exclusive=True,
+                  code=[TunedModel, AUPRCPlotter, OutOfFoldStore, ScoringPipeline, NeighborIndex,
+                        export_scoring_pipeline, DatasetStore]),
+            Stage('score', self.score, inputs=[scoring_artifact, mined] + ([combined] if edges else []),
+                  outputs=[self.work('scores.csv')], code=[ScoringPipeline, AddressIndex]),
+        ]
+
+    def graph(self):
+        os.makedirs(self.work_dir, exist_ok=True)
+        return StageGraph(self.stages(), self.work('pipeline_state.json'))
+
+    def run(self, targets=None, force=(), dry_run=False):
+        graph = self.graph()
+        if dry_run:
+            status = graph.plan(targets, force)
+            for name, state in status.items():
+                print(f"{name}: {state}")
+            return status
+        try:
+            return graph.run(targets, force, self.max_parallel)
+        finally:
+            metrics.write(self.work('metrics.json'))
+            metrics.write(self.work('metrics.prom'))
+
+
+def run_pipeline(data_dir=DEFAULT_DATA_DIR, targets=None, force=(), dry_run=False, profile=None, **kwargs):
+    # Figures are written to files, so no stage ever blocks on a window
+    matplotlib.use('Agg')
+    load_dotenv()
+    pipeline = EthereumPipeline(data_dir, **kwargs)
+    metrics.configure(profile=profile, profile_dir=pipeline.work('profiles'))
+    return pipeline.run(targets, force, dry_run)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the pipeline stages whose inputs changed')
+    parser.add_argument('targets', nargs='*', help='stages to bring up to date (default: all)')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--work-dir', default=None)
+    parser.add_argument('--force', nargs='+', default=[], help="stages to rerun regardless, or 'all'")
+    parser.add_argument('--max-parallel', '-j', type=int, default=2)
+    parser.add_argument('--n-jobs', type=int, default=None)
+    parser.add_argument('--embedding', choices=['tsne', 'pca'], default='tsne')
+    parser.add_argument('--profile', nargs='+', default=[], help='stage:cprofile or stage:sample')
+    parser.add_argument('--graph-features', action='store_true',
+                        help='collect counterparty edges while mining and join graph columns when combining')
+    parser.add_argument('--allow-graph-coverage-gap', action='store_true',
+                        help='evaluate graph columns even when their coverage differs between the classes')
+    parser.add_argument('--dry-run', action='store_true', help='print which stages are up to date and exit')
+    args = parser.parse_args(argv)
+
+    profile = dict(entry.partition(':')[::2] for entry in args.profile)
+    run_pipeline(args.data_dir, args.targets, args.force, args.dry_run,
+                 profile={stage: mode or 'cprofile' for stage, mode in profile.items()},
+                 work_dir=args.work_dir, max_parallel=args.max_parallel, n_jobs=args.n_jobs,
+                 embedding=args.embedding, graph_features=args.graph_features,
+                 allow_graph_coverage_gap=args.allow_graph_coverage_gap)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
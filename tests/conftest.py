@@ -0,0 +1,86 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+
+MAX_WINDOW_RESULTS = 10000
+
+
+def transaction(index, sender, receiver, block=100, value=None):
+    # One txlist entry; the hash is unique per index
+    return {'blockNumber': str(block), 'timeStamp': str(1500000000 + 60 * index), 'hash': f"0x{index:064x}",
+            'from': sender, 'to': receiver, 'value': str(10 ** 18 * (index + 1) if value is None else value),
+            'contractAddress': '', 'isError': '0'}
+
+
+class StubEtherscan:
+    # Local stand-in for the Etherscan txlist endpoint. `transactions[address]` is served with the
+    # startblock/endblock/page/offset semantics of the real API; `replies[address]` holds scripted
+    # (status, body, headers) answers served first, one per request, e.g. a 429 before the real list.
+    def __init__(self):
+        self.transactions = {}
+        self.replies = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body, headers = stub.answer({name: values[0] for name, values in
+                                                     parse_qs(urlparse(self.path).query).items()})
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}/api"
+
+    def requests_for(self, address):
+        return [query for query in self.requests if query['address'] == address]
+
+    def answer(self, query):
+        address = query['address']
+        with self.lock:
+            self.requests.append(query)
+            scripted = self.replies.get(address)
+            if scripted:
+                reply = scripted.pop(0)
+                return reply if len(reply) == 3 else reply + ({},)
+        start_block, end_block = int(query['startblock']), int(query['endblock'])
+        page, offset = int(query['page']), int(query['offset'])
+        rows = [tx for tx in self.transactions.get(address, [])
+                if start_block <= int(tx['blockNumber']) <= end_block]
+        if offset:
+            if page * offset > MAX_WINDOW_RESULTS:
+                return 200, {'status': '0', 'message': 'NOTOK',
+                             'result': 'Result window is too large, PageNo x Offset size must be less than or '
+                                       'equal to 10000'}, {}
+            rows = rows[(page - 1) * offset:page * offset]
+        if not rows:
+            return 200, {'status': '0', 'message': 'No transactions found', 'result': []}, {}
+        return 200, {'status': '1', 'message': 'OK', 'result': rows}, {}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def etherscan_stub():
+    stub = StubEtherscan()
+    yield stub
+    stub.close()
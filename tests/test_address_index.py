@@ -0,0 +1,26 @@
+import pandas as pd
+from data_collection_and_processing.address_index import AddressIndex, main
+
+
+def address(index):
+    return f"0x{index:040x}"
+
+
+def test_cli_writes_new_addresses_once(tmp_path):
+    checksummed = '0x' + 'AB' * 20
+    candidates = [address(1), address(2), checksummed, address(2), address(3), address(4)]
+    pd.DataFrame({'Address': candidates}).to_csv(tmp_path / 'candidates.csv', index=False)
+    pd.DataFrame({'Address': [address(1)], 'FLAG': [0]}).to_csv(tmp_path / 'kaggle.csv', index=False)
+    # Known in another letter case, so not new
+    pd.DataFrame({'Address': [checksummed.lower(), address(4)]}).to_csv(tmp_path / 'mined.csv', index=False)
+    output = tmp_path / 'new.csv'
+    assert main([str(tmp_path / 'candidates.csv'), str(tmp_path / 'kaggle.csv'), str(tmp_path / 'mined.csv'),
+                 '-o', str(output)]) == 0
+    assert pd.read_csv(output)['Address'].tolist() == [address(2), address(3)]
+
+
+def test_lookup_is_case_insensitive_and_keeps_first_rows():
+    index = AddressIndex([address(5), address(3), address(5).upper().replace('0X', '0x'), 'not an address'])
+    assert not index.is_unique
+    assert index.first_rows().tolist() == [0, 1, 3]
+    assert index.lookup([address(5), address(9), 'NOT AN ADDRESS']).tolist() == [0, -1, 3]
@@ -0,0 +1,39 @@
+import pandas as pd
+from data_collection_and_processing.combining_data import DataCombiner
+from data_collection_and_processing.synthetic_data import SyntheticTransactionGenerator
+
+
+def test_chunked_merge_reports_input_duplicates_and_checks_the_output(tmp_path):
+    mined_path, kaggle_path = str(tmp_path / 'mined.csv'), str(tmp_path / 'kaggle.csv')
+    # No shared addresses, so the column-wise execute() merge has nothing to keep apart either
+    SyntheticTransactionGenerator(400, block_size=400).write_datasets(mined_path, kaggle_path, overlap=0)
+    # The shipped Kaggle file repeats addresses; repeat some here too
+    kaggle = pd.read_csv(kaggle_path)
+    pd.concat([kaggle, kaggle.iloc[:7]], ignore_index=True).to_csv(kaggle_path, index=False)
+
+    chunked = DataCombiner(mined_path, kaggle_path, str(tmp_path / 'chunked.csv'))
+    in_memory = DataCombiner(mined_path, kaggle_path, str(tmp_path / 'combined.csv'))
+    assert chunked.execute_chunked(partitions=4, work_dir=str(tmp_path))
+    assert in_memory.execute()
+    assert chunked.merge_report['duplicates_right'] == 7
+    assert chunked.merge_report['duplicates_left'] == 0
+    assert chunked.merge_report['duplicates_out'] == 0
+    assert chunked.merge_report['rows_out'] == len(pd.read_csv(tmp_path / 'combined.csv'))
+
+
+def test_both_merges_join_addresses_case_insensitively(tmp_path):
+    mined_path, kaggle_path = str(tmp_path / 'mined.csv'), str(tmp_path / 'kaggle.csv')
+    SyntheticTransactionGenerator(400, block_size=400).write_datasets(mined_path, kaggle_path, overlap=0.2)
+    # Shared accounts whose Kaggle copy is checksummed-style, as in the shipped data
+    kaggle = pd.read_csv(kaggle_path)
+    shared = kaggle['Address'].isin(pd.read_csv(mined_path)['Address'])
+    assert shared.sum() > 10
+    kaggle.loc[shared, 'Address'] = '0x' + kaggle.loc[shared, 'Address'].str[2:].str.upper()
+    kaggle.to_csv(kaggle_path, index=False)
+
+    assert DataCombiner(mined_path, kaggle_path, str(tmp_path / 'chunked.csv')).execute_chunked(
+        partitions=4, work_dir=str(tmp_path))
+    assert DataCombiner(mined_path, kaggle_path, str(tmp_path / 'combined.csv')).execute()
+    chunked = pd.read_csv(tmp_path / 'chunked.csv').sort_values('Address', ignore_index=True)
+    combined = pd.read_csv(tmp_path / 'combined.csv').sort_values('Address', ignore_index=True)
+    pd.testing.assert_frame_equal(combined, chunked)
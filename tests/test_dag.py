@@ -0,0 +1,58 @@
+import os
+import sys
+from orchestration.dag import PROJECT_ROOT, ArtifactHasher, Stage, source_files
+
+
+def write_module(tmp_path, name, text):
+    path = tmp_path / f"{name}.py"
+    path.write_text(text)
+    return path
+
+
+def project_files(objects):
+    return {os.path.relpath(path, PROJECT_ROOT) for path in source_files(objects)}
+
+
+def test_source_files_follow_project_imports():
+    from data_collection_and_processing.combining_data import DataCombiner
+    from modeling.evaluation import AUPRCPlotter
+    combine = project_files([DataCombiner])
+    assert os.path.join('data_collection_and_processing', 'transaction_graph.py') in combine
+    assert os.path.join('instrumentation', 'metrics.py') in combine
+    # Library modules (pandas, sklearn) are left to --force
+    assert not any(name.startswith('..') for name in combine)
+    assert os.path.join('instrumentation', 'figures.py') in project_files([AUPRCPlotter])
+
+
+def test_fingerprint_changes_when_imported_code_changes(tmp_path, monkeypatch):
+    import orchestration.dag as dag
+    monkeypatch.setattr(dag, 'PROJECT_ROOT', str(tmp_path))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    helper = write_module(tmp_path, 'dag_helper', "def scale(value):\n    return value * 2\n")
+    write_module(tmp_path, 'dag_entry', "from dag_helper import scale\n\nclass Entry:\n    pass\n")
+    import dag_entry
+    try:
+        data = tmp_path / 'input.csv'
+        data.write_text('a\n1\n')
+        stage = Stage('entry', lambda: None, inputs=[str(data)], code=[dag_entry.Entry])
+        before = stage.fingerprint(ArtifactHasher())
+        assert stage.fingerprint(ArtifactHasher()) == before
+        helper.write_text("def scale(value):\n    return value * 3\n")
+        assert stage.fingerprint(ArtifactHasher()) != before
+    finally:
+        sys.modules.pop('dag_entry', None)
+        sys.modules.pop('dag_helper', None)
+
+
+def test_mining_without_a_key_is_not_fingerprinted_as_a_real_run(tmp_path, monkeypatch):
+    from orchestration.pipeline import EthereumPipeline
+    monkeypatch.delenv('ETHERSCAN_API_KEY', raising=False)
+    (tmp_path / 'addresses_mined_not_in_kaggle.csv').write_text('Address\n0x1\n')
+
+    def mine_fingerprint(api_key):
+        pipeline = EthereumPipeline(str(tmp_path), api_key=api_key)
+        stage = next(stage for stage in pipeline.stages() if stage.name == 'mine')
+        return stage.fingerprint(ArtifactHasher())
+
+    assert mine_fingerprint(None) != mine_fingerprint('key')
+    assert mine_fingerprint('key') == mine_fingerprint('other key')
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesClassifier, GradientBoostingClassifier, RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+from modeling.ensemble_export import export_ensemble
+from modeling.ensemble_runtime import CompiledEnsemble
+
+
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 6)) * [1, 10, 100, 1, 1, 0.1]
+    y = (X[:, 0] + X[:, 1] / 10 + rng.normal(scale=0.8, size=500) > 0.5).astype(int)
+    return X, y, StandardScaler().fit(X)
+
+
+@pytest.mark.parametrize('model', [
+    RandomForestClassifier(n_estimators=25, random_state=0),
+    ExtraTreesClassifier(n_estimators=25, random_state=0),
+    DecisionTreeClassifier(max_depth=6, random_state=0),
+    GradientBoostingClassifier(n_estimators=40, random_state=0),
+    GradientBoostingClassifier(n_estimators=20, init='zero', random_state=0),
+], ids=['random_forest', 'extra_trees', 'decision_tree', 'gradient_boosting', 'gradient_boosting_zero_init'])
+def test_compiled_ensemble_matches_predict_proba(model, tmp_path):
+    X, y, scaler = data()
+    model.fit(scaler.transform(X), y)
+    columns = [f"f{index}" for index in range(X.shape[1])]
+    ensemble = CompiledEnsemble.load(export_ensemble(model, scaler, columns, str(tmp_path / 'model.npz')))
+    queries = np.random.default_rng(1).normal(size=(300, 6)) * [1, 10, 100, 1, 1, 0.1]
+    expected = model.predict_proba(scaler.transform(queries))
+    assert np.allclose(ensemble.predict_proba(queries, chunk_size=64), expected, rtol=1e-12, atol=1e-15)
+
+
+def test_boosting_start_is_the_prior_log_odds(tmp_path):
+    X, y, scaler = data()
+    model = GradientBoostingClassifier(n_estimators=5, random_state=0).fit(scaler.transform(X), y)
+    ensemble = CompiledEnsemble.load(export_ensemble(model, scaler, list('abcdef'), str(tmp_path / 'gb.npz')))
+    assert ensemble.init_raw == pytest.approx(np.log(y.mean() / (1 - y.mean())), rel=1e-12)
+
+
+def test_class_counts_from_older_scikit_learn_are_normalised(tmp_path):
+    X, y, scaler = data()
+    model = DecisionTreeClassifier(max_depth=6, random_state=0).fit(scaler.transform(X), y)
+    expected = model.predict_proba(scaler.transform(X))
+    # Before scikit-learn 1.4, tree_.value held weighted class counts rather than fractions
+    model.tree_.value[:, 0, :] *= model.tree_.weighted_n_node_samples[:, None]
+    assert model.tree_.value.max() > 1
+    ensemble = CompiledEnsemble.load(export_ensemble(model, scaler, list('abcdef'), str(tmp_path / 'dt.npz')))
+    assert np.allclose(ensemble.predict_proba(X), expected, rtol=1e-12, atol=1e-15)
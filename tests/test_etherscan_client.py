@@ -0,0 +1,85 @@
+import random
+import time
+import pandas as pd
+from data_collection_and_processing.etherscan_client import EtherscanClient
+from data_collection_and_processing.mining_data import EthereumTransactionAnalyzer
+from conftest import transaction
+
+ADDRESS = '0x' + 'ab' * 20
+
+
+def txlist_url(stub, address):
+    return f"{stub.url}?module=account&action=txlist&address={address}&startblock=0&endblock=99999999" \
+           f"&page=1&offset=0&sort=asc&apikey=key"
+
+
+def test_retries_429_and_5xx_with_backoff(etherscan_stub):
+    etherscan_stub.transactions[ADDRESS] = [transaction(0, ADDRESS, '0x' + '01' * 20)]
+    etherscan_stub.replies[ADDRESS] = [(429, {}, {'Retry-After': '0'}), (503, {}), (502, {})]
+    client = EtherscanClient(calls_per_second=0, backoff_factor=0.01)
+    response = client.get(txlist_url(etherscan_stub, ADDRESS))
+    client.close()
+    assert response.status_code == 200
+    assert len(response.json()['result']) == 1
+    assert client.retry_count == 3
+    assert len(etherscan_stub.requests_for(ADDRESS)) == 4
+
+
+def test_retries_rate_limit_body(etherscan_stub):
+    etherscan_stub.replies[ADDRESS] = [(200, {'status': '0', 'message': 'NOTOK',
+                                              'result': 'Max rate limit reached'})]
+    client = EtherscanClient(calls_per_second=0, backoff_factor=0)
+    response = client.get(txlist_url(etherscan_stub, ADDRESS))
+    client.close()
+    assert response.json()['result'] == []
+    assert client.retry_count == 1
+
+
+def test_gives_up_after_max_retries(etherscan_stub):
+    etherscan_stub.replies[ADDRESS] = [(500, {})] * 5
+    client = EtherscanClient(calls_per_second=0, max_retries=2, backoff_factor=0)
+    response = client.get(txlist_url(etherscan_stub, ADDRESS))
+    client.close()
+    assert response.status_code == 500
+    assert len(etherscan_stub.requests_for(ADDRESS)) == 3
+
+
+def test_retry_count_is_exact_across_threads(etherscan_stub):
+    addresses = [f"0x{index:040x}" for index in range(64)]
+    for address in addresses:
+        etherscan_stub.replies[address] = [(429, {})]
+    client = EtherscanClient(calls_per_second=0, max_workers=8, backoff_factor=0)
+    statuses = list(client.map(lambda address: client.get(txlist_url(etherscan_stub, address)).status_code,
+                               addresses))
+    client.close()
+    assert statuses == [200] * len(addresses)
+    assert client.retry_count == len(addresses)
+
+
+def test_map_keeps_input_order():
+    client = EtherscanClient(calls_per_second=0, max_workers=8)
+    rng = random.Random(0)
+    delays = [rng.random() / 200 for _ in range(100)]
+
+    def work(index):
+        time.sleep(delays[index])
+        return index
+
+    assert list(client.map(work, range(100))) == list(range(100))
+    client.close()
+
+
+def test_concurrent_mining_against_stub(etherscan_stub, tmp_path):
+    addresses = [f"0x{index:040x}" for index in range(1, 21)]
+    for position, address in enumerate(addresses):
+        etherscan_stub.transactions[address] = [transaction(2 * position, address, '0x' + '01' * 20),
+                                                transaction(2 * position + 1, '0x' + '02' * 20, address)]
+        etherscan_stub.replies[address] = [(503, {})] if position % 3 == 0 else []
+    address_file = tmp_path / 'addresses.csv'
+    pd.DataFrame({'Address': addresses}).to_csv(address_file, index=False)
+    output_file = tmp_path / 'mined.csv'
+    analyzer = EthereumTransactionAnalyzer('key', str(address_file), str(output_file), base_url=etherscan_stub.url)
+    analyzer.process_addresses(concurrent=True, max_workers=4, calls_per_second=0, max_retries=2)
+    mined = pd.read_csv(output_file)
+    assert mined['Address'].tolist() == addresses
+    assert (mined['total_transactions'] == 2).all()
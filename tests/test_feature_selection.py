@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+from data_collection_and_processing.feature_selection import MODES, FeatureSelector
+
+
+def frame():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(300, 6)), columns=[f"noise_{index}" for index in range(6)])
+    # The signal columns come last, so an unsorted ranking would start with noise
+    df['weak'] = rng.normal(size=300)
+    df['strong'] = rng.normal(size=300)
+    df['FLAG'] = (2 * df['strong'] + df['weak'] + 0.3 * rng.normal(size=300) > 0.5).astype(int)
+    df['Address'] = [f"0x{index:040x}" for index in range(300)]
+    return df
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_every_mode_ranks_the_signal_first(mode, tmp_path):
+    selector = FeatureSelector(frame(), mode=mode, n_repeats=3, n_splits=3, n_estimators=20,
+                               cache_dir=str(tmp_path))
+    ranking = selector.get_feature_importances()
+    assert list(ranking['Feature'][:2]) == ['strong', 'weak']
+    assert set(ranking['Feature']) == set(frame().columns) - {'Address', 'FLAG'}
+    selector.select_top_features(top_n=2)
+    assert list(selector.get_selected_dataframe().columns) == ['FLAG', 'strong', 'weak']
+
+
+def test_auto_selection_sorts_a_ranking_it_was_not_given_sorted():
+    selector = FeatureSelector(frame(), mode='subsample', n_repeats=2, n_estimators=20)
+    selector.fit_model()
+    selector.select_top_features(top_n='auto', cv=3)
+    assert list(selector.selected_features)[0] == 'strong'
+    assert selector.top_n_curve['Top N'].tolist() == list(range(1, 9))
+    assert set(selector.selected_features) <= {'strong', 'weak'}
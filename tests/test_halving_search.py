@@ -0,0 +1,53 @@
+import time
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.datasets import make_classification
+from sklearn.dummy import DummyClassifier
+from sklearn.model_selection import GridSearchCV
+from sklearn.neighbors import KNeighborsClassifier
+from modeling.halving_search import BudgetedHalvingSearch
+
+GRID = {'n_neighbors': [1, 3, 5, 9, 15, 25, 45, 75, 125]}
+
+
+def data():
+    return make_classification(n_samples=900, n_features=8, n_informative=4, flip_y=0.05, random_state=0)
+
+
+class SlowClassifier(ClassifierMixin, BaseEstimator):
+    def __init__(self, delay=0.02, strategy='prior'):
+        self.delay = delay
+        self.strategy = strategy
+
+    def fit(self, X, y):
+        time.sleep(self.delay)
+        self.model_ = DummyClassifier(strategy=self.strategy).fit(X, y)
+        self.classes_ = self.model_.classes_
+        return self
+
+    def predict(self, X):
+        return self.model_.predict(X)
+
+
+def test_survivor_matches_the_exhaustive_grid_search():
+    X, y = data()
+    exhaustive = GridSearchCV(KNeighborsClassifier(), GRID, scoring='f1', cv=3).fit(X, y)
+    search = BudgetedHalvingSearch(KNeighborsClassifier(), GRID, scoring='f1', cv=3).fit(X, y)
+    assert search.best_params_ == exhaustive.best_params_
+    # The rounds grow to the full training set, where the winner is scored like GridSearchCV does
+    assert search.history_[-1]['n_samples'] == len(y)
+    assert abs(search.best_score_ - exhaustive.best_score_) < 1e-12
+    assert not search.budget_exhausted_
+
+
+def test_time_budget_stops_the_search():
+    X, y = data()
+    grid = {'delay': [0.02, 0.025, 0.03], 'strategy': ['prior', 'stratified', 'uniform', 'most_frequent']}
+    budget = 0.3
+    start = time.perf_counter()
+    search = BudgetedHalvingSearch(SlowClassifier(), grid, cv=3, time_budget=budget).fit(X, y)
+    elapsed = time.perf_counter() - start
+    assert search.budget_exhausted_
+    assert search.n_fits_ < 3 * 12
+    # At most one candidate's cross-validation and the final refit run past the deadline
+    assert elapsed < budget + 4 * 0.03 + 0.5
+    assert search.best_params_ in [entry['params'] for entry in search.history_]
@@ -0,0 +1,22 @@
+import glob
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def crlf_files():
+    # The modules .gitattributes keeps byte-for-byte with CRLF endings
+    with open(os.path.join(ROOT, '.gitattributes')) as attributes:
+        return {line.split()[0] for line in attributes if line.strip() and not line.startswith('#')}
+
+
+def test_python_files_keep_their_line_endings():
+    crlf = crlf_files()
+    for path in glob.glob(os.path.join(ROOT, '**', '*.py'), recursive=True):
+        name = os.path.relpath(path, ROOT).replace(os.sep, '/')
+        with open(path, 'rb') as source:
+            lines = source.read().split(b'\n')[:-1]
+        if name in crlf:
+            assert all(line.endswith(b'\r') for line in lines), f"{name} must keep CRLF line endings"
+        else:
+            assert not any(line.endswith(b'\r') for line in lines), f"{name} must keep LF line endings"
@@ -0,0 +1,52 @@
+import threading
+import time
+import pytest
+from joblib import Parallel, delayed
+from instrumentation.metrics import MetricsRegistry
+
+
+def burn(seconds):
+    end = time.process_time() + seconds
+    while time.process_time() < end:
+        pass
+
+
+def test_stage_cpu_counts_live_pool_workers():
+    # Live loky workers are only visible through psutil
+    pytest.importorskip('psutil')
+    # Warm the loky pool first, so the workers stay alive across the stage as in the pipeline
+    Parallel(n_jobs=2)(delayed(burn)(0) for _ in range(2))
+    registry = MetricsRegistry()
+    with registry.stage('work'):
+        Parallel(n_jobs=2)(delayed(burn)(0.3) for _ in range(4))
+    record = registry.to_dict()['stages']['work']
+    assert record['cpu_seconds'] >= 1.0
+    assert 'worker' in registry.to_dict()['stage_scopes']['cpu_seconds']
+
+
+def test_overlapping_stages_only_count_towards_the_run():
+    registry = MetricsRegistry()
+    started = threading.Barrier(2)
+
+    def stage(name):
+        with registry.stage(name):
+            started.wait()
+            burn(0.2)
+
+    threads = [threading.Thread(target=stage, args=(name,)) for name in ('left', 'right')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with registry.stage('alone'):
+        with registry.stage('nested'):
+            burn(0.1)
+    exported = registry.to_dict()
+    for name in ('left', 'right'):
+        assert exported['stages'][name]['overlapped_calls'] == 1
+        assert exported['stages'][name]['cpu_seconds'] == 0.0
+    for name in ('alone', 'nested'):
+        assert exported['stages'][name]['overlapped_calls'] == 0
+        assert exported['stages'][name]['cpu_seconds'] >= 0.09
+    assert exported['run']['cpu_seconds'] >= 0.25
+    assert 'pipeline_run_cpu_seconds' in registry.to_prometheus()
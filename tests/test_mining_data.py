@@ -0,0 +1,158 @@
+import json
+import numpy as np
+import pandas as pd
+from data_collection_and_processing import mining_data
+from data_collection_and_processing.mining_data import EthereumTransactionAnalyzer
+from data_collection_and_processing.transaction_graph import EdgeCollector, HASH_DTYPE
+from conftest import transaction
+
+COUNTERPARTY = '0x' + '01' * 20
+
+
+def mined_addresses(count):
+    return [f"0x{index:040x}" for index in range(1, count + 1)]
+
+
+def make_analyzer(stub, tmp_path, addresses, **kwargs):
+    address_file = tmp_path / 'addresses.csv'
+    pd.DataFrame({'Address': addresses}).to_csv(address_file, index=False)
+    return EthereumTransactionAnalyzer('key', str(address_file), str(tmp_path / 'mined.csv'), base_url=stub.url,
+                                       cache_dir=str(tmp_path / 'cache'), **kwargs)
+
+
+def checkpointed(tmp_path):
+    with open(tmp_path / 'mined.csv.checkpoint') as manifest:
+        return [json.loads(line)['address'] for line in manifest]
+
+
+def serve_active(stub, addresses):
+    for position, address in enumerate(addresses):
+        stub.transactions[address] = [transaction(2 * position, address, COUNTERPARTY),
+                                      transaction(2 * position + 1, COUNTERPARTY, address)]
+
+
+def test_failed_fetches_are_not_checkpointed_and_retried_on_resume(etherscan_stub, tmp_path):
+    addresses = mined_addresses(6)
+    serve_active(etherscan_stub, addresses)
+    # An HTTP error and a rate-limit string are failures; an empty list is a real, empty account
+    etherscan_stub.replies[addresses[1]] = [(500, {})]
+    etherscan_stub.replies[addresses[3]] = [(200, {'status': '0', 'message': 'NOTOK',
+                                                   'result': 'Max rate limit reached'})]
+    etherscan_stub.transactions[addresses[4]] = []
+    analyzer = make_analyzer(etherscan_stub, tmp_path, addresses, flush_every=2)
+    analyzer.process_addresses()
+    assert analyzer.failed_addresses == [addresses[1], addresses[3]]
+    assert set(checkpointed(tmp_path)) == {addresses[0], addresses[2], addresses[4], addresses[5]}
+    mined = pd.read_csv(tmp_path / 'mined.csv')
+    assert mined['Address'].tolist() == [addresses[0], addresses[2], addresses[4], addresses[5]]
+    assert mined.set_index('Address').loc[addresses[4], 'total_transactions'] == 0
+
+    analyzer.process_addresses(resume=True)
+    assert analyzer.failed_addresses == []
+    mined = pd.read_csv(tmp_path / 'mined.csv')
+    assert sorted(mined['Address']) == addresses
+    assert (mined.set_index('Address').loc[[addresses[1], addresses[3]], 'total_transactions'] == 2).all()
+
+
+def test_streaming_and_batch_failures_are_retried(etherscan_stub, tmp_path):
+    addresses = mined_addresses(4)
+    serve_active(etherscan_stub, addresses)
+    for options in ({'streaming': True, 'page_size': 1}, {'batch_size': 3}):
+        etherscan_stub.replies[addresses[2]] = [(502, {})]
+        analyzer = make_analyzer(etherscan_stub, tmp_path, addresses)
+        analyzer.process_addresses(**options)
+        assert analyzer.failed_addresses == [addresses[2]]
+        assert addresses[2] not in checkpointed(tmp_path)
+        analyzer.process_addresses(resume=True, **options)
+        assert sorted(pd.read_csv(tmp_path / 'mined.csv')['Address']) == addresses
+
+
+def test_features_only_cache_miss_is_not_written(etherscan_stub, tmp_path):
+    addresses = mined_addresses(3)
+    serve_active(etherscan_stub, addresses)
+    make_analyzer(etherscan_stub, tmp_path, addresses[:2]).process_addresses()
+    analyzer = make_analyzer(etherscan_stub, tmp_path, addresses)
+    analyzer.process_addresses(features_only=True)
+    assert analyzer.failed_addresses == [addresses[2]]
+    assert pd.read_csv(tmp_path / 'mined.csv')['Address'].tolist() == addresses[:2]
+
+
+def test_paging_skips_a_boundary_block_spread_over_several_pages(etherscan_stub, tmp_path, monkeypatch):
+    # Windows of 3 pages x 4 rows; block 4 fills the end of page 2 and all of page 3, so the restarted
+    # window re-serves six transactions from two pages
+    monkeypatch.setattr(mining_data, 'MAX_WINDOW_RESULTS', 12)
+    address = mined_addresses(1)[0]
+    blocks = [1, 1, 2, 2, 3, 3, 4, 4, 4, 4, 4, 4, 5, 5, 6, 7, 7, 7, 7, 7, 7, 7, 7, 8, 9]
+    etherscan_stub.transactions[address] = [
+        transaction(index, address if index % 2 else COUNTERPARTY, COUNTERPARTY if index % 2 else address, block)
+        for index, block in enumerate(blocks)]
+    analyzer = make_analyzer(etherscan_stub, tmp_path, [address])
+    served = [tx['hash'] for page in analyzer.iter_transaction_pages(address, page_size=4) for tx in page]
+    assert served == [tx['hash'] for tx in etherscan_stub.transactions[address]]
+
+    analyzer.process_addresses(streaming=True, page_size=4)
+    assert pd.read_csv(tmp_path / 'mined.csv')['total_transactions'].tolist() == [len(blocks)]
+
+
+def test_flags_and_counts_are_written_as_integers(etherscan_stub, tmp_path):
+    addresses = mined_addresses(3)
+    serve_active(etherscan_stub, addresses[:2])
+    make_analyzer(etherscan_stub, tmp_path, addresses).process_addresses()
+    with open(tmp_path / 'mined.csv') as mined:
+        header = mined.readline().strip().split(',')
+        rows = [dict(zip(header, line.strip().split(','))) for line in mined]
+    for row in rows:
+        for column in mining_data.INTEGER_COLUMNS:
+            assert row[column].isdigit(), (column, row[column])
+    assert [row['total_transactions'] for row in rows] == ['2', '2', '0']
+
+
+def test_edges_are_on_disk_before_their_address_is_checkpointed(etherscan_stub, tmp_path):
+    addresses = mined_addresses(7)
+    serve_active(etherscan_stub, addresses)
+    analyzer = make_analyzer(etherscan_stub, tmp_path, addresses, flush_every=2, edge_dir=str(tmp_path / 'edges'))
+    mark_done = analyzer.checkpoint.mark_done
+    checked = []
+
+    def checked_mark_done(index, address, current_txns):
+        # What a crash right now would leave behind: only the shards already written
+        on_disk = set(EdgeCollector(str(tmp_path / 'edges')).load()['tx'].tolist())
+        served = set(np.array([bytes.fromhex(tx['hash'][2:]) for tx in etherscan_stub.transactions[address]],
+                              dtype=HASH_DTYPE).tolist())
+        assert served <= on_disk, address
+        checked.append(address)
+        mark_done(index, address, current_txns)
+
+    analyzer.checkpoint.mark_done = checked_mark_done
+    analyzer.process_addresses()
+    assert checked == addresses
+
+
+def test_incremental_update_matches_a_full_recompute(etherscan_stub, tmp_path):
+    addresses = mined_addresses(3)
+    history = {}
+    for position, address in enumerate(addresses):
+        history[address] = [transaction(10 * position + offset, address if offset % 2 else COUNTERPARTY,
+                                        COUNTERPARTY if offset % 2 else address, block=100 + offset // 2)
+                            for offset in range(5)]
+        etherscan_stub.transactions[address] = list(history[address])
+    analyzer = make_analyzer(etherscan_stub, tmp_path, addresses, state_dir=str(tmp_path / 'state'))
+    analyzer.process_addresses(streaming=True, page_size=2)
+
+    # New transactions land in the watermark block (102) and in later blocks
+    for position, address in enumerate(addresses[:2]):
+        history[address] += [transaction(100 + 10 * position + offset, COUNTERPARTY if offset % 2 else address,
+                                         address if offset % 2 else COUNTERPARTY, block=102 + offset)
+                             for offset in range(position + 2)]
+        etherscan_stub.transactions[address] = sorted(history[address], key=lambda tx: int(tx['blockNumber']))
+    analyzer.update_addresses(page_size=2)
+
+    updated = pd.read_csv(tmp_path / 'mined.csv').set_index('Address')
+    assert updated.loc[addresses, 'total_transactions'].tolist() == [7, 8, 5]
+    for address in addresses:
+        expected = analyzer.compute_transaction_stats(address, etherscan_stub.transactions[address]).iloc[0]
+        columns = [column for column in expected.index if column in updated.columns and column != 'FLAG']
+        assert len(columns) > 10
+        for column in columns:
+            assert np.isclose(float(updated.loc[address, column]), float(expected[column]), rtol=1e-12,
+                              equal_nan=True), (address, column, updated.loc[address, column], expected[column])
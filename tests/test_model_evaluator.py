@@ -0,0 +1,34 @@
+import os
+import numpy as np
+import pandas as pd
+from modeling.model_evaluator import ModelEvaluator, PreparedSplits
+
+
+def frame(seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'a': rng.normal(size=60), 'b': rng.normal(size=60), 'FLAG': rng.integers(0, 2, 60)})
+
+
+def test_prepared_splits_are_shared_and_bounded():
+    splits = PreparedSplits(max_entries=2)
+    first = ModelEvaluator({}, frame(0), 'FLAG', prepared_splits=splits)
+    first._preprocess_data()
+    again = ModelEvaluator({}, frame(0), 'FLAG', prepared_splits=splits)
+    again._preprocess_data()
+    assert again.X_train_scaled is first.X_train_scaled
+    folder = os.path.dirname(first.X_train_scaled.filename)
+
+    for seed in (1, 2):
+        ModelEvaluator({}, frame(seed), 'FLAG', prepared_splits=splits)._preprocess_data()
+    assert len(splits.entries) == 2
+    # The least recently used split is dropped along with its memory-mapped files
+    assert not os.path.exists(folder)
+
+
+def test_evaluators_do_not_share_splits_by_default():
+    first = ModelEvaluator({}, frame(0), 'FLAG')
+    first._preprocess_data()
+    second = ModelEvaluator({}, frame(0), 'FLAG')
+    second._preprocess_data()
+    assert second.X_train_scaled is not first.X_train_scaled
+    assert np.array_equal(second.X_train_scaled, first.X_train_scaled)
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+from modeling.neighbor_index import NeighborIndex
+
+
+def data():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(400, 4)), columns=['a', 'b', 'c', 'd'])
+    y = (X['a'] + rng.normal(scale=0.7, size=400) > 0.3).astype(int).to_numpy()
+    return X, y, StandardScaler().fit(X)
+
+
+@pytest.mark.parametrize('weights', ['uniform', 'distance'])
+def test_predict_proba_matches_kneighbors_classifier(weights):
+    X, y, scaler = data()
+    X_scaled = scaler.transform(X)
+    index = NeighborIndex.build(X_scaled, y, scaler=scaler, feature_columns=X.columns, n_neighbors=7,
+                                weights=weights)
+    knn = KNeighborsClassifier(n_neighbors=7, weights=weights).fit(X_scaled, y)
+    # New rows plus indexed ones, whose zero distance takes all the weight under 'distance'
+    rng = np.random.default_rng(1)
+    queries = pd.concat([pd.DataFrame(rng.normal(size=(100, 4)), columns=X.columns), X.iloc[:20]],
+                        ignore_index=True)
+    expected = knn.predict_proba(scaler.transform(queries))[:, 1]
+    assert np.allclose(index.predict_proba(queries, chunk_size=32), expected, rtol=1e-12, atol=0)
+
+
+def test_load_memory_maps_the_arrays(tmp_path):
+    X, y, scaler = data()
+    index = NeighborIndex.build(scaler.transform(X), y, ids=[f"0x{row:040x}" for row in range(len(X))],
+                                scaler=scaler, feature_columns=X.columns)
+    loaded = NeighborIndex.load(index.save(str(tmp_path / 'neighbor_index.joblib')))
+    for array in (*loaded.tree.get_arrays(), *loaded.positive_tree.get_arrays(), loaded.labels,
+                  loaded.positive_rows, loaded.ids):
+        assert isinstance(array, np.memmap)
+    assert np.array_equal(loaded.kneighbors(X.iloc[:10])[1], index.kneighbors(X.iloc[:10])[1])
+    assert loaded.similar(X.iloc[:2], k=3)['id'].str.startswith('0x').all()
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import average_precision_score
+from sklearn.tree import DecisionTreeClassifier
+from modeling.model_evaluator import ModelEvaluator
+from modeling.oof_evaluation import OutOfFoldStore, average_precision
+
+
+def test_vectorized_average_precision_matches_sklearn():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 300)
+    # Rounded scores give many ties, which is where the tie-group handling matters
+    scores = np.stack([np.round(rng.random(300) + 0.4 * y, decimals) for decimals in (0, 1, 2, 6)])
+    expected = [average_precision_score(y, row) for row in scores]
+    assert np.allclose(average_precision(scores, y), expected, rtol=1e-12, atol=0)
+    # Bootstrap replicates add a leading axis
+    index = rng.integers(0, 300, size=(5, 300))
+    replicates = average_precision(scores[:, index], y[index])
+    assert np.allclose(replicates, [[average_precision_score(y[rows], row[rows]) for rows in index] for row in scores])
+
+
+def test_from_evaluator_folds_cover_the_training_rows_only(tmp_path):
+    rng = np.random.default_rng(1)
+    frame = pd.DataFrame({'a': rng.normal(size=200), 'b': rng.normal(size=200)})
+    frame['FLAG'] = (frame['a'] + rng.normal(scale=0.5, size=200) > 0.5).astype(int)
+    models = {'LR': (LogisticRegression(), {}), 'DT': (DecisionTreeClassifier(max_depth=3, random_state=0), {})}
+    evaluator = ModelEvaluator(models, frame, 'FLAG', n_jobs=1)
+    evaluator.evaluate_models()
+    store = OutOfFoldStore.from_evaluator(evaluator, str(tmp_path / 'oof'), n_splits=3, n_jobs=1)
+    assert store.scores.shape == (2, len(evaluator.y_train))
+    assert np.array_equal(store.y, evaluator.y_train.to_numpy())
+    summary = store.summary(n_bootstrap=20)
+    assert set(summary['Model']) == {'LR', 'DT'}
+    assert np.allclose(store.average_precision(),
+                       [average_precision_score(store.y, row) for row in np.asarray(store.scores, dtype=np.float64)])
@@ -0,0 +1,43 @@
+import json
+import pytest
+from benchmarks.pipeline_benchmark import PipelineBenchmark, hardware
+
+
+def record(stage, items_per_second, peak_rss_mb=100.0):
+    return {'scale': 10000, 'stage': stage, 'items': 10000, 'seconds': 10000 / items_per_second,
+            'items_per_second': items_per_second, 'peak_rss_mb': peak_rss_mb}
+
+
+def write_baseline(path, machine_hardware, results):
+    with open(path, 'w') as baseline_file:
+        json.dump({'machine': {'hardware': machine_hardware}, 'results': results}, baseline_file)
+    return str(path)
+
+
+def test_compare_flags_throughput_and_memory_regressions(tmp_path):
+    baseline = write_baseline(tmp_path / 'baseline.json', hardware(),
+                              [record('combine', 1000.0), record('scoring', 1000.0)])
+    benchmark = PipelineBenchmark(scales=(10000,))
+    benchmark.results = [record('combine', 500.0), record('scoring', 950.0, peak_rss_mb=400.0)]
+    regressions = benchmark.compare(baseline, tolerance=0.3)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('combine @ 10000: 500/s') and 'peak RSS 400 MB' in regressions[1]
+
+
+def test_compare_refuses_a_baseline_from_other_hardware(tmp_path):
+    other = dict(hardware(), cpus=hardware()['cpus'] + 63)
+    baseline = write_baseline(tmp_path / 'baseline.json', other, [record('combine', 1000.0)])
+    benchmark = PipelineBenchmark(scales=(10000,))
+    benchmark.results = [record('combine', 1000.0)]
+    with pytest.raises(ValueError, match='recorded on'):
+        benchmark.compare(baseline)
+
+
+def test_compare_reports_stages_without_a_counterpart(tmp_path):
+    baseline = write_baseline(tmp_path / 'baseline.json', hardware(),
+                              [record('combine', 1000.0), record('scoring', 1000.0)])
+    benchmark = PipelineBenchmark(scales=(10000,))
+    benchmark.results = [record('combine', 1000.0), record('neighbor_queries', 1000.0)]
+    assert benchmark.compare(baseline) == []
+    assert benchmark.missing == ['neighbor_queries @ 10000: no baseline',
+                                 'scoring @ 10000: in the baseline but not measured']
@@ -0,0 +1,23 @@
+import pandas as pd
+import pytest
+from data_collection_and_processing.result_sink import FeatureSink
+
+
+def test_missing_integers_are_written_as_empty_fields(tmp_path):
+    output = tmp_path / 'rows.csv'
+    sink = FeatureSink(str(output), ['Address', 'FLAG', 'count', 'value'], batch_size=2,
+                       integer_columns=['FLAG', 'count'])
+    sink.append({'Address': '0xa', 'FLAG': 1, 'count': 3, 'value': 0.5})
+    sink.append({'Address': '0xb', 'FLAG': 1, 'count': None, 'value': None})
+    sink.append({'Address': '0xc', 'FLAG': 0, 'count': float('nan'), 'value': 2.0})
+    assert sink.to_frame()['count'].isna().tolist() == [False, True, True]
+    sink.close()
+    with open(output) as rows:
+        assert rows.read().splitlines() == ['Address,FLAG,count,value', '0xa,1,3,0.5', '0xb,1,,', '0xc,0,,2.0']
+    assert pd.read_csv(output)['count'].isna().tolist() == [False, True, True]
+
+
+def test_fractional_integer_is_rejected(tmp_path):
+    sink = FeatureSink(str(tmp_path / 'rows.csv'), ['Address', 'count'], integer_columns=['count'])
+    with pytest.raises(ValueError, match='count'):
+        sink.append({'Address': '0xa', 'count': 2.5})
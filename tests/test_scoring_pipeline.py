@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+from modeling.scoring_pipeline import ScoringPipeline
+
+
+def fitted(model):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(200, 3)), columns=['a', 'b', 'c'])
+    y = (X['a'] + 0.3 * rng.normal(size=200) > 0.8).astype(int)
+    scaler = StandardScaler().fit(X)
+    return model.fit(scaler.transform(X), y), scaler, X
+
+
+def test_decision_function_models_split_at_zero(tmp_path):
+    model, scaler, X = fitted(SVC())
+    pipeline = ScoringPipeline(model, scaler, X.columns)
+    assert (pipeline.score_kind, pipeline.threshold) == ('decision', 0.0)
+    result = pipeline.score_frame(X)
+    assert (result['Prediction'].to_numpy() == model.predict(scaler.transform(X))).all()
+
+    loaded = ScoringPipeline.load(pipeline.save(str(tmp_path / 'svc.joblib')))
+    assert (loaded.score_kind, loaded.threshold) == ('decision', 0.0)
+
+
+def test_probability_models_keep_half(tmp_path):
+    model, scaler, X = fitted(RandomForestClassifier(n_estimators=10, random_state=0))
+    pipeline = ScoringPipeline.load(ScoringPipeline(model, scaler, X.columns).save(str(tmp_path / 'rf.joblib')))
+    assert (pipeline.score_kind, pipeline.threshold) == ('probability', 0.5)
+    assert pipeline.matrix(X[['c', 'b', 'a']]).tolist() == X.to_numpy().tolist()
+
+
+def test_score_csv_reads_the_same_rows_from_the_dataset_store(tmp_path):
+    from data_collection_and_processing.dataset_store import DatasetStore
+    model, scaler, X = fitted(RandomForestClassifier(n_estimators=10, random_state=0))
+    pipeline = ScoringPipeline(model, scaler, X.columns)
+    frame = X.assign(Address=[f"0x{index:040x}" for index in range(len(X))], unused=1.0)
+    frame.to_csv(tmp_path / 'mined.csv', index=False)
+    store = DatasetStore(str(tmp_path / 'columnar'))
+    from_csv = pipeline.score_csv(str(tmp_path / 'mined.csv'), chunksize=64)
+    from_store = pipeline.score_csv(str(tmp_path / 'mined.csv'), chunksize=64, dataset_store=store)
+    pd.testing.assert_frame_equal(from_store, from_csv)
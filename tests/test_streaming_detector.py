@@ -0,0 +1,78 @@
+import socket
+import threading
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from data_collection_and_processing.sliding_window import DATASET_COLUMNS
+from modeling.scoring_pipeline import ScoringPipeline
+from modeling.streaming_detector import StreamingDetector, read_socket
+from conftest import transaction
+
+COLUMNS = [DATASET_COLUMNS['total_transactions'], DATASET_COLUMNS['total_eth_received']]
+WATCHED = '0x' + 'aa' * 20
+OTHER = '0x' + 'bb' * 20
+
+
+def pipeline():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.random((100, 2)) * 10, columns=COLUMNS)
+    y = (X[COLUMNS[0]] > 5).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(scaler.transform(X), y)
+    return ScoringPipeline(model, scaler, COLUMNS)
+
+
+def test_watched_addresses_are_scored_on_every_change():
+    detector = StreamingDetector(pipeline(), watch=[WATCHED.upper().replace('0X', '0x')], score_every=2048,
+                                 max_delay=3600)
+    detector.process(transaction(0, OTHER, WATCHED))
+    assert WATCHED in detector.scores
+    detector.process(transaction(1, OTHER, '0x' + 'cc' * 20))
+    assert detector.scored == 1
+
+
+def test_pending_changes_are_scored_after_max_delay():
+    detector = StreamingDetector(pipeline(), score_every=2048, max_delay=0.05)
+    detector.process(transaction(0, OTHER, WATCHED))
+    assert not detector.scores
+
+    def feed():
+        yield transaction(1, OTHER, WATCHED)
+        time.sleep(0.1)
+        # A quiet feed only sends heartbeats; the change is scored without waiting for the end
+        yield None
+        assert set(detector.scores) == {OTHER, WATCHED}
+
+    detector.run(feed())
+
+
+def test_socket_feed_yields_heartbeats_while_idle():
+    server = socket.create_server(('127.0.0.1', 0))
+    line = (pd.Series(transaction(0, OTHER, WATCHED)).to_json() + '\n').encode()
+
+    def serve():
+        connection, _ = server.accept()
+        connection.sendall(line)
+        time.sleep(0.3)
+        connection.sendall(line[:10])
+        connection.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    items = list(read_socket('127.0.0.1', server.getsockname()[1], heartbeat=0.05))
+    server.close()
+    assert items[0]['to'] == WATCHED
+    assert items[1:] and all(item is None for item in items[1:])
+
+
+def test_state_stays_bounded_past_max_addresses():
+    detector = StreamingDetector(pipeline(), max_addresses=50, score_every=1, evict_every=10 ** 9, max_alerts=20)
+    # Every address is new and active, so only the forced eviction at the address cap makes room
+    for index in range(400):
+        detector.process(transaction(index, f"0x{index + 1:040x}", f"0x{index + 10 ** 6:040x}", value=10 ** 19))
+    assert len(detector.store) <= 50
+    assert set(detector.scores) <= set(detector.store.windows)
+    assert detector.flagged <= set(detector.store.windows)
+    assert len(detector.scores) <= 50 and len(detector.alerts) <= 20
+    assert detector.store.evicted > 700
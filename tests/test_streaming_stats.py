@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+from data_collection_and_processing.streaming_stats import StreamingCorrelation, StreamingSummary
+
+
+def frame(rows=2000):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'a': rng.normal(1e9, 5, rows),
+        'b': rng.integers(0, 50, rows).astype(np.float64),
+        'c': rng.exponential(size=rows),
+        'label': rng.choice(['x', 'y', 'z'], rows),
+    })
+    df['d'] = df['a'] * 0.001 + rng.normal(size=rows)
+    for column in ('a', 'c', 'd'):
+        df.loc[rng.random(rows) < 0.1, column] = np.nan
+    return df
+
+
+def chunks(df, size=300):
+    return [df.iloc[start:start + size] for start in range(0, len(df), size)]
+
+
+def test_summary_matches_describe_and_nunique():
+    df = frame()
+    summary = StreamingSummary()
+    for chunk in chunks(df):
+        summary.update(chunk)
+    expected = df.describe().loc[['count', 'mean', 'std', 'min', 'max']]
+    pd.testing.assert_frame_equal(summary.describe()[expected.columns], expected, rtol=1e-9)
+    assert summary.nunique().to_dict() == df.nunique().to_dict()
+    assert all(summary.nunique_exact().values())
+
+
+def test_distinct_estimate_above_the_sketch_size():
+    df = pd.DataFrame({'value': np.arange(50000) * 7})
+    summary = StreamingSummary(distinct_k=1024)
+    for chunk in chunks(df, 4000):
+        summary.update(chunk)
+    assert not summary.nunique_exact()['value']
+    assert abs(summary.nunique()['value'] / 50000 - 1) < 0.1
+
+
+def test_correlation_uses_complete_rows_only():
+    df = frame().drop(columns='label')
+    correlation = StreamingCorrelation()
+    for chunk in chunks(df):
+        correlation.update(chunk)
+    assert correlation.n == len(df.dropna())
+    pd.testing.assert_frame_equal(correlation.matrix(), df.dropna().corr(), rtol=1e-9)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+from data_collection_and_processing.combining_data import DataCombiner
+from data_collection_and_processing.transaction_graph import EdgeCollector, graph_coverage
+from modeling.model_evaluator import ModelEvaluator
+from conftest import transaction
+
+
+def address(index):
+    return f"0x{index:040x}"
+
+
+def ring_edges(tmp_path, count):
+    # Each address trades with the next one, so every row has two labelled counterparties
+    edges = EdgeCollector(str(tmp_path / 'edges'))
+    edges.add([transaction(index, address(index), address((index + 1) % count)) for index in range(count)])
+    edges.close()
+    return str(tmp_path / 'edges')
+
+
+def flagged_fraction(edge_dir, frame, holdout_path=None):
+    combiner = DataCombiner('mined.csv', 'kaggle.csv', 'combined.csv', edge_dir=edge_dir, holdout_path=holdout_path)
+    combiner.merged_data = frame.copy()
+    combiner.join_graph_features()
+    return combiner.merged_data['graph_flagged_neighbor_fraction'].to_numpy()
+
+
+def test_flagged_neighbor_fraction_ignores_held_out_labels(tmp_path):
+    from orchestration.pipeline import EthereumPipeline
+    count = 50
+    edge_dir = ring_edges(tmp_path, count)
+    rng = np.random.default_rng(3)
+    frame = pd.DataFrame({'Address': [address(index) for index in range(count)],
+                          'FLAG': rng.integers(0, 2, count), 'value': rng.normal(size=count)})
+    before = flagged_fraction(edge_dir, frame, str(tmp_path / 'address_data_holdout.csv'))
+    assert before.any()
+    # The pipeline hands the rows combining held out to the evaluators, matched by address
+    pipeline = EthereumPipeline(str(tmp_path), graph_features=True)
+    shuffled = frame.sample(frac=1, random_state=0)
+    train_index, test_index = pipeline._split(shuffled['Address'])
+    evaluator = ModelEvaluator({}, shuffled.drop(['Address'], axis=1), 'FLAG', split=(train_index, test_index))
+    evaluator._preprocess_data()
+    held_out, training = evaluator.X_test.index, evaluator.X_train.index
+    assert len(held_out) == 10 and len(training) == 40
+    held_out_addresses = set(pd.read_csv(tmp_path / 'address_data_holdout.csv')['Address'])
+    assert set(frame.loc[held_out, 'Address']) == held_out_addresses
+
+    frame.loc[held_out, 'FLAG'] = 1 - frame.loc[held_out, 'FLAG']
+    assert np.array_equal(flagged_fraction(edge_dir, frame), before)
+    frame.loc[training[:3], 'FLAG'] = 1 - frame.loc[training[:3], 'FLAG']
+    assert not np.array_equal(flagged_fraction(edge_dir, frame), before)
+
+
+def test_label_derived_columns_stay_out_of_selection_and_oof(tmp_path):
+    from data_collection_and_processing.feature_selection import FeatureSelector
+    from modeling.oof_evaluation import OutOfFoldStore
+    from sklearn.linear_model import LogisticRegression
+    rng = np.random.default_rng(4)
+    frame = pd.DataFrame({'value': rng.normal(size=120), 'graph_flagged_neighbor_fraction': rng.random(120)})
+    frame['FLAG'] = (frame['value'] > 0).astype(int)
+    assert list(FeatureSelector(frame).X.columns) == ['value']
+    model = LogisticRegression()
+    evaluator = ModelEvaluator({'LR': (model, {})}, frame, 'FLAG', n_jobs=1)
+    store = OutOfFoldStore.from_evaluator(evaluator, str(tmp_path / 'oof'), n_splits=3, n_jobs=1)
+    assert evaluator.X_train.shape[1] == 2
+    # The stored scores were fitted on the training rows without the label-derived column
+    expected = store._fingerprint({'LR': model}, evaluator.X_train[['value']].to_numpy(dtype=np.float64),
+                                  evaluator.y_train.to_numpy().astype(np.int8))
+    assert store.load()['fingerprint'] == expected
+
+
+def test_graph_coverage_by_class():
+    frame = pd.DataFrame({'FLAG': [1, 1, 0, 0, 0, 0], 'graph_in_degree': [1, 0, 0, 0, 0, 2],
+                          'graph_out_degree': [3, 2, 0, 0, 0, 0]})
+    assert graph_coverage(frame) == {0: 0.25, 1: 1.0}
+
+
+def test_pipeline_refuses_graph_coverage_that_follows_the_label(tmp_path, capsys):
+    from orchestration.pipeline import EthereumPipeline
+    frame = pd.DataFrame({'FLAG': [1, 1, 0, 0], 'graph_in_degree': [1, 1, 1, 0], 'graph_out_degree': [0, 2, 0, 0]})
+    with pytest.raises(ValueError, match='Graph features refused'):
+        EthereumPipeline(str(tmp_path), graph_features=True)._check_graph_coverage(frame)
+    EthereumPipeline(str(tmp_path), graph_features=True, allow_graph_coverage_gap=True)._check_graph_coverage(frame)
+    assert 'Warning' in capsys.readouterr().out
+    frame['graph_in_degree'] = [1, 0, 1, 1]
+    EthereumPipeline(str(tmp_path), graph_features=True)._check_graph_coverage(frame)
+    assert capsys.readouterr().out == ''